@@ -8,6 +8,8 @@ from app.api.data import router as data_router
 from app.api.assignments import router as assignments_router
 from app.api.visitors import router as visitors_router
 from app.api.export import router as export_router
+from app.api.jobs import router as jobs_router
+from app.api.billing import router as billing_router
 
 __all__ = [
     "auth_router",
@@ -18,5 +20,7 @@ __all__ = [
     "data_router",
     "assignments_router",
     "visitors_router",
-    "export_router"
+    "export_router",
+    "jobs_router",
+    "billing_router"
 ]
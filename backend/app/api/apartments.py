@@ -4,115 +4,106 @@ Apartments API (社宅)
 
 from typing import List, Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
-from app.core.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from app.core.database import get_db, get_async_db
+from app.core.cache import cached, invalidate
 from app.core.security import get_current_user
+from app.core.routing import ThreadpoolRoute
+from app.core.pagination import Keyset, set_next_cursor
+from app.core.jobs import enqueue, job_response
+from app.services.stats import get_apartment_stats
+from app.services.search import APARTMENT_SEARCH
+from app.services import occupancy
+from app.utils.address import extract_prefecture_city
 from app.models.models import Apartment, Employee, ApartmentStatus, User
 from app.schemas.schemas import (
     ApartmentCreate, 
     ApartmentUpdate, 
     ApartmentResponse,
     ApartmentWithOccupants,
-    ApartmentStatusEnum
+    ApartmentStatusEnum,
+    EmployeeSimple,
+    JobResponse
 )
 
-router = APIRouter(prefix="/apartments", tags=["Apartments (社宅)"])
+router = APIRouter(prefix="/apartments", tags=["Apartments (社宅)"], route_class=ThreadpoolRoute)
+
+APARTMENT_KEYSET = Keyset(Apartment.apartment_code)
 
 
 @router.get("/", response_model=List[ApartmentResponse])
 async def list_apartments(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
     status: Optional[ApartmentStatusEnum] = None,
     city: Optional[str] = None,
     prefecture: Optional[str] = None,
     search: Optional[str] = None,
     is_active: bool = True,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    """List all apartments with optional filters"""
-    query = db.query(Apartment).filter(Apartment.is_active == is_active)
+    """List all apartments with optional filters (offset or cursor pagination; searches rank by relevance)"""
+    query = select(Apartment).where(Apartment.is_active == is_active)
     
     if status:
-        query = query.filter(Apartment.status == status.value)
+        query = query.where(Apartment.status == status.value)
     
     if city:
-        query = query.filter(Apartment.city.ilike(f"%{city}%"))
+        query = query.where(Apartment.city.ilike(f"%{city}%"))
     
     if prefecture:
-        query = query.filter(Apartment.prefecture.ilike(f"%{prefecture}%"))
+        query = query.where(Apartment.prefecture.ilike(f"%{prefecture}%"))
     
-    if search:
-        query = query.filter(
-            or_(
-                Apartment.name.ilike(f"%{search}%"),
-                Apartment.apartment_code.ilike(f"%{search}%"),
-                Apartment.address.ilike(f"%{search}%"),
-                Apartment.building_name.ilike(f"%{search}%")
-            )
-        )
+    query, rank = APARTMENT_SEARCH.apply(query, search)
     
-    apartments = query.order_by(Apartment.apartment_code).offset(skip).limit(limit).all()
+    result = await db.execute(APARTMENT_KEYSET.page(query, skip, limit, cursor, rank))
+    apartments = result.scalars().all()
+    ranked = Keyset.is_ranked(rank, cursor)
+    set_next_cursor(response, APARTMENT_KEYSET.next_cursor(apartments, limit, ranked))
     return apartments
 
 
 @router.get("/stats")
+@cached("stats")
 async def get_apartments_stats(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get apartment statistics"""
-    total = db.query(func.count(Apartment.id)).filter(Apartment.is_active == True).scalar()
-    available = db.query(func.count(Apartment.id)).filter(
-        Apartment.is_active == True,
-        Apartment.status == ApartmentStatus.AVAILABLE
-    ).scalar()
-    occupied = db.query(func.count(Apartment.id)).filter(
-        Apartment.is_active == True,
-        Apartment.status == ApartmentStatus.OCCUPIED
-    ).scalar()
-    maintenance = db.query(func.count(Apartment.id)).filter(
-        Apartment.is_active == True,
-        Apartment.status == ApartmentStatus.MAINTENANCE
-    ).scalar()
-    reserved = db.query(func.count(Apartment.id)).filter(
-        Apartment.is_active == True,
-        Apartment.status == ApartmentStatus.RESERVED
-    ).scalar()
-    
-    total_capacity = db.query(func.sum(Apartment.capacity)).filter(
-        Apartment.is_active == True
-    ).scalar() or 0
-    
-    total_occupants = db.query(func.sum(Apartment.current_occupants)).filter(
-        Apartment.is_active == True
-    ).scalar() or 0
-    
-    occupancy_rate = (total_occupants / total_capacity * 100) if total_capacity > 0 else 0
-    
-    return {
-        "total": total,
-        "available": available,
-        "occupied": occupied,
-        "maintenance": maintenance,
-        "reserved": reserved,
-        "total_capacity": total_capacity,
-        "total_occupants": total_occupants,
-        "occupancy_rate": round(occupancy_rate, 2)
-    }
+    return await get_apartment_stats(db)
+
+
+@router.post("/occupancy/reconcile", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def reconcile_occupancy(
+    full: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Recompute current_occupants and status from employees and current
+    assignments in the background (poll /jobs/{id}). By default only the
+    apartments changed since the last run are checked; full=true checks all.
+    """
+    job = enqueue(db, "occupancy_reconcile", occupancy.run_reconcile, full=full, user_id=current_user.id,
+                  invalidates=("apartments", "stats", "occupancy"))
+    return job_response(job)
 
 
 @router.get("/{apartment_id}", response_model=ApartmentWithOccupants)
+@cached("apartments")
 async def get_apartment(
     apartment_id: UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get apartment by ID with occupants"""
-    apartment = db.query(Apartment).filter(Apartment.id == apartment_id).first()
+    apartment = await db.get(Apartment, apartment_id)
     
     if not apartment:
         raise HTTPException(
@@ -121,17 +112,29 @@ async def get_apartment(
         )
     
     # Get current occupants
-    occupants = db.query(Employee).filter(
-        Employee.apartment_id == apartment_id,
-        Employee.is_active == True
-    ).all()
+    result = await db.execute(
+        select(Employee).where(
+            Employee.apartment_id == apartment_id,
+            Employee.is_active == True
+        )
+    )
     
     response = ApartmentWithOccupants.model_validate(apartment)
-    response.occupants = occupants
+    response.occupants = [EmployeeSimple.model_validate(e) for e in result.scalars().all()]
     
     return response
 
 
+def _with_location(data: dict) -> dict:
+    """Fill prefecture and city from the address when they are not given"""
+    prefecture, city = extract_prefecture_city(data.get("address"))
+    data.setdefault("prefecture", None)
+    data.setdefault("city", None)
+    data["prefecture"] = data["prefecture"] or prefecture
+    data["city"] = data["city"] or city
+    return data
+
+
 @router.post("/", response_model=ApartmentResponse, status_code=status.HTTP_201_CREATED)
 async def create_apartment(
     apartment_data: ApartmentCreate,
@@ -150,9 +153,10 @@ async def create_apartment(
             detail=f"Apartment with code {apartment_data.apartment_code} already exists"
         )
     
-    new_apartment = Apartment(**apartment_data.model_dump())
+    new_apartment = Apartment(**_with_location(apartment_data.model_dump()))
     db.add(new_apartment)
     db.commit()
+    invalidate("apartments", "stats", "occupancy")
     db.refresh(new_apartment)
     
     return new_apartment
@@ -186,10 +190,13 @@ async def update_apartment(
             )
     
     update_data = apartment_data.model_dump(exclude_unset=True)
+    if update_data.get("address"):
+        update_data = _with_location(update_data)
     for key, value in update_data.items():
         setattr(apartment, key, value)
     
     db.commit()
+    invalidate("apartments", "stats", "occupancy")
     db.refresh(apartment)
     
     return apartment
@@ -224,6 +231,7 @@ async def delete_apartment(
     
     apartment.is_active = False
     db.commit()
+    invalidate("apartments", "stats", "occupancy")
 
 
 @router.post("/{apartment_id}/assign/{employee_id}")
@@ -233,40 +241,30 @@ async def assign_employee_to_apartment(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Assign an employee to an apartment"""
-    apartment = db.query(Apartment).filter(Apartment.id == apartment_id).first()
-    if not apartment:
-        raise HTTPException(status_code=404, detail="Apartment not found")
-    
-    employee = db.query(Employee).filter(Employee.id == employee_id).first()
-    if not employee:
-        raise HTTPException(status_code=404, detail="Employee not found")
-    
-    # Check capacity
-    if apartment.current_occupants >= apartment.capacity:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Apartment is at full capacity ({apartment.capacity})"
-        )
-    
-    # Update employee
-    old_apartment_id = employee.apartment_id
-    employee.apartment_id = apartment_id
-    
-    # Update apartment occupancy
-    apartment.current_occupants += 1
-    if apartment.current_occupants >= apartment.capacity:
-        apartment.status = ApartmentStatus.OCCUPIED
-    
-    # Update old apartment if exists
-    if old_apartment_id:
-        old_apartment = db.query(Apartment).filter(Apartment.id == old_apartment_id).first()
-        if old_apartment:
-            old_apartment.current_occupants = max(0, old_apartment.current_occupants - 1)
-            if old_apartment.current_occupants == 0:
-                old_apartment.status = ApartmentStatus.AVAILABLE
+    """Assign an employee to an apartment (the seat is claimed atomically)"""
+    def work():
+        employee = occupancy.lock_employee(db, employee_id)
+        if not employee:
+            raise HTTPException(status_code=404, detail="Employee not found")
+        
+        apartment = db.query(Apartment).filter(Apartment.id == apartment_id).first()
+        if not apartment:
+            raise HTTPException(status_code=404, detail="Apartment not found")
+        
+        # Claim a seat in the new apartment and free the old one
+        try:
+            occupancy.move(db, employee.apartment_id, apartment_id)
+        except occupancy.ApartmentFull as full:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Apartment is at full capacity ({full.capacity})"
+            )
+        
+        employee.apartment_id = apartment_id
+        return employee, apartment
     
-    db.commit()
+    employee, apartment = occupancy.commit_with_retry(db, work)
+    invalidate("apartments", "stats", "occupancy")
     
     return {"message": f"Employee {employee.full_name_roman} assigned to {apartment.name}"}
 
@@ -279,28 +277,26 @@ async def unassign_employee_from_apartment(
     current_user: User = Depends(get_current_user)
 ):
     """Remove an employee from an apartment"""
-    apartment = db.query(Apartment).filter(Apartment.id == apartment_id).first()
-    if not apartment:
-        raise HTTPException(status_code=404, detail="Apartment not found")
-    
-    employee = db.query(Employee).filter(Employee.id == employee_id).first()
-    if not employee:
-        raise HTTPException(status_code=404, detail="Employee not found")
-    
-    if employee.apartment_id != apartment_id:
-        raise HTTPException(
-            status_code=400, 
-            detail="Employee is not assigned to this apartment"
-        )
-    
-    # Update employee
-    employee.apartment_id = None
-    
-    # Update apartment
-    apartment.current_occupants = max(0, apartment.current_occupants - 1)
-    if apartment.current_occupants == 0:
-        apartment.status = ApartmentStatus.AVAILABLE
+    def work():
+        apartment = db.query(Apartment).filter(Apartment.id == apartment_id).first()
+        if not apartment:
+            raise HTTPException(status_code=404, detail="Apartment not found")
+        
+        employee = occupancy.lock_employee(db, employee_id)
+        if not employee:
+            raise HTTPException(status_code=404, detail="Employee not found")
+        
+        if employee.apartment_id != apartment_id:
+            raise HTTPException(
+                status_code=400, 
+                detail="Employee is not assigned to this apartment"
+            )
+        
+        employee.apartment_id = None
+        occupancy.release(db, apartment_id)
+        return employee, apartment
     
-    db.commit()
+    employee, apartment = occupancy.commit_with_retry(db, work)
+    invalidate("apartments", "stats", "occupancy")
     
     return {"message": f"Employee {employee.full_name_roman} removed from {apartment.name}"}
@@ -2,55 +2,70 @@
 """
 Apartment Assignments API - Gestión de asignaciones con cálculos de precio
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, and_
 from typing import List, Optional
 from datetime import date, datetime
 from decimal import Decimal
 from uuid import UUID
 
-from ..core.database import get_db
+from ..core.database import get_db, get_async_db
+from ..core.cache import invalidate
 from ..core.security import get_current_user
+from ..core.routing import ThreadpoolRoute
+from ..core.pagination import Keyset, set_next_cursor
 from ..models.models import (
     User, Apartment, Employee, ApartmentAssignment,
     ApartmentStatus, EmployeeStatus, PricingType
 )
 from ..schemas.schemas import (
-    AssignmentCreate, AssignmentUpdate, AssignmentResponse, EmployeeSimple
+    AssignmentCreate, AssignmentUpdate, AssignmentResponse, EmployeeSimple,
+    AssignmentBulkCreate, AssignmentBulkResult
 )
+from ..services import billing, occupancy
+from ..services.assignments import assignment_costs, bulk_assign, month_costs, new_assignment, price_assignment
 from ..utils.rent_calculator import calculate_assignment_costs
 
-router = APIRouter(prefix="/assignments", tags=["Assignments"])
+router = APIRouter(prefix="/assignments", tags=["Assignments"], route_class=ThreadpoolRoute)
+
+# Más reciente primero; el id desempata entradas del mismo día
+ASSIGNMENT_KEYSET = Keyset(ApartmentAssignment.move_in_date, ApartmentAssignment.id, descending=True)
 
 
 @router.get("", response_model=List[AssignmentResponse])
 async def list_assignments(
+    response: Response,
     employee_id: Optional[UUID] = None,
     apartment_id: Optional[UUID] = None,
     is_current: Optional[bool] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Listar asignaciones de apartamentos con filtros opcionales
+    (paginación por offset o por cursor)
     """
-    query = db.query(ApartmentAssignment)
+    query = select(ApartmentAssignment).options(
+        selectinload(ApartmentAssignment.employee),
+        selectinload(ApartmentAssignment.apartment)
+    )
 
     if employee_id:
-        query = query.filter(ApartmentAssignment.employee_id == employee_id)
+        query = query.where(ApartmentAssignment.employee_id == employee_id)
     if apartment_id:
-        query = query.filter(ApartmentAssignment.apartment_id == apartment_id)
+        query = query.where(ApartmentAssignment.apartment_id == apartment_id)
     if is_current is not None:
-        query = query.filter(ApartmentAssignment.is_current == is_current)
+        query = query.where(ApartmentAssignment.is_current == is_current)
 
     # Ordenar por fecha de entrada (más reciente primero)
-    query = query.order_by(ApartmentAssignment.move_in_date.desc())
-
-    total = query.count()
-    assignments = query.offset(skip).limit(limit).all()
+    result = await db.execute(ASSIGNMENT_KEYSET.page(query, skip, limit, cursor))
+    assignments = result.scalars().all()
+    set_next_cursor(response, ASSIGNMENT_KEYSET.next_cursor(assignments, limit))
 
     return assignments
 
@@ -58,15 +73,19 @@ async def list_assignments(
 @router.get("/{assignment_id}", response_model=AssignmentResponse)
 async def get_assignment(
     assignment_id: UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Obtener una asignación específica
     """
-    assignment = db.query(ApartmentAssignment).filter(
-        ApartmentAssignment.id == assignment_id
-    ).first()
+    result = await db.execute(
+        select(ApartmentAssignment).options(
+            selectinload(ApartmentAssignment.employee),
+            selectinload(ApartmentAssignment.apartment)
+        ).where(ApartmentAssignment.id == assignment_id)
+    )
+    assignment = result.scalars().first()
 
     if not assignment:
         raise HTTPException(status_code=404, detail="Asignación no encontrada")
@@ -78,7 +97,8 @@ async def get_assignment(
 async def calculate_assignment_price(
     apartment_id: UUID,
     employee_id: UUID,
-    move_in_date: date,
+    move_in_date: Optional[date] = None,
+    month: Optional[str] = Query(None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$"),
     custom_monthly_rate: Optional[Decimal] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -86,7 +106,13 @@ async def calculate_assignment_price(
     """
     Calcular el precio de una asignación sin crearla.
     Útil para preview antes de confirmar.
+
+    Con `month` (YYYY-MM) en lugar de `move_in_date` devuelve además el coste
+    de entrada de cada día del mes, para el selector de fechas.
     """
+    if move_in_date is None and month is None:
+        raise HTTPException(status_code=400, detail="Indique move_in_date o month")
+
     apartment = db.query(Apartment).filter(Apartment.id == apartment_id).first()
     if not apartment:
         raise HTTPException(status_code=404, detail="Apartamento no encontrado")
@@ -98,22 +124,16 @@ async def calculate_assignment_price(
     # Calcular los ocupantes después de agregar al nuevo empleado
     future_occupants = apartment.current_occupants + 1
 
-    # Usar el calculador de renta
-    costs = calculate_assignment_costs(
-        apartment_monthly_rent=apartment.monthly_rent or Decimal('0'),
-        apartment_deposit=apartment.deposit or Decimal('0'),
-        apartment_key_money=apartment.key_money or Decimal('0'),
-        apartment_management_fee=apartment.management_fee or Decimal('0'),
-        apartment_pricing_type=apartment.pricing_type.value,
-        apartment_current_occupants=future_occupants,
-        apartment_utilities_included=apartment.utilities_included,
-        apartment_parking_included=apartment.parking_included,
-        apartment_parking_fee=apartment.parking_fee or Decimal('0'),
-        move_in_date=move_in_date,
-        custom_monthly_rate=custom_monthly_rate
-    )
+    days = None
+    if month:
+        year, month_number = (int(part) for part in month.split("-"))
+        days = month_costs(apartment, future_occupants, year, month_number, custom_monthly_rate)
+        move_in_date = move_in_date or date(year, month_number, 1)
 
-    return {
+    # Usar el calculador de renta (memorizado)
+    costs = assignment_costs(apartment, future_occupants, move_in_date, custom_monthly_rate)
+
+    result = {
         "apartment": {
             "id": str(apartment.id),
             "name": apartment.name,
@@ -131,6 +151,10 @@ async def calculate_assignment_price(
         "move_in_date": move_in_date.isoformat(),
         "costs": costs
     }
+    if days is not None:
+        result["month"] = month
+        result["days"] = days
+    return result
 
 
 @router.post("", response_model=AssignmentResponse)
@@ -143,107 +167,105 @@ async def create_assignment(
     Crear una nueva asignación de apartamento.
 
     FLUJO COMPLETO:
-    1. Validar que el apartamento existe y tiene capacidad
-    2. Validar que el empleado existe
-    3. Calcular el precio según el tipo de apartamento (shared/fixed)
-    4. Crear la asignación con el precio calculado
-    5. Actualizar el apartamento (incrementar ocupantes)
-    6. Si el empleado tenía apartamento anterior, liberarlo
-    7. Actualizar el empleado con el nuevo apartamento_id
+    1. Validar que el empleado y el apartamento existen
+    2. Ocupar la plaza de forma atómica (falla si el apartamento está lleno)
+    3. Si el empleado tenía apartamento anterior, cerrar la asignación y liberarlo
+    4. Calcular el precio según el tipo de apartamento (shared/fixed)
+    5. Crear la asignación con el precio calculado
+    6. Actualizar el empleado con el nuevo apartamento_id
     """
-    # 1. Obtener el apartamento
-    apartment = db.query(Apartment).filter(Apartment.id == data.apartment_id).first()
-    if not apartment:
-        raise HTTPException(status_code=404, detail="Apartamento no encontrado")
-
-    # 2. Validar capacidad
-    if apartment.current_occupants >= apartment.capacity:
-        raise HTTPException(
-            status_code=400,
-            detail=f"El apartamento está lleno ({apartment.current_occupants}/{apartment.capacity})"
-        )
-
-    # 3. Obtener el empleado
-    employee = db.query(Employee).filter(Employee.id == data.employee_id).first()
-    if not employee:
-        raise HTTPException(status_code=404, detail="Empleado no encontrado")
-
-    # 4. Si el empleado ya tiene un apartamento, marcar la asignación anterior como no actual
-    if employee.apartment_id:
-        old_assignment = db.query(ApartmentAssignment).filter(
-            and_(
-                ApartmentAssignment.employee_id == employee.id,
-                ApartmentAssignment.is_current == True
+    def work():
+        # 1. Bloquear el empleado: dos asignaciones suyas simultáneas se serializan
+        employee = occupancy.lock_employee(db, data.employee_id)
+        if not employee:
+            raise HTTPException(status_code=404, detail="Empleado no encontrado")
+
+        apartment = db.query(Apartment).filter(Apartment.id == data.apartment_id).first()
+        if not apartment:
+            raise HTTPException(status_code=404, detail="Apartamento no encontrado")
+
+        previous_apartment_id = employee.apartment_id
+
+        # 2-3. Ocupar la plaza nueva y liberar la anterior en un solo paso
+        try:
+            future_occupants, _ = occupancy.move(db, employee.apartment_id, apartment.id)
+        except occupancy.ApartmentFull as full:
+            raise HTTPException(
+                status_code=400,
+                detail=f"El apartamento está lleno ({full.occupants}/{full.capacity})"
             )
-        ).first()
 
-        if old_assignment:
-            old_assignment.is_current = False
-            old_assignment.move_out_date = data.move_in_date
+        if employee.apartment_id:
+            old_assignment = db.query(ApartmentAssignment).filter(
+                and_(
+                    ApartmentAssignment.employee_id == employee.id,
+                    ApartmentAssignment.is_current == True
+                )
+            ).first()
 
-        # Liberar el apartamento anterior
-        old_apartment = db.query(Apartment).filter(Apartment.id == employee.apartment_id).first()
-        if old_apartment:
-            old_apartment.current_occupants = max(0, old_apartment.current_occupants - 1)
-            if old_apartment.current_occupants < old_apartment.capacity:
-                old_apartment.status = ApartmentStatus.AVAILABLE
+            if old_assignment:
+                old_assignment.is_current = False
+                old_assignment.move_out_date = data.move_in_date
 
-    # 5. Calcular future occupants (después de agregar al nuevo)
-    future_occupants = apartment.current_occupants + 1
-
-    # 6. Calcular el precio mensual según el tipo de apartamento
-    if data.custom_monthly_rate:
-        # Si se especificó un precio personalizado, usarlo
-        monthly_charge = data.custom_monthly_rate
-    else:
-        # Calcular usando la calculadora de renta
-        costs = calculate_assignment_costs(
-            apartment_monthly_rent=apartment.monthly_rent or Decimal('0'),
-            apartment_deposit=apartment.deposit or Decimal('0'),
-            apartment_key_money=apartment.key_money or Decimal('0'),
-            apartment_management_fee=apartment.management_fee or Decimal('0'),
-            apartment_pricing_type=apartment.pricing_type.value,
-            apartment_current_occupants=future_occupants,
-            apartment_utilities_included=apartment.utilities_included,
-            apartment_parking_included=apartment.parking_included,
-            apartment_parking_fee=apartment.parking_fee or Decimal('0'),
-            move_in_date=data.move_in_date,
-            custom_monthly_rate=None
-        )
-
-        monthly_charge = costs["monthly_costs"]["total_monthly"]
-        deposit_amount = costs["initial_costs"]["deposit"]
-
-    # 7. Crear la asignación
-    assignment = ApartmentAssignment(
-        apartment_id=data.apartment_id,
-        employee_id=data.employee_id,
-        move_in_date=data.move_in_date,
-        move_out_date=data.move_out_date,
-        monthly_charge=monthly_charge,
-        custom_monthly_rate=data.custom_monthly_rate,
-        deposit_paid=data.deposit_paid if data.deposit_paid else deposit_amount if not data.custom_monthly_rate else Decimal('0'),
-        is_current=True,
-        notes=data.notes
-    )
+        # 4-5. Calcular el precio según el tipo de apartamento y crear la asignación
+        monthly_charge, deposit = price_assignment(apartment, future_occupants, data)
+        assignment = new_assignment(data, monthly_charge, deposit)
+        db.add(assignment)
 
-    db.add(assignment)
+        # 6. Actualizar el empleado
+        employee.apartment_id = data.apartment_id
 
-    # 8. Actualizar el apartamento
-    apartment.current_occupants = future_occupants
-    if apartment.current_occupants >= apartment.capacity:
-        apartment.status = ApartmentStatus.OCCUPIED
+        # 7. Liquidar el mes (si ya se facturó): salida del anterior y nuevo reparto en ambos
+        billing.settle(db, [previous_apartment_id, apartment.id], data.move_in_date, reason="move_in")
+        return assignment
 
-    # 9. Actualizar el empleado
-    employee.apartment_id = data.apartment_id
-
-    # 10. Commit
-    db.commit()
+    assignment = occupancy.commit_with_retry(db, work)
+    invalidate("apartments", "stats", "occupancy")
     db.refresh(assignment)
 
     return assignment
 
 
+@router.post("/bulk", response_model=AssignmentBulkResult)
+async def create_assignments_bulk(
+    data: AssignmentBulkCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Crear muchas asignaciones a la vez (entradas masivas de principio de mes).
+
+    Todo el lote se valida (capacidad incluida) y se calcula en una pasada y
+    las filas válidas se escriben en una sola transacción. Las filas con
+    error se devuelven en `errors`; con atomic=true cualquier error cancela
+    el lote entero.
+    """
+    def work():
+        created, errors = bulk_assign(db, data.assignments)
+        if errors and data.atomic:
+            db.rollback()
+            return [], errors
+        return [a.id for a in created], errors
+
+    created_ids, errors = occupancy.commit_with_retry(db, work)
+    if created_ids:
+        invalidate("apartments", "stats", "occupancy")
+
+    assignments = db.query(ApartmentAssignment).options(
+        selectinload(ApartmentAssignment.employee),
+        selectinload(ApartmentAssignment.apartment)
+    ).filter(ApartmentAssignment.id.in_(created_ids)).all() if created_ids else []
+
+    failed = len(errors)
+    return AssignmentBulkResult(
+        total_rows=len(data.assignments),
+        successful_rows=len(data.assignments) - failed if created_ids else 0,
+        failed_rows=failed,
+        errors=errors,
+        assignments=[AssignmentResponse.model_validate(a) for a in assignments]
+    )
+
+
 @router.put("/{assignment_id}", response_model=AssignmentResponse)
 async def update_assignment(
     assignment_id: UUID,
@@ -258,69 +280,81 @@ async def update_assignment(
     - Actualizar el precio personalizado (custom_monthly_rate)
     - Marcar como no actual (is_current = False)
     """
-    assignment = db.query(ApartmentAssignment).filter(
-        ApartmentAssignment.id == assignment_id
-    ).first()
+    def work():
+        # FOR UPDATE: dos salidas simultáneas no pueden liberar la plaza dos veces
+        assignment = db.query(ApartmentAssignment).filter(
+            ApartmentAssignment.id == assignment_id
+        ).with_for_update().first()
 
-    if not assignment:
-        raise HTTPException(status_code=404, detail="Asignación no encontrada")
+        if not assignment:
+            raise HTTPException(status_code=404, detail="Asignación no encontrada")
 
-    # Actualizar campos
-    if data.move_out_date is not None:
-        assignment.move_out_date = data.move_out_date
+        before = (assignment.is_current, assignment.move_out_date, assignment.custom_monthly_rate)
 
-        # Si se establece fecha de salida, marcar como no actual
-        if assignment.is_current:
-            assignment.is_current = False
+        # Actualizar campos
+        if data.move_out_date is not None:
+            assignment.move_out_date = data.move_out_date
 
-            # Liberar el apartamento
-            apartment = db.query(Apartment).filter(Apartment.id == assignment.apartment_id).first()
-            if apartment:
-                apartment.current_occupants = max(0, apartment.current_occupants - 1)
-                if apartment.current_occupants < apartment.capacity:
-                    apartment.status = ApartmentStatus.AVAILABLE
-
-            # Actualizar el empleado
-            employee = db.query(Employee).filter(Employee.id == assignment.employee_id).first()
-            if employee and employee.apartment_id == assignment.apartment_id:
-                employee.apartment_id = None
-
-    if data.monthly_charge is not None:
-        assignment.monthly_charge = data.monthly_charge
-
-    if data.custom_monthly_rate is not None:
-        assignment.custom_monthly_rate = data.custom_monthly_rate
-
-        # Recalcular monthly_charge basado en el nuevo custom rate
-        apartment = db.query(Apartment).filter(Apartment.id == assignment.apartment_id).first()
-        if apartment:
-            costs = calculate_assignment_costs(
-                apartment_monthly_rent=apartment.monthly_rent or Decimal('0'),
-                apartment_deposit=apartment.deposit or Decimal('0'),
-                apartment_key_money=apartment.key_money or Decimal('0'),
-                apartment_management_fee=apartment.management_fee or Decimal('0'),
-                apartment_pricing_type=apartment.pricing_type.value,
-                apartment_current_occupants=apartment.current_occupants,
-                apartment_utilities_included=apartment.utilities_included,
-                apartment_parking_included=apartment.parking_included,
-                apartment_parking_fee=apartment.parking_fee or Decimal('0'),
-                move_in_date=assignment.move_in_date,
-                custom_monthly_rate=data.custom_monthly_rate
-            )
-            assignment.monthly_charge = costs["monthly_costs"]["total_monthly"]
+            # Si se establece fecha de salida, marcar como no actual
+            if assignment.is_current:
+                _vacate(db, assignment)
 
-    if data.notes is not None:
-        assignment.notes = data.notes
+        if data.monthly_charge is not None:
+            assignment.monthly_charge = data.monthly_charge
 
-    if data.is_current is not None:
-        assignment.is_current = data.is_current
+        if data.custom_monthly_rate is not None:
+            assignment.custom_monthly_rate = data.custom_monthly_rate
 
-    db.commit()
+            # Recalcular monthly_charge basado en el nuevo custom rate
+            apartment = db.query(Apartment).filter(Apartment.id == assignment.apartment_id).first()
+            if apartment:
+                costs = calculate_assignment_costs(
+                    apartment_monthly_rent=apartment.monthly_rent or Decimal('0'),
+                    apartment_deposit=apartment.deposit or Decimal('0'),
+                    apartment_key_money=apartment.key_money or Decimal('0'),
+                    apartment_management_fee=apartment.management_fee or Decimal('0'),
+                    apartment_pricing_type=apartment.pricing_type.value,
+                    apartment_current_occupants=apartment.current_occupants,
+                    apartment_utilities_included=apartment.utilities_included,
+                    apartment_parking_included=apartment.parking_included,
+                    apartment_parking_fee=apartment.parking_fee or Decimal('0'),
+                    move_in_date=assignment.move_in_date,
+                    custom_monthly_rate=data.custom_monthly_rate
+                )
+                assignment.monthly_charge = costs["monthly_costs"]["total_monthly"]
+
+        if data.notes is not None:
+            assignment.notes = data.notes
+
+        # Cerrar una asignación a mano también libera la plaza
+        if data.is_current is False and assignment.is_current:
+            _vacate(db, assignment)
+        elif data.is_current is not None:
+            assignment.is_current = data.is_current
+
+        # Liquidar desde la fecha de salida más temprana (o desde este mes)
+        if (assignment.is_current, assignment.move_out_date, assignment.custom_monthly_rate) != before:
+            dates = [d for d in (before[1], assignment.move_out_date) if d]
+            billing.settle(db, [assignment.apartment_id], min(dates, default=date.today()), reason="update")
+
+        return assignment
+
+    assignment = occupancy.commit_with_retry(db, work)
+    invalidate("apartments", "stats", "occupancy")
     db.refresh(assignment)
 
     return assignment
 
 
+def _vacate(db: Session, assignment: ApartmentAssignment) -> None:
+    """Cierra una asignación actual: libera la plaza y desvincula al empleado"""
+    assignment.is_current = False
+    employee = occupancy.lock_employee(db, assignment.employee_id)
+    occupancy.release(db, assignment.apartment_id)
+    if employee and employee.apartment_id == assignment.apartment_id:
+        employee.apartment_id = None
+
+
 @router.delete("/{assignment_id}")
 async def delete_assignment(
     assignment_id: UUID,
@@ -331,26 +365,24 @@ async def delete_assignment(
     Eliminar una asignación.
     IMPORTANTE: Esto también libera el apartamento y actualiza el empleado.
     """
-    assignment = db.query(ApartmentAssignment).filter(
-        ApartmentAssignment.id == assignment_id
-    ).first()
+    def work():
+        assignment = db.query(ApartmentAssignment).filter(
+            ApartmentAssignment.id == assignment_id
+        ).with_for_update().first()
 
-    if not assignment:
-        raise HTTPException(status_code=404, detail="Asignación no encontrada")
+        if not assignment:
+            raise HTTPException(status_code=404, detail="Asignación no encontrada")
+
+        # Si es la asignación actual, liberar el apartamento
+        if assignment.is_current:
+            _vacate(db, assignment)
 
-    # Si es la asignación actual, liberar el apartamento
-    if assignment.is_current:
-        apartment = db.query(Apartment).filter(Apartment.id == assignment.apartment_id).first()
-        if apartment:
-            apartment.current_occupants = max(0, apartment.current_occupants - 1)
-            if apartment.current_occupants < apartment.capacity:
-                apartment.status = ApartmentStatus.AVAILABLE
+        db.delete(assignment)
 
-        employee = db.query(Employee).filter(Employee.id == assignment.employee_id).first()
-        if employee and employee.apartment_id == assignment.apartment_id:
-            employee.apartment_id = None
+        # Sus líneas se borran en cascada; los demás ocupantes se vuelven a repartir
+        billing.settle(db, [assignment.apartment_id], assignment.move_in_date, reason="delete")
 
-    db.delete(assignment)
-    db.commit()
+    occupancy.commit_with_retry(db, work)
+    invalidate("apartments", "stats", "occupancy")
 
     return {"message": "Asignación eliminada", "id": str(assignment_id)}
@@ -11,13 +11,15 @@ from app.core.security import (
     verify_password, 
     create_access_token, 
     get_current_user,
-    get_password_hash
+    get_password_hash,
+    invalidate_cached_user
 )
+from app.core.routing import ThreadpoolRoute
 from app.core.config import settings
 from app.models.models import User
 from app.schemas.schemas import Token, UserResponse, LoginRequest, UserCreate
 
-router = APIRouter(prefix="/auth", tags=["Authentication"])
+router = APIRouter(prefix="/auth", tags=["Authentication"], route_class=ThreadpoolRoute)
 
 
 @router.post("/login", response_model=Token)
@@ -116,6 +118,7 @@ async def register_user(
     
     db.add(new_user)
     db.commit()
+    invalidate_cached_user(new_user.username)
     db.refresh(new_user)
     
     return new_user
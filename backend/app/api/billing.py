@@ -0,0 +1,127 @@
+"""
+Billing API - Monthly billing runs and the charge ledger
+"""
+
+from datetime import date
+from typing import List, Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, Query, Response, status
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_db, get_async_db
+from app.core.security import get_current_user
+from app.core.routing import ThreadpoolRoute
+from app.core.jobs import enqueue, job_response
+from app.core.pagination import Keyset, set_next_cursor
+from app.services import billing
+from app.models.models import ChargeAdjustment, MonthlyCharge, User
+from app.schemas.schemas import JobResponse, MonthlyChargeResponse, ChargeAdjustmentResponse, BillingSummary
+
+router = APIRouter(prefix="/billing", tags=["Billing (請求)"], route_class=ThreadpoolRoute)
+
+CHARGE_KEYSET = Keyset(MonthlyCharge.apartment_id, MonthlyCharge.id)
+# Most recent first
+ADJUSTMENT_KEYSET = Keyset(ChargeAdjustment.created_at, ChargeAdjustment.id, descending=True)
+
+
+@router.post("/runs", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def run_billing(
+    year: int = Query(..., ge=2000, le=2100),
+    month: int = Query(..., ge=1, le=12),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Compute the charges of every assignment that occupies the month in the
+    background (poll /jobs/{id}). Running a month again replaces its ledger.
+    """
+    job = enqueue(db, "billing_run", billing.run_billing, year, month, user_id=current_user.id)
+    return job_response(job)
+
+
+@router.get("/charges", response_model=List[MonthlyChargeResponse])
+async def list_charges(
+    response: Response,
+    year: int = Query(..., ge=2000, le=2100),
+    month: int = Query(..., ge=1, le=12),
+    apartment_id: Optional[UUID] = None,
+    employee_id: Optional[UUID] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """List the ledger lines of a month (offset or cursor pagination)"""
+    query = select(MonthlyCharge).where(MonthlyCharge.billing_month == date(year, month, 1))
+    if apartment_id:
+        query = query.where(MonthlyCharge.apartment_id == apartment_id)
+    if employee_id:
+        query = query.where(MonthlyCharge.employee_id == employee_id)
+
+    result = await db.execute(CHARGE_KEYSET.page(query, skip, limit, cursor))
+    charges = result.scalars().all()
+    set_next_cursor(response, CHARGE_KEYSET.next_cursor(charges, limit))
+    return charges
+
+
+@router.get("/adjustments", response_model=List[ChargeAdjustmentResponse])
+async def list_adjustments(
+    response: Response,
+    year: int = Query(..., ge=2000, le=2100),
+    month: int = Query(..., ge=1, le=12),
+    apartment_id: Optional[UUID] = None,
+    employee_id: Optional[UUID] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """List the settlement adjustments of a month (offset or cursor pagination)"""
+    query = select(ChargeAdjustment).where(ChargeAdjustment.billing_month == date(year, month, 1))
+    if apartment_id:
+        query = query.where(ChargeAdjustment.apartment_id == apartment_id)
+    if employee_id:
+        query = query.where(ChargeAdjustment.employee_id == employee_id)
+
+    result = await db.execute(ADJUSTMENT_KEYSET.page(query, skip, limit, cursor))
+    adjustments = result.scalars().all()
+    set_next_cursor(response, ADJUSTMENT_KEYSET.next_cursor(adjustments, limit))
+    return adjustments
+
+
+@router.get("/summary", response_model=BillingSummary)
+async def billing_summary(
+    year: int = Query(..., ge=2000, le=2100),
+    month: int = Query(..., ge=1, le=12),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Totals of a month's ledger; net_total includes the settlement adjustments"""
+    billing_month = date(year, month, 1)
+    row = (await db.execute(
+        select(
+            func.count().label("assignments"),
+            func.count(func.distinct(MonthlyCharge.apartment_id)).label("apartments"),
+            func.count(func.distinct(MonthlyCharge.employee_id)).label("employees"),
+            func.coalesce(func.sum(MonthlyCharge.rent), 0).label("rent"),
+            func.coalesce(func.sum(MonthlyCharge.management_fee), 0).label("management_fee"),
+            func.coalesce(func.sum(MonthlyCharge.parking), 0).label("parking"),
+            func.coalesce(func.sum(MonthlyCharge.utilities), 0).label("utilities"),
+            func.coalesce(func.sum(MonthlyCharge.total), 0).label("total"),
+        ).where(MonthlyCharge.billing_month == billing_month)
+    )).one()
+    adjustments = (await db.execute(
+        select(
+            func.count().label("adjustments"),
+            func.coalesce(func.sum(ChargeAdjustment.total), 0).label("adjustments_total"),
+        ).where(ChargeAdjustment.billing_month == billing_month)
+    )).one()
+    return BillingSummary(
+        billing_month=billing_month,
+        **row._asdict(),
+        **adjustments._asdict(),
+        net_total=row.total + adjustments.adjustments_total
+    )
@@ -5,23 +5,35 @@ Data Management API - Gestión de datos de todas las tablas
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import text, inspect
+from sqlalchemy import select, text, inspect
 from typing import List, Optional, Any
 import json
-import csv
-import io
 from datetime import datetime, date
 from decimal import Decimal
 from uuid import UUID
 
 from ..core.database import get_db
-from ..core.security import get_current_user
+from ..core.cache import CACHE_NAMESPACES, invalidate
+from ..core.security import get_current_user, invalidate_cached_user
+from ..core.routing import ThreadpoolRoute
+from ..core.jobs import JobContext, enqueue, job_response
+from ..core.pagination import Keyset
+from ..services.search import SearchFields, TABLE_SEARCH
+from ..services.occupancy import reconcile
+from ..services.table_import import read_records, import_table_frame
+from ..services.factory_catalog import basedatejp_path
+from ..services.basedatejp_sync import sync_basedatejp
+from ..services.exporters import (
+    csv_chunks, json_chunks, excel_chunks, streaming_download,
+    ExcelSheet, EXCEL_AVAILABLE, EXCEL_MEDIA_TYPE
+)
 from ..models.models import (
     User, Factory, Apartment, Employee,
     ApartmentAssignment, ImportLog, AuditLog
 )
+from ..schemas.schemas import JobResponse
 
-router = APIRouter(prefix="/data", tags=["Data Management"])
+router = APIRouter(prefix="/data", tags=["Data Management"], route_class=ThreadpoolRoute)
 
 # Mapeo de nombres de tabla a modelos
 TABLE_MODELS = {
@@ -33,6 +45,18 @@ TABLE_MODELS = {
     "users": User,
 }
 
+# Tablas cuyas escrituras cambian la ocupación de los apartamentos
+OCCUPANCY_TABLES = {"apartments", "employees", "apartment_assignments"}
+
+
+def _reconcile_occupancy(db: Session, table_name: str) -> None:
+    """Las escrituras directas no pasan por services.occupancy: corregir los apartamentos afectados"""
+    if table_name in OCCUPANCY_TABLES:
+        # Sin autoflush: los triggers deben marcar los apartamentos antes de reconcile
+        db.flush()
+        reconcile(db)
+
+
 def serialize_value(value):
     """Serializar valores para JSON"""
     if value is None:
@@ -104,41 +128,52 @@ async def get_table_info(
     }
 
 
+def _text_fields(model) -> Optional[SearchFields]:
+    """Campos VARCHAR/TEXT de una tabla sin búsqueda definida"""
+    columns = [
+        column for column in model.__table__.columns
+        if 'VARCHAR' in str(column.type).upper() or 'TEXT' in str(column.type).upper()
+    ]
+    return SearchFields(*columns) if columns else None
+
+
 @router.get("/tables/{table_name}/records")
 async def get_table_records(
     table_name: str,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
     search: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Obtener registros de una tabla con paginación"""
+    """
+    Obtener registros de una tabla con paginación (por offset o por cursor ordenado por id).
+    Con cursor no se cuenta el total (total = null): las páginas siguientes no lo necesitan.
+    """
     if table_name not in TABLE_MODELS:
         raise HTTPException(status_code=404, detail=f"Tabla '{table_name}' no encontrada")
 
     model = TABLE_MODELS[table_name]
     query = db.query(model)
 
-    # Búsqueda simple en campos de texto
-    if search:
-        search_filter = []
-        for column in model.__table__.columns:
-            if 'VARCHAR' in str(column.type).upper() or 'TEXT' in str(column.type).upper():
-                search_filter.append(column.ilike(f"%{search}%"))
-        if search_filter:
-            from sqlalchemy import or_
-            query = query.filter(or_(*search_filter))
+    # Búsqueda: columnas con índice trigram si la tabla las tiene, si no todos los campos de texto
+    fields = TABLE_SEARCH.get(table_name) or _text_fields(model)
+    rank = None
+    if fields:
+        query, rank = fields.apply(query, search)
 
-    total = query.count()
-    records = query.offset(skip).limit(limit).all()
+    total = query.count() if cursor is None else None
+    keyset = Keyset(model.__table__.c.id)
+    records = [row_to_dict(r) for r in keyset.page(query, skip, limit, cursor, rank).all()]
 
     return {
         "table_name": table_name,
         "total": total,
         "skip": skip,
         "limit": limit,
-        "records": [row_to_dict(r) for r in records]
+        "records": records,
+        "next_cursor": keyset.next_cursor(records, limit, Keyset.is_ranked(rank, cursor))
     }
 
 
@@ -183,7 +218,11 @@ async def create_record(
     try:
         record = model(**data)
         db.add(record)
+        _reconcile_occupancy(db, table_name)
         db.commit()
+        invalidate()
+        if table_name == "users":
+            invalidate_cached_user(record.username)
         db.refresh(record)
         return row_to_dict(record)
     except Exception as e:
@@ -214,11 +253,20 @@ async def update_record(
     data.pop('created_at', None)
     data.pop('updated_at', None)
 
+    # Usuario original (para invalidar la caché de autenticación)
+    old_username = getattr(record, 'username', None) if table_name == "users" else None
+
     try:
         for key, value in data.items():
             if hasattr(record, key):
                 setattr(record, key, value)
+        _reconcile_occupancy(db, table_name)
         db.commit()
+        invalidate()
+        if table_name == "users":
+            invalidate_cached_user(old_username)
+            if record.username != old_username:
+                invalidate_cached_user(record.username)
         db.refresh(record)
         return row_to_dict(record)
     except Exception as e:
@@ -243,9 +291,15 @@ async def delete_record(
     if not record:
         raise HTTPException(status_code=404, detail="Registro no encontrado")
 
+    old_username = getattr(record, 'username', None) if table_name == "users" else None
+
     try:
         db.delete(record)
+        _reconcile_occupancy(db, table_name)
         db.commit()
+        invalidate()
+        if table_name == "users":
+            invalidate_cached_user(old_username)
         return {"message": "Registro eliminado", "id": record_id}
     except Exception as e:
         db.rollback()
@@ -273,7 +327,9 @@ async def delete_all_records(
 
     try:
         count = db.query(model).delete()
+        _reconcile_occupancy(db, table_name)
         db.commit()
+        invalidate()
         return {"message": f"Eliminados {count} registros de {table_name}"}
     except Exception as e:
         db.rollback()
@@ -283,353 +339,176 @@ async def delete_all_records(
 @router.get("/tables/{table_name}/export")
 async def export_table(
     table_name: str,
-    format: str = Query("json", regex="^(json|csv)$"),
-    db: Session = Depends(get_db),
+    format: str = Query("json", pattern="^(json|csv|xlsx)$"),
+    gzip: bool = False,
     current_user: User = Depends(get_current_user)
 ):
-    """Exportar tabla a JSON o CSV"""
+    """Exportar tabla a JSON, CSV o Excel (por streaming, opcionalmente comprimido)"""
     if table_name not in TABLE_MODELS:
         raise HTTPException(status_code=404, detail=f"Tabla '{table_name}' no encontrada")
 
-    model = TABLE_MODELS[table_name]
-    records = db.query(model).all()
-    data = [row_to_dict(r) for r in records]
+    table = TABLE_MODELS[table_name].__table__
+    columns = [c.name for c in table.columns]
+    statement = select(table)
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"{table_name}_{timestamp}"
 
     if format == "json":
-        content = json.dumps(data, ensure_ascii=False, indent=2, default=str)
-        return StreamingResponse(
-            io.BytesIO(content.encode('utf-8')),
-            media_type="application/json",
-            headers={"Content-Disposition": f"attachment; filename={filename}.json"}
+        chunks = json_chunks(
+            statement,
+            lambda row: {name: serialize_value(value) for name, value in zip(columns, row)}
         )
+        return streaming_download(chunks, f"{filename}.json", "application/json", gzip=gzip)
+    elif format == "xlsx":
+        if not EXCEL_AVAILABLE:
+            raise HTTPException(status_code=400, detail="La exportación a Excel requiere openpyxl")
+        chunks = excel_chunks(statement, ExcelSheet(table_name, columns))
+        return streaming_download(chunks, f"{filename}.xlsx", EXCEL_MEDIA_TYPE)
     else:  # CSV
-        if not data:
-            return StreamingResponse(
-                io.BytesIO(b""),
-                media_type="text/csv",
-                headers={"Content-Disposition": f"attachment; filename={filename}.csv"}
-            )
-
-        output = io.StringIO()
-        writer = csv.DictWriter(output, fieldnames=data[0].keys())
-        writer.writeheader()
-        writer.writerows(data)
-
-        return StreamingResponse(
-            io.BytesIO(output.getvalue().encode('utf-8')),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={filename}.csv"}
+        chunks = csv_chunks(
+            statement,
+            columns,
+            lambda row: [serialize_value(value) for value in row]
         )
+        return streaming_download(chunks, f"{filename}.csv", "text/csv", gzip=gzip)
+
+
+def run_table_import(
+    db: Session,
+    job: JobContext,
+    table_name: str,
+    content: bytes,
+    filename: str,
+    mode: str,
+    sheet_name: Optional[str],
+    user_id: UUID
+) -> dict:
+    """Importación a una tabla (se ejecuta en un proceso de background)"""
+    model = TABLE_MODELS[table_name]
+
+    # Leer el fichero desde memoria (una sola vez)
+    df = read_records(content, filename, sheet_name)
+    job.progress(0, len(df), force=True)
+
+    # Si mode es replace, eliminar todos los registros existentes
+    if mode == "replace":
+        db.query(model).delete()
+
+    # Resolver columnas, convertir tipos e insertar por lotes
+    result = import_table_frame(db, model, df, progress=job.progress)
+
+    _reconcile_occupancy(db, table_name)
+
+    # Log de importación
+    log = ImportLog(
+        import_type=f"data_import_{table_name}",
+        file_name=filename,
+        total_rows=result["total"],
+        successful_rows=result["success"],
+        failed_rows=result["failed"],
+        errors=result["errors"][:50],
+        imported_by=user_id
+    )
+    db.add(log)
+    db.flush()
+
+    return {
+        "message": f"Importación completada",
+        "table": table_name,
+        "mode": mode,
+        "total": result["total"],
+        "success": result["success"],
+        "failed": result["failed"],
+        "columns_used": result["columns_used"],
+        "columns_skipped": result["columns_skipped"][:20],
+        "errors": result["errors"][:10],
+        "total_rows": result["total"],
+        "successful_rows": result["success"],
+        "failed_rows": result["failed"],
+        "import_log_id": log.id
+    }
 
 
-@router.post("/tables/{table_name}/import")
+@router.post("/tables/{table_name}/import", response_model=JobResponse, status_code=202)
 async def import_to_table(
     table_name: str,
     file: UploadFile = File(...),
-    mode: str = Query("append", regex="^(append|replace)$"),
+    mode: str = Query("append", pattern="^(append|replace)$"),
     sheet_name: Optional[str] = Query(None, description="Nombre de la hoja Excel"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Importar datos a una tabla desde JSON, CSV o Excel (solo columnas que existen en la tabla)"""
+    """
+    Importar datos a una tabla desde JSON, CSV o Excel (solo columnas que existen en la tabla).
+    La importación se ejecuta en segundo plano; el progreso se consulta en /jobs/{id}.
+    """
     if table_name not in TABLE_MODELS:
         raise HTTPException(status_code=404, detail=f"Tabla '{table_name}' no encontrada")
 
     if table_name == "users":
         raise HTTPException(status_code=403, detail="No se puede importar a la tabla de usuarios")
 
-    model = TABLE_MODELS[table_name]
-
-    # Obtener columnas válidas de la tabla
-    valid_columns = {col.name for col in model.__table__.columns}
-    # Excluir campos auto-generados
-    excluded_columns = {'id', 'created_at', 'updated_at'}
-    valid_columns = valid_columns - excluded_columns
+    if not file.filename.lower().endswith(('.json', '.csv', '.xlsx', '.xls', '.xlsm')):
+        raise HTTPException(status_code=400, detail="Formato no soportado. Usa JSON, CSV o Excel (.xlsx, .xls, .xlsm)")
 
-    # Leer archivo
     content = await file.read()
-    filename = file.filename.lower()
-
-    try:
-        data = []
-
-        if filename.endswith('.json'):
-            data = json.loads(content.decode('utf-8'))
-            # Si es un objeto con key 'records' o similar, extraer la lista
-            if isinstance(data, dict):
-                for key in ['records', 'data', 'employees', 'apartments', 'factories', 'assignments']:
-                    if key in data:
-                        data = data[key]
-                        break
-
-        elif filename.endswith('.csv'):
-            reader = csv.DictReader(io.StringIO(content.decode('utf-8')))
-            data = list(reader)
-
-        elif filename.endswith(('.xlsx', '.xls', '.xlsm')):
-            # Importar Excel con pandas
-            import pandas as pd
-
-            # Guardar temporalmente el archivo
-            temp_path = f"/tmp/{file.filename}"
-            with open(temp_path, 'wb') as f:
-                f.write(content)
-
-            try:
-                # Leer Excel
-                if sheet_name:
-                    df = pd.read_excel(temp_path, sheet_name=sheet_name)
-                else:
-                    # Si no se especifica hoja, usar la primera
-                    xl = pd.ExcelFile(temp_path)
-                    df = pd.read_excel(temp_path, sheet_name=xl.sheet_names[0])
-
-                # Convertir a lista de diccionarios
-                df = df.where(pd.notnull(df), None)
-                data = df.to_dict('records')
-            finally:
-                import os
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-        else:
-            raise HTTPException(status_code=400, detail="Formato no soportado. Usa JSON, CSV o Excel (.xlsx, .xls, .xlsm)")
-
-        if not isinstance(data, list):
-            raise HTTPException(status_code=400, detail="Los datos deben ser una lista de registros")
-
-        # Si mode es replace, eliminar todos los registros existentes
-        if mode == "replace":
-            db.query(model).delete()
-
-        # Importar registros
-        success = 0
-        errors = []
-        skipped_columns = set()
-
-        for i, row in enumerate(data):
-            try:
-                # Filtrar solo columnas válidas
-                filtered_row = {}
-                for key, value in row.items():
-                    # Normalizar nombre de columna (quitar espacios, etc)
-                    clean_key = str(key).strip().lower().replace(' ', '_').replace('-', '_')
-
-                    # Buscar coincidencia exacta o similar
-                    matched_col = None
-                    if clean_key in valid_columns:
-                        matched_col = clean_key
-                    else:
-                        # Buscar en columnas válidas
-                        for valid_col in valid_columns:
-                            if valid_col.lower() == clean_key:
-                                matched_col = valid_col
-                                break
-
-                    if matched_col:
-                        # Convertir valores
-                        if value == '' or value == 'null' or value == 'None' or (isinstance(value, float) and pd.isna(value) if 'pd' in dir() else False):
-                            filtered_row[matched_col] = None
-                        else:
-                            filtered_row[matched_col] = value
-                    else:
-                        skipped_columns.add(str(key))
-
-                if filtered_row:  # Solo crear si hay datos válidos
-                    record = model(**filtered_row)
-                    db.add(record)
-                    success += 1
-
-            except Exception as e:
-                errors.append({"row": i + 1, "error": str(e)[:200]})
-
-        db.commit()
-
-        # Log de importación
-        log = ImportLog(
-            import_type=f"data_import_{table_name}",
-            file_name=file.filename,
-            total_rows=len(data),
-            successful_rows=success,
-            failed_rows=len(errors),
-            errors=errors[:50],
-            imported_by=current_user.id
-        )
-        db.add(log)
-        db.commit()
-
-        return {
-            "message": f"Importación completada",
-            "table": table_name,
-            "mode": mode,
-            "total": len(data),
-            "success": success,
-            "failed": len(errors),
-            "columns_used": list(valid_columns),
-            "columns_skipped": list(skipped_columns)[:20],
-            "errors": errors[:10]
-        }
-
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=400, detail="Error al parsear JSON")
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-
-
-@router.post("/import-from-basedatejp")
+    job = enqueue(
+        db, f"data_import_{table_name}", run_table_import,
+        table_name, content, file.filename, mode, sheet_name, current_user.id,
+        file_name=file.filename, user_id=current_user.id, invalidates=CACHE_NAMESPACES
+    )
+    return job_response(job)
+
+
+def run_basedatejp_import(
+    db: Session,
+    job: JobContext,
+    mode: str = "full",
+    dry_run: bool = False,
+    user_id: Optional[UUID] = None
+) -> dict:
+    """Importar BASEDATEJP/*.json (se ejecuta en un proceso de background, ver services.basedatejp_sync)"""
+    result = sync_basedatejp(
+        db, basedatejp_path(), full=(mode == "full"), dry_run=dry_run,
+        progress=lambda step, total: job.progress(step, total, force=True)
+    )
+    if dry_run:
+        return {"message": "Simulación de importación desde BASEDATEJP", **result}
+
+    # Log de importación
+    log = ImportLog(
+        import_type="basedatejp",
+        file_name=f"BASEDATEJP ({mode})",
+        total_rows=result["total_rows"],
+        successful_rows=result["successful_rows"],
+        failed_rows=result["failed_rows"],
+        errors=result["errors"][:50],
+        imported_by=user_id
+    )
+    db.add(log)
+    db.flush()
+
+    return {"message": "Importación desde BASEDATEJP completada", **result, "import_log_id": log.id}
+
+
+@router.post("/import-from-basedatejp", response_model=JobResponse, status_code=202)
 async def import_from_basedatejp(
+    mode: str = Query("full", pattern="^(full|sync)$"),
+    dry_run: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Importar todos los datos desde BASEDATEJP/*.json"""
-    import os
-
-    base_path = "/app/BASEDATEJP" if os.path.exists("/app/BASEDATEJP") else "BASEDATEJP"
-
-    results = {
-        "factories": {"success": 0, "errors": []},
-        "apartments": {"success": 0, "errors": []},
-        "employees": {"success": 0, "errors": []},
-        "assignments": {"success": 0, "errors": []}
-    }
-
-    try:
-        # 1. Importar fábricas desde factories_index.json
-        factories_file = os.path.join(base_path, "factories_index.json")
-        if os.path.exists(factories_file):
-            with open(factories_file, 'r', encoding='utf-8') as f:
-                factories_data = json.load(f)
-
-            factories_list = factories_data.get('factories', [])
-            for fac in factories_list:
-                try:
-                    factory = Factory(
-                        factory_code=fac.get('factory_id', '').replace(' ', '_')[:20],
-                        name=fac.get('client_company', '').strip()[:100],
-                        name_japanese=fac.get('client_company', '').strip()[:100],
-                        address=fac.get('plant_address', '')[:255],
-                        phone=fac.get('plant_phone', '')[:20]
-                    )
-                    db.add(factory)
-                    results["factories"]["success"] += 1
-                except Exception as e:
-                    results["factories"]["errors"].append(str(e)[:100])
-            db.commit()
-
-        # 2. Importar apartamentos
-        apartments_file = os.path.join(base_path, "apartments.json")
-        if os.path.exists(apartments_file):
-            with open(apartments_file, 'r', encoding='utf-8') as f:
-                apartments_data = json.load(f)
-
-            apartments_list = apartments_data.get('apartments', [])
-            for apt in apartments_list:
-                try:
-                    apartment = Apartment(
-                        apartment_code=apt.get('apartment_code', '')[:20],
-                        name=apt.get('name', '')[:100],
-                        address=apt.get('address', '')[:255],
-                        prefecture=apt.get('prefecture', '')[:50],
-                        city=apt.get('city', '')[:50],
-                        postal_code=apt.get('postal_code', '')[:10],
-                        capacity=apt.get('capacity', 1),
-                        current_occupants=apt.get('current_occupants', 0),
-                        status=apt.get('status', 'available')
-                    )
-                    db.add(apartment)
-                    results["apartments"]["success"] += 1
-                except Exception as e:
-                    results["apartments"]["errors"].append(str(e)[:100])
-            db.commit()
-
-        # 3. Importar empleados
-        employees_file = os.path.join(base_path, "employees.json")
-        if os.path.exists(employees_file):
-            with open(employees_file, 'r', encoding='utf-8') as f:
-                employees_data = json.load(f)
-
-            employees_list = employees_data.get('employees', [])
-
-            # Crear mapeo de códigos a IDs
-            factory_map = {f.factory_code: f.id for f in db.query(Factory).all()}
-            apartment_map = {a.apartment_code: a.id for a in db.query(Apartment).all()}
-
-            for emp in employees_list:
-                try:
-                    # Buscar factory_id
-                    factory_id = None
-                    factory_name = emp.get('factory_name', '')
-                    for code, fid in factory_map.items():
-                        if factory_name and factory_name in code:
-                            factory_id = fid
-                            break
-
-                    # Buscar apartment_id
-                    apartment_id = apartment_map.get(emp.get('apartment_code'))
-
-                    employee = Employee(
-                        employee_code=emp.get('employee_code', '')[:20],
-                        full_name_roman=emp.get('full_name_roman', '')[:100],
-                        full_name_furigana=emp.get('full_name_furigana', '')[:100],
-                        nationality=emp.get('nationality', '')[:50],
-                        gender=emp.get('gender'),
-                        date_of_birth=emp.get('date_of_birth'),
-                        address=emp.get('address', '')[:255],
-                        postal_code=emp.get('postal_code', '')[:10],
-                        visa_type=emp.get('visa_type', '')[:50],
-                        visa_expiry=emp.get('visa_expiry'),
-                        employment_start_date=emp.get('employment_start_date'),
-                        employment_end_date=emp.get('employment_end_date'),
-                        contract_type=emp.get('contract_type', 'dispatch'),
-                        hourly_rate=emp.get('hourly_rate'),
-                        status=emp.get('status', 'active'),
-                        factory_id=factory_id,
-                        apartment_id=apartment_id
-                    )
-                    db.add(employee)
-                    results["employees"]["success"] += 1
-                except Exception as e:
-                    results["employees"]["errors"].append(f"{emp.get('employee_code')}: {str(e)[:80]}")
-            db.commit()
-
-        # 4. Importar asignaciones
-        assignments_file = os.path.join(base_path, "apartment_assignments.json")
-        if os.path.exists(assignments_file):
-            with open(assignments_file, 'r', encoding='utf-8') as f:
-                assignments_data = json.load(f)
-
-            assignments_list = assignments_data.get('assignments', [])
-
-            # Actualizar mapeos
-            employee_map = {e.employee_code: e.id for e in db.query(Employee).all()}
-            apartment_map = {a.apartment_code: a.id for a in db.query(Apartment).all()}
-
-            for asn in assignments_list:
-                try:
-                    emp_id = employee_map.get(asn.get('employee_code'))
-                    apt_id = apartment_map.get(asn.get('apartment_code'))
-
-                    if emp_id and apt_id:
-                        assignment = ApartmentAssignment(
-                            employee_id=emp_id,
-                            apartment_id=apt_id,
-                            move_in_date=asn.get('move_in_date') or datetime.now().date(),
-                            is_current=asn.get('is_current', True)
-                        )
-                        db.add(assignment)
-                        results["assignments"]["success"] += 1
-                except Exception as e:
-                    results["assignments"]["errors"].append(str(e)[:100])
-            db.commit()
-
-        return {
-            "message": "Importación desde BASEDATEJP completada",
-            "results": results
-        }
-
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
+    """
+    Importar todos los datos desde BASEDATEJP/*.json (en segundo plano, ver /jobs/{id}).
+
+    - full: reescribe todos los registros (altas y actualizaciones por código)
+    - sync: solo los registros nuevos, modificados o eliminados desde la última
+      importación, comparando el hash de su contenido
+    - dry_run: solo informa de la diferencia, sin escribir
+    """
+    job = enqueue(
+        db, "basedatejp", run_basedatejp_import, mode, dry_run, current_user.id,
+        user_id=current_user.id, invalidates=() if dry_run else CACHE_NAMESPACES
+    )
+    return job_response(job)
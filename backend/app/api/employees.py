@@ -4,11 +4,18 @@ Employees API (従業員)
 
 from typing import List, Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, or_
-from app.core.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from app.core.database import get_db, get_async_db
+from app.core.cache import cached, invalidate
 from app.core.security import get_current_user
+from app.core.routing import ThreadpoolRoute
+from app.core.pagination import Keyset, set_next_cursor
+from app.services.stats import get_employee_stats
+from app.services.search import EMPLOYEE_SEARCH
+from app.services import occupancy
 from app.models.models import Employee, Factory, Apartment, EmployeeStatus, User
 from app.schemas.schemas import (
     EmployeeCreate, 
@@ -17,131 +24,100 @@ from app.schemas.schemas import (
     EmployeeStatusEnum
 )
 
-router = APIRouter(prefix="/employees", tags=["Employees (従業員)"])
+router = APIRouter(prefix="/employees", tags=["Employees (従業員)"], route_class=ThreadpoolRoute)
+
+EMPLOYEE_KEYSET = Keyset(Employee.employee_code)
 
 
 @router.get("/", response_model=List[EmployeeResponse])
 async def list_employees(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
     status: Optional[EmployeeStatusEnum] = None,
     factory_id: Optional[UUID] = None,
     apartment_id: Optional[UUID] = None,
     has_apartment: Optional[bool] = None,
     search: Optional[str] = None,
     is_active: bool = True,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    """List all employees with optional filters"""
-    query = db.query(Employee).options(
+    """List all employees with optional filters (offset or cursor pagination; searches rank by relevance)"""
+    query = select(Employee).options(
         joinedload(Employee.factory),
         joinedload(Employee.apartment)
-    ).filter(Employee.is_active == is_active)
+    ).where(Employee.is_active == is_active)
     
     if status:
-        query = query.filter(Employee.status == status.value)
+        query = query.where(Employee.status == status.value)
     
     if factory_id:
-        query = query.filter(Employee.factory_id == factory_id)
+        query = query.where(Employee.factory_id == factory_id)
     
     if apartment_id:
-        query = query.filter(Employee.apartment_id == apartment_id)
+        query = query.where(Employee.apartment_id == apartment_id)
     
     if has_apartment is not None:
         if has_apartment:
-            query = query.filter(Employee.apartment_id.isnot(None))
+            query = query.where(Employee.apartment_id.isnot(None))
         else:
-            query = query.filter(Employee.apartment_id.is_(None))
+            query = query.where(Employee.apartment_id.is_(None))
     
-    if search:
-        query = query.filter(
-            or_(
-                Employee.full_name_roman.ilike(f"%{search}%"),
-                Employee.full_name_kanji.ilike(f"%{search}%"),
-                Employee.employee_code.ilike(f"%{search}%"),
-                Employee.phone.ilike(f"%{search}%")
-            )
-        )
+    query, rank = EMPLOYEE_SEARCH.apply(query, search)
     
-    employees = query.order_by(Employee.employee_code).offset(skip).limit(limit).all()
+    result = await db.execute(EMPLOYEE_KEYSET.page(query, skip, limit, cursor, rank))
+    employees = result.scalars().all()
+    ranked = Keyset.is_ranked(rank, cursor)
+    set_next_cursor(response, EMPLOYEE_KEYSET.next_cursor(employees, limit, ranked))
     return employees
 
 
 @router.get("/stats")
+@cached("stats")
 async def get_employees_stats(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get employee statistics"""
-    total = db.query(func.count(Employee.id)).filter(Employee.is_active == True).scalar()
-    active = db.query(func.count(Employee.id)).filter(
-        Employee.is_active == True,
-        Employee.status == EmployeeStatus.ACTIVE
-    ).scalar()
-    with_apartment = db.query(func.count(Employee.id)).filter(
-        Employee.is_active == True,
-        Employee.apartment_id.isnot(None)
-    ).scalar()
-    without_apartment = db.query(func.count(Employee.id)).filter(
-        Employee.is_active == True,
-        Employee.apartment_id.is_(None)
-    ).scalar()
-    
-    # By nationality
-    by_nationality = db.query(
-        Employee.nationality,
-        func.count(Employee.id)
-    ).filter(
-        Employee.is_active == True
-    ).group_by(Employee.nationality).all()
-    
-    # By factory
-    by_factory = db.query(
-        Factory.name,
-        func.count(Employee.id)
-    ).join(Factory, Employee.factory_id == Factory.id).filter(
-        Employee.is_active == True
-    ).group_by(Factory.name).all()
-    
-    return {
-        "total": total,
-        "active": active,
-        "with_apartment": with_apartment,
-        "without_apartment": without_apartment,
-        "by_nationality": dict(by_nationality),
-        "by_factory": dict(by_factory)
-    }
+    return await get_employee_stats(db)
 
 
 @router.get("/without-apartment", response_model=List[EmployeeResponse])
 async def list_employees_without_apartment(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """List all active employees without an apartment"""
-    employees = db.query(Employee).options(
-        joinedload(Employee.factory)
-    ).filter(
-        Employee.is_active == True,
-        Employee.status == EmployeeStatus.ACTIVE,
-        Employee.apartment_id.is_(None)
-    ).order_by(Employee.full_name_roman).all()
+    result = await db.execute(
+        select(Employee).options(
+            joinedload(Employee.factory),
+            joinedload(Employee.apartment)
+        ).where(
+            Employee.is_active == True,
+            Employee.status == EmployeeStatus.ACTIVE,
+            Employee.apartment_id.is_(None)
+        ).order_by(Employee.full_name_roman)
+    )
     
-    return employees
+    return result.scalars().all()
 
 
 @router.get("/{employee_id}", response_model=EmployeeResponse)
 async def get_employee(
     employee_id: UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get employee by ID"""
-    employee = db.query(Employee).options(
-        joinedload(Employee.factory),
-        joinedload(Employee.apartment)
-    ).filter(Employee.id == employee_id).first()
+    result = await db.execute(
+        select(Employee).options(
+            joinedload(Employee.factory),
+            joinedload(Employee.apartment)
+        ).where(Employee.id == employee_id)
+    )
+    employee = result.scalars().first()
     
     if not employee:
         raise HTTPException(
@@ -185,6 +161,7 @@ async def create_employee(
     new_employee = Employee(**employee_data.model_dump())
     db.add(new_employee)
     db.commit()
+    invalidate("apartments", "factories", "stats", "occupancy")
     db.refresh(new_employee)
     
     return new_employee
@@ -222,6 +199,7 @@ async def update_employee(
         setattr(employee, key, value)
     
     db.commit()
+    invalidate("apartments", "factories", "stats", "occupancy")
     db.refresh(employee)
     
     return employee
@@ -234,23 +212,20 @@ async def delete_employee(
     current_user: User = Depends(get_current_user)
 ):
     """Soft delete an employee"""
-    employee = db.query(Employee).filter(Employee.id == employee_id).first()
-    
-    if not employee:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Employee not found"
-        )
-    
-    # Remove from apartment if assigned
-    if employee.apartment_id:
-        apartment = db.query(Apartment).filter(Apartment.id == employee.apartment_id).first()
-        if apartment:
-            apartment.current_occupants = max(0, apartment.current_occupants - 1)
-            if apartment.current_occupants == 0:
-                from app.models.models import ApartmentStatus
-                apartment.status = ApartmentStatus.AVAILABLE
-    
-    employee.is_active = False
-    employee.apartment_id = None
-    db.commit()
+    def work():
+        employee = occupancy.lock_employee(db, employee_id)
+        
+        if not employee:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Employee not found"
+            )
+        
+        # Remove from apartment if assigned
+        occupancy.release(db, employee.apartment_id)
+        
+        employee.is_active = False
+        employee.apartment_id = None
+    
+    occupancy.commit_with_retry(db, work)
+    invalidate("apartments", "factories", "stats", "occupancy")
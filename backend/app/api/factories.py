@@ -4,70 +4,101 @@ Factories API (派遣先)
 
 from typing import List, Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
-from app.core.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_db, get_async_db
+from app.core.cache import cached, invalidate
 from app.core.security import get_current_user
-from app.models.models import Factory, Employee, User
-from app.schemas.schemas import FactoryCreate, FactoryUpdate, FactoryResponse
+from app.core.routing import ThreadpoolRoute
+from app.core.pagination import Keyset, set_next_cursor
+from app.services.stats import get_factory_stats
+from app.services.factories import annotated_factories, to_response, to_responses
+from app.services.search import FACTORY_SEARCH
+from app.services.factory_catalog import FACTORY_CATALOG
+from app.core.text import normalize_text
+from app.models.models import Factory, User
+from app.schemas.schemas import FactoryCreate, FactoryUpdate, FactoryResponse, FactoryCatalogEntry, FactoryCatalogDetail
 
-router = APIRouter(prefix="/factories", tags=["Factories (派遣先)"])
+router = APIRouter(prefix="/factories", tags=["Factories (派遣先)"], route_class=ThreadpoolRoute)
+
+FACTORY_KEYSET = Keyset(Factory.factory_code)
 
 
 @router.get("/", response_model=List[FactoryResponse])
 async def list_factories(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
     search: Optional[str] = None,
     prefecture: Optional[str] = None,
     is_active: bool = True,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    """List all factories"""
-    query = db.query(Factory).filter(Factory.is_active == is_active)
+    """List all factories (offset or cursor pagination)"""
+    factories = await _list_factories(
+        skip=skip, limit=limit, cursor=cursor, search=search,
+        prefecture=prefecture, is_active=is_active, db=db
+    )
+    ranked = bool(search and search.strip()) and not cursor
+    set_next_cursor(response, FACTORY_KEYSET.next_cursor(factories, limit, ranked))
+    return factories
+
+
+@cached("factories")
+async def _list_factories(skip, limit, cursor, search, prefecture, is_active, db):
+    query = annotated_factories().where(Factory.is_active == is_active)
     
     if prefecture:
-        query = query.filter(Factory.prefecture.ilike(f"%{prefecture}%"))
-    if search:
-        query = query.filter(or_(
-            Factory.name.ilike(f"%{search}%"),
-            Factory.name_japanese.ilike(f"%{search}%"),
-            Factory.factory_code.ilike(f"%{search}%")
-        ))
-    
-    factories = query.order_by(Factory.factory_code).offset(skip).limit(limit).all()
+        query = query.where(Factory.prefecture.ilike(f"%{prefecture}%"))
+    query, rank = FACTORY_SEARCH.apply(query, search)
     
-    result = []
-    for f in factories:
-        r = FactoryResponse.model_validate(f)
-        r.employee_count = db.query(func.count(Employee.id)).filter(
-            Employee.factory_id == f.id, Employee.is_active == True
-        ).scalar()
-        result.append(r)
-    return result
+    rows = await db.execute(FACTORY_KEYSET.page(query, skip, limit, cursor, rank))
+    return to_responses(rows)
 
 
 @router.get("/stats")
-async def get_factories_stats(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    total = db.query(func.count(Factory.id)).filter(Factory.is_active == True).scalar()
-    by_prefecture = dict(db.query(Factory.prefecture, func.count(Factory.id)).filter(
-        Factory.is_active == True, Factory.prefecture.isnot(None)
-    ).group_by(Factory.prefecture).all())
-    return {"total": total, "by_prefecture": by_prefecture}
+@cached("stats")
+async def get_factories_stats(db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    return await get_factory_stats(db)
+
+
+@router.get("/catalog", response_model=List[FactoryCatalogEntry])
+async def list_factory_catalog(
+    search: Optional[str] = None,
+    prefecture: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Plant sheets from BASEDATEJP/config/factories (kept in memory, reloaded when a file changes)"""
+    entries = FACTORY_CATALOG.entries()
+    if prefecture:
+        entries = [e for e in entries if e.prefecture and prefecture in e.prefecture]
+    if search and search.strip():
+        term = normalize_text(search)
+        entries = [
+            e for e in entries
+            if any(term in normalize_text(v) for v in (e.factory_id, e.old_id, e.company, e.plant, e.address) if v)
+        ]
+    return [e._asdict() for e in entries]
+
+
+@router.get("/catalog/{key}", response_model=FactoryCatalogDetail)
+async def get_factory_catalog_entry(key: str, current_user: User = Depends(get_current_user)):
+    """Full plant sheet by factory_id or old id (Factory-01)"""
+    entry = FACTORY_CATALOG.get(key)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Factory sheet not found")
+    return entry._asdict()
 
 
 @router.get("/{factory_id}", response_model=FactoryResponse)
-async def get_factory(factory_id: UUID, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    factory = db.query(Factory).filter(Factory.id == factory_id).first()
-    if not factory:
+async def get_factory(factory_id: UUID, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    row = (await db.execute(annotated_factories().where(Factory.id == factory_id))).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Factory not found")
-    result = FactoryResponse.model_validate(factory)
-    result.employee_count = db.query(func.count(Employee.id)).filter(
-        Employee.factory_id == factory.id, Employee.is_active == True
-    ).scalar()
-    return result
+    return to_response(*row)
 
 
 @router.post("/", response_model=FactoryResponse, status_code=201)
@@ -77,10 +108,9 @@ async def create_factory(data: FactoryCreate, db: Session = Depends(get_db), cur
     factory = Factory(**data.model_dump())
     db.add(factory)
     db.commit()
+    invalidate("factories", "stats", "occupancy")
     db.refresh(factory)
-    result = FactoryResponse.model_validate(factory)
-    result.employee_count = 0
-    return result
+    return to_response(factory, 0)
 
 
 @router.put("/{factory_id}", response_model=FactoryResponse)
@@ -91,12 +121,9 @@ async def update_factory(factory_id: UUID, data: FactoryUpdate, db: Session = De
     for k, v in data.model_dump(exclude_unset=True).items():
         setattr(factory, k, v)
     db.commit()
-    db.refresh(factory)
-    result = FactoryResponse.model_validate(factory)
-    result.employee_count = db.query(func.count(Employee.id)).filter(
-        Employee.factory_id == factory.id, Employee.is_active == True
-    ).scalar()
-    return result
+    invalidate("factories", "stats", "occupancy")
+    row = db.execute(annotated_factories().where(Factory.id == factory.id)).one()
+    return to_response(*row)
 
 
 @router.delete("/{factory_id}", status_code=204)
@@ -106,3 +133,4 @@ async def delete_factory(factory_id: UUID, db: Session = Depends(get_db), curren
         raise HTTPException(status_code=404, detail="Factory not found")
     factory.is_active = False
     db.commit()
+    invalidate("factories", "stats", "occupancy")
@@ -0,0 +1,46 @@
+"""
+Jobs API - Background job status and progress
+"""
+
+from typing import List, Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
+from app.core.security import get_current_user
+from app.core.routing import ThreadpoolRoute
+from app.core.jobs import job_response
+from app.models.models import BackgroundJob, User
+from app.schemas.schemas import JobResponse
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"], route_class=ThreadpoolRoute)
+
+
+@router.get("/", response_model=List[JobResponse])
+async def list_jobs(
+    status: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """List the current user's most recent jobs"""
+    query = select(BackgroundJob).where(BackgroundJob.created_by == current_user.id)
+    if status:
+        query = query.where(BackgroundJob.status == status)
+    result = await db.execute(query.order_by(BackgroundJob.created_at.desc()).limit(limit))
+    return [job_response(job) for job in result.scalars().all()]
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: UUID,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Job status, progress, row counts and errors (own jobs only, except for admins)"""
+    job = await db.get(BackgroundJob, job_id)
+    # Another user's job answers 404, like a missing one, so ids cannot be probed
+    if not job or (job.created_by != current_user.id and current_user.role != "admin"):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_response(job)
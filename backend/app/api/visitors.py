@@ -6,18 +6,26 @@ Tracking de visitantes a apartamentos
 from typing import List, Optional
 from uuid import UUID
 from datetime import datetime, date
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
-from app.core.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+from app.core.database import get_db, get_async_db
 from app.core.security import get_current_user
+from app.core.routing import ThreadpoolRoute
+from app.core.pagination import Keyset, set_next_cursor
+from app.services.search import VISITOR_SEARCH
 from app.models.models import Visitor, VisitorAccess, Apartment, Employee, User, VisitorType
 from app.schemas.schemas import (
     VisitorCreate, VisitorUpdate, VisitorResponse,
     VisitorAccessCreate, VisitorAccessUpdate, VisitorAccessResponse
 )
 
-router = APIRouter(prefix="/visitors", tags=["Visitors (訪問者)"])
+router = APIRouter(prefix="/visitors", tags=["Visitors (訪問者)"], route_class=ThreadpoolRoute)
+
+VISITOR_KEYSET = Keyset(Visitor.visitor_name, Visitor.id)
+# Most recent first; the id breaks ties between identical entry times
+VISITOR_ACCESS_KEYSET = Keyset(VisitorAccess.entry_time, VisitorAccess.id, descending=True)
 
 # Color mapping for visitor types
 VISITOR_TYPE_COLORS = {
@@ -37,38 +45,38 @@ VISITOR_TYPE_COLORS = {
 
 @router.get("/", response_model=List[VisitorResponse])
 async def list_visitors(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
     search: Optional[str] = None,
     visitor_type: Optional[str] = None,
     is_active: bool = True,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    """List all visitors"""
-    query = db.query(Visitor).filter(Visitor.is_active == is_active)
+    """List all visitors (offset or cursor pagination)"""
+    query = select(Visitor).where(Visitor.is_active == is_active)
 
     if visitor_type:
-        query = query.filter(Visitor.visitor_type == visitor_type)
-    if search:
-        query = query.filter(or_(
-            Visitor.visitor_name.ilike(f"%{search}%"),
-            Visitor.phone.ilike(f"%{search}%"),
-            Visitor.email.ilike(f"%{search}%")
-        ))
-
-    visitors = query.order_by(Visitor.visitor_name).offset(skip).limit(limit).all()
+        query = query.where(Visitor.visitor_type == visitor_type)
+    query, rank = VISITOR_SEARCH.apply(query, search)
+
+    result = await db.execute(VISITOR_KEYSET.page(query, skip, limit, cursor, rank))
+    visitors = result.scalars().all()
+    ranked = Keyset.is_ranked(rank, cursor)
+    set_next_cursor(response, VISITOR_KEYSET.next_cursor(visitors, limit, ranked))
     return visitors
 
 
 @router.get("/{visitor_id}", response_model=VisitorResponse)
 async def get_visitor(
     visitor_id: UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get visitor by ID"""
-    visitor = db.query(Visitor).filter(Visitor.id == visitor_id).first()
+    visitor = await db.get(Visitor, visitor_id)
     if not visitor:
         raise HTTPException(status_code=404, detail="Visitor not found")
     return visitor
@@ -130,8 +138,10 @@ async def delete_visitor(
 
 @router.get("/accesses/", response_model=List[VisitorAccessResponse])
 async def list_visitor_accesses(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
     apartment_id: Optional[UUID] = None,
     employee_id: Optional[UUID] = None,
     visitor_type: Optional[str] = None,
@@ -141,7 +151,7 @@ async def list_visitor_accesses(
     current_user: User = Depends(get_current_user)
 ):
     """
-    List visitor accesses with filters.
+    List visitor accesses with filters (offset or cursor pagination).
 
     month: 1-12 (if provided, filters by month)
     year: YYYY (if provided, filters by year)
@@ -164,7 +174,8 @@ async def list_visitor_accesses(
     elif year:
         query = query.filter(func.extract('year', VisitorAccess.entry_time) == year)
 
-    accesses = query.order_by(VisitorAccess.entry_time.desc()).offset(skip).limit(limit).all()
+    accesses = VISITOR_ACCESS_KEYSET.page(query, skip, limit, cursor).all()
+    set_next_cursor(response, VISITOR_ACCESS_KEYSET.next_cursor(accesses, limit))
     return accesses
 
 
@@ -1,22 +1,26 @@
 """Core module"""
 from app.core.config import settings
-from app.core.database import get_db, Base, engine
+from app.core.database import get_db, get_async_db, Base, engine, async_engine
 from app.core.security import (
     verify_password,
     get_password_hash,
     create_access_token,
     get_current_user,
-    get_current_admin_user
+    get_current_admin_user,
+    invalidate_cached_user
 )
 
 __all__ = [
     "settings",
     "get_db",
+    "get_async_db",
     "Base",
     "engine",
+    "async_engine",
     "verify_password",
     "get_password_hash",
     "create_access_token",
     "get_current_user",
-    "get_current_admin_user"
+    "get_current_admin_user",
+    "invalidate_cached_user"
 ]
@@ -0,0 +1,209 @@
+"""
+Cache Configuration - Redis with in-process fallback
+"""
+
+import json
+import time
+import hashlib
+import functools
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+from fastapi.encoders import jsonable_encoder
+from loguru import logger
+from app.core.config import settings
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+# Namespaces of cached responses
+CACHE_NAMESPACES = ("stats", "apartments", "factories", "occupancy")
+
+# Endpoint parameters that are not part of the cache key
+_EXCLUDED_PARAMS = {"db", "current_user", "request", "response"}
+
+
+class LocalCache:
+    """Thread-safe in-process TTL/LRU cache"""
+
+    def __init__(self, maxsize: int = 1024, ttl: int = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_prefix(self, prefix: str) -> None:
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class ResponseCache:
+    """
+    Cache for read-only responses.
+
+    Uses Redis (settings.REDIS_URL) when available. While Redis is unreachable
+    it falls back to an in-process LocalCache and retries after an interval.
+    """
+
+    RETRY_INTERVAL = 30  # seconds before retrying Redis
+
+    def __init__(self, url: str, prefix: str = "shatak", default_ttl: int = 60, local_maxsize: int = 1024):
+        self.url = url
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+        self.local = LocalCache(maxsize=local_maxsize, ttl=default_ttl)
+        self._redis = None
+        self._retry_at = 0.0
+
+    def _client(self):
+        """Redis client, or None if unavailable"""
+        if not REDIS_AVAILABLE:
+            return None
+        if self._redis is None and time.monotonic() >= self._retry_at:
+            try:
+                client = redis.Redis.from_url(self.url, socket_timeout=0.5, socket_connect_timeout=0.5)
+                client.ping()
+                self._redis = client
+                logger.info("🗄️  Response cache connected to Redis")
+            except redis.RedisError as e:
+                self._mark_unavailable(e)
+        return self._redis
+
+    def _mark_unavailable(self, error: Exception) -> None:
+        if self._redis is not None or self._retry_at == 0.0:
+            logger.warning(f"Redis unavailable, using local cache: {error}")
+        self._redis = None
+        self._retry_at = time.monotonic() + self.RETRY_INTERVAL
+
+    def make_key(self, namespace: str, params: Dict[str, Any], scope: str = "") -> str:
+        """`scope` tells apart endpoints sharing a namespace; invalidation matches on the namespace prefix"""
+        raw = json.dumps(params, sort_keys=True, default=str)
+        digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+        if scope:
+            return f"{self.prefix}:{namespace}:{scope}:{digest}"
+        return f"{self.prefix}:{namespace}:{digest}"
+
+    def get(self, namespace: str, params: Dict[str, Any], scope: str = "") -> Optional[Any]:
+        key = self.make_key(namespace, params, scope)
+        client = self._client()
+        if client is not None:
+            try:
+                raw = client.get(key)
+                return json.loads(raw) if raw is not None else None
+            except redis.RedisError as e:
+                self._mark_unavailable(e)
+        return self.local.get(key)
+
+    def set(self, namespace: str, params: Dict[str, Any], value: Any, ttl: Optional[int] = None, scope: str = "") -> None:
+        key = self.make_key(namespace, params, scope)
+        ttl = ttl if ttl is not None else self.default_ttl
+        client = self._client()
+        if client is not None:
+            try:
+                client.set(key, json.dumps(value, default=str), ex=ttl)
+                return
+            except redis.RedisError as e:
+                self._mark_unavailable(e)
+        self.local.set(key, value, ttl)
+
+    def delete(self, namespace: str, params: Dict[str, Any], scope: str = "") -> None:
+        key = self.make_key(namespace, params, scope)
+        self.local.delete(key)
+        client = self._client()
+        if client is None:
+            return
+        try:
+            client.delete(key)
+        except redis.RedisError as e:
+            self._mark_unavailable(e)
+
+    def invalidate(self, *namespaces: str) -> None:
+        """Drop every entry in the given namespaces"""
+        namespaces = namespaces or CACHE_NAMESPACES
+        for namespace in namespaces:
+            self.local.delete_prefix(f"{self.prefix}:{namespace}:")
+
+        client = self._client()
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for namespace in namespaces:
+                for key in client.scan_iter(match=f"{self.prefix}:{namespace}:*", count=500):
+                    pipe.unlink(key)
+            pipe.execute()
+        except redis.RedisError as e:
+            self._mark_unavailable(e)
+
+
+response_cache = ResponseCache(
+    settings.REDIS_URL,
+    default_ttl=settings.CACHE_DEFAULT_TTL,
+    local_maxsize=settings.CACHE_LOCAL_MAXSIZE
+)
+
+
+def invalidate(*namespaces: str) -> None:
+    """Invalidate namespaces after a write (no arguments: all of them)"""
+    response_cache.invalidate(*namespaces)
+
+
+def cached(namespace: str, ttl: Optional[int] = None) -> Callable:
+    """
+    Decorator for async read endpoints.
+
+    The key is built from the cached function and the request parameters
+    (except db and current_user), so endpoints sharing a namespace do not
+    serve each other's payloads. Responses are stored already JSON-encoded.
+    """
+    def decorator(func: Callable) -> Callable:
+        scope = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not settings.CACHE_ENABLED:
+                return await func(*args, **kwargs)
+
+            params = {k: v for k, v in kwargs.items() if k not in _EXCLUDED_PARAMS}
+            hit = response_cache.get(namespace, params, scope)
+            if hit is not None:
+                return hit
+
+            result = await func(*args, **kwargs)
+            response_cache.set(namespace, params, jsonable_encoder(result), ttl, scope)
+            return result
+        return wrapper
+    return decorator
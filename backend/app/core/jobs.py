@@ -0,0 +1,192 @@
+"""
+Background Jobs - Process pool for imports and exports
+
+Endpoints enqueue work and return a job id immediately. The work runs in
+a ProcessPoolExecutor, so heavy parsing does not compete with API traffic
+for the GIL. Status, progress and results are stored in the
+background_jobs table, so any API worker can report them.
+"""
+
+import time
+import traceback
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+from fastapi.encoders import jsonable_encoder
+from loguru import logger
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal, engine
+from app.core.cache import invalidate
+from app.models.models import BackgroundJob
+from app.schemas.schemas import JobResponse
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+class JobContext:
+    """
+    Handle passed to a job function running in a worker process.
+
+    progress() writes the counters to the job row, at most once per
+    PROGRESS_INTERVAL seconds, from a separate session so it is visible
+    while the job's own transaction is still open.
+    """
+
+    PROGRESS_INTERVAL = 0.5  # seconds
+
+    def __init__(self, job_id: UUID):
+        self.job_id = job_id
+        self._last_update = 0.0
+
+    def progress(self, processed: int, total: Optional[int] = None, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_update < self.PROGRESS_INTERVAL:
+            return
+        self._last_update = now
+        values = {"processed_rows": processed}
+        if total is not None:
+            values["total_rows"] = total
+        _update_job(self.job_id, **values)
+
+
+def _update_job(job_id: UUID, **values: Any) -> None:
+    db = SessionLocal()
+    try:
+        db.query(BackgroundJob).filter(BackgroundJob.id == job_id).update(values, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _init_worker() -> None:
+    """Drop connections inherited from the parent process"""
+    engine.dispose(close=False)
+
+
+def _run_job(job_id: UUID, func: Callable, args: tuple, kwargs: Dict[str, Any]) -> None:
+    """
+    Worker-process entry point.
+
+    `func(db, job, *args, **kwargs)` must return a dict. Its keys total_rows,
+    successful_rows, failed_rows, errors and import_log_id are copied to the
+    job row and the whole dict is stored as the job result.
+    """
+    _update_job(job_id, status="running", started_at=_now())
+    db = SessionLocal()
+    try:
+        result = jsonable_encoder(func(db, JobContext(job_id), *args, **kwargs))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Job {job_id} failed: {e}\n{traceback.format_exc()}")
+        _update_job(job_id, status="failed", error=str(e)[:1000], finished_at=_now())
+        return
+    finally:
+        db.close()
+
+    errors: List[dict] = result.get("errors") or []
+    _update_job(
+        job_id,
+        status="completed",
+        total_rows=result.get("total_rows"),
+        processed_rows=result.get("total_rows"),
+        successful_rows=result.get("successful_rows"),
+        failed_rows=result.get("failed_rows"),
+        errors=errors[:50],
+        import_log_id=result.get("import_log_id"),
+        result=result,
+        finished_at=_now()
+    )
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.JOB_WORKERS, initializer=_init_worker)
+    return _executor
+
+
+def _on_done(job_id: UUID, invalidates: Tuple[str, ...], future: Future) -> None:
+    """Runs in the API process once the worker finishes (or the job is cancelled)"""
+    if future.cancelled():
+        # Still queued when the pool shut down; it never ran
+        _update_job(job_id, status="failed", error="cancelled at shutdown", finished_at=_now())
+        return
+    error = future.exception()
+    if error is not None:
+        # The worker process itself died (the job function's own errors are recorded in _run_job)
+        logger.error(f"Job {job_id} crashed: {error}")
+        _update_job(job_id, status="failed", error=str(error)[:1000], finished_at=_now())
+    if invalidates:
+        invalidate(*invalidates)
+
+
+def enqueue(
+    db: Session,
+    job_type: str,
+    func: Callable,
+    *args: Any,
+    file_name: Optional[str] = None,
+    user_id: Optional[UUID] = None,
+    invalidates: Tuple[str, ...] = (),
+    **kwargs: Any
+) -> BackgroundJob:
+    """
+    Create a queued job and submit it to the process pool.
+
+    `func` must be a module-level function (it is pickled by reference) and
+    its arguments must be picklable, e.g. the uploaded file's bytes.
+    `invalidates` lists the cache namespaces the job writes; they are
+    invalidated once it finishes.
+    """
+    job = BackgroundJob(job_type=job_type, status="queued", file_name=file_name, created_by=user_id)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    future = get_executor().submit(_run_job, job.id, func, args, kwargs)
+    future.add_done_callback(lambda f, job_id=job.id: _on_done(job_id, invalidates, f))
+    return job
+
+
+def job_response(job: BackgroundJob) -> JobResponse:
+    """JobResponse with the progress percentage"""
+    response = JobResponse.model_validate(job)
+    if job.status == "completed":
+        response.progress = 100
+    elif job.total_rows:
+        response.progress = round(min((job.processed_rows or 0) / job.total_rows * 100, 100), 2)
+    return response
+
+
+def fail_stale_jobs() -> int:
+    """
+    Mark as failed the jobs left queued or running by a previous process.
+
+    The pool lives in the API process, so at startup none of them can still
+    be running. Returns the number of jobs updated.
+    """
+    db = SessionLocal()
+    try:
+        count = db.query(BackgroundJob).filter(BackgroundJob.status.in_(("queued", "running"))).update(
+            {"status": "failed", "error": "interrupted by a restart", "finished_at": _now()},
+            synchronize_session=False
+        )
+        db.commit()
+        return count
+    finally:
+        db.close()
+
+
+def shutdown_jobs() -> None:
+    """Stop accepting jobs; running jobs are allowed to finish"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,122 @@
+"""
+Pagination - Keyset (cursor) pagination for list endpoints
+
+A cursor is an opaque, URL-safe encoding of the sort key of the last row
+of a page. The next page is fetched with `WHERE (sort key) > (cursor)`
+instead of OFFSET, so deep pages cost the same as the first one. Offset
+pagination (skip) stays available; the cursor takes precedence when both
+are given.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import tuple_
+
+# Response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps(jsonable_encoder(list(values)), separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def _coerce(column, value: Any) -> Any:
+    """Convert a decoded JSON value back to the column's Python type"""
+    if value is None:
+        return None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if isinstance(value, python_type):
+        return value
+    if python_type in (date, datetime):
+        return python_type.fromisoformat(value)
+    return python_type(value)
+
+
+def _value(item: Any, name: str) -> Any:
+    """Read a field from an ORM object, a schema or an already-encoded dict"""
+    return item[name] if isinstance(item, dict) else getattr(item, name)
+
+
+class Keyset:
+    """
+    Sort key of a list endpoint.
+
+    The columns must identify a row uniquely (add the primary key as a
+    tie-breaker) and are sorted in a single direction.
+    """
+
+    def __init__(self, *columns, descending: bool = False):
+        self.columns = columns
+        self.descending = descending
+
+    @property
+    def ordering(self) -> list:
+        return [c.desc() if self.descending else c.asc() for c in self.columns]
+
+    def after(self, cursor: str):
+        """WHERE clause selecting the rows after `cursor`"""
+        values = decode_cursor(cursor)
+        if len(values) != len(self.columns):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        try:
+            values = [_coerce(c, v) for c, v in zip(self.columns, values)]
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+        if len(self.columns) == 1:
+            key, value = self.columns[0], values[0]
+        else:
+            key, value = tuple_(*self.columns), tuple_(*values)
+        return key < value if self.descending else key > value
+
+    def page(self, query, skip: int, limit: int, cursor: Optional[str] = None, rank=None):
+        """
+        Order `query` by the key and apply the cursor (or skip) and limit.
+
+        With a search `rank` and no cursor, results are ordered by relevance
+        first; such pages are offset-only (see is_ranked).
+        """
+        if rank is not None and not cursor:
+            query = query.order_by(rank.desc())
+        query = query.order_by(*self.ordering)
+        if cursor:
+            query = query.filter(self.after(cursor))
+        elif skip:
+            query = query.offset(skip)
+        return query.limit(limit)
+
+    @staticmethod
+    def is_ranked(rank, cursor: Optional[str]) -> bool:
+        return rank is not None and not cursor
+
+    def next_cursor(self, items: Sequence[Any], limit: int, ranked: bool = False) -> Optional[str]:
+        """Cursor for the page after `items`, or None if this was the last page"""
+        if ranked or not items or len(items) < limit:
+            return None
+        last = items[-1]
+        return encode_cursor([_value(last, c.key) for c in self.columns])
+
+
+def set_next_cursor(response: Response, cursor: Optional[str]) -> None:
+    """Expose the next-page cursor without changing list response bodies"""
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
@@ -0,0 +1,60 @@
+"""
+Routing - Threadpool dispatch for endpoints still using the sync Session
+"""
+
+import asyncio
+import functools
+import inspect
+import threading
+from typing import Any, Callable
+from fastapi.params import Depends as DependsParam
+from fastapi.routing import APIRoute
+from app.core.database import get_db
+
+_thread_state = threading.local()
+
+
+def _thread_event_loop() -> asyncio.AbstractEventLoop:
+    """Event loop owned by the current worker thread"""
+    loop = getattr(_thread_state, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _thread_state.loop = loop
+    return loop
+
+
+def uses_sync_session(endpoint: Callable) -> bool:
+    """True if the endpoint depends directly on the blocking get_db session"""
+    for param in inspect.signature(endpoint).parameters.values():
+        default = param.default
+        if isinstance(default, DependsParam) and default.dependency is get_db:
+            return True
+    return False
+
+
+def run_in_worker_thread(endpoint: Callable) -> Callable:
+    """
+    Wrap an `async def` endpoint as a plain function.
+
+    FastAPI runs plain functions in its threadpool, so blocking ORM calls
+    inside the coroutine no longer stall the main event loop.
+    """
+    @functools.wraps(endpoint)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        return _thread_event_loop().run_until_complete(endpoint(*args, **kwargs))
+    return wrapper
+
+
+class ThreadpoolRoute(APIRoute):
+    """
+    Route class for the API routers.
+
+    Endpoints migrated to `AsyncSession` (get_async_db) run on the event
+    loop as usual. `async def` endpoints that still take the sync Session
+    (get_db) are dispatched to the threadpool automatically.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs: Any):
+        if asyncio.iscoroutinefunction(endpoint) and uses_sync_session(endpoint):
+            endpoint = run_in_worker_thread(endpoint)
+        super().__init__(path, endpoint, **kwargs)
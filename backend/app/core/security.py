@@ -2,15 +2,20 @@
 Security Configuration - JWT and Password Hashing
 """
 
+from dataclasses import asdict, dataclass
 from datetime import datetime, timedelta
 from typing import Optional
+from uuid import UUID
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
-from app.core.database import get_db
+from app.core.database import get_async_db
+from app.core.cache import response_cache
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -18,6 +23,64 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# Principals (token subject -> CachedUser) live in the shared response cache,
+# so invalidating a user reaches every API worker
+PRINCIPAL_NAMESPACE = "principals"
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    """Immutable snapshot of an authenticated user"""
+    id: UUID
+    username: str
+    email: str
+    full_name: Optional[str]
+    role: str
+    is_active: bool
+    created_at: datetime
+
+    @classmethod
+    def from_user(cls, user) -> "CachedUser":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            full_name=user.full_name,
+            role=user.role,
+            is_active=user.is_active,
+            created_at=user.created_at
+        )
+
+    @classmethod
+    def from_cache(cls, data: dict) -> "CachedUser":
+        """Rebuild from the JSON stored by cache_user()"""
+        created_at = data["created_at"]
+        return cls(**{
+            **data,
+            "id": UUID(data["id"]),
+            "created_at": datetime.fromisoformat(created_at) if created_at else None
+        })
+
+
+def cache_user(user: CachedUser) -> None:
+    response_cache.set(
+        PRINCIPAL_NAMESPACE, {"username": user.username},
+        jsonable_encoder(asdict(user)), settings.PRINCIPAL_CACHE_TTL
+    )
+
+
+def get_cached_user(username: str) -> Optional[CachedUser]:
+    hit = response_cache.get(PRINCIPAL_NAMESPACE, {"username": username})
+    return CachedUser.from_cache(hit) if hit is not None else None
+
+
+def invalidate_cached_user(username: Optional[str] = None) -> None:
+    """Drop a cached principal (or all of them) after a user changes"""
+    if username is None:
+        response_cache.invalidate(PRINCIPAL_NAMESPACE)
+    else:
+        response_cache.delete(PRINCIPAL_NAMESPACE, {"username": username})
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify password against hash"""
@@ -52,7 +115,7 @@ def decode_token(token: str) -> Optional[dict]:
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get current authenticated user"""
     from app.models.models import User
@@ -71,9 +134,14 @@ async def get_current_user(
     if username is None:
         raise credentials_exception
     
-    user = db.query(User).filter(User.username == username).first()
+    user = get_cached_user(username)
     if user is None:
-        raise credentials_exception
+        result = await db.execute(select(User).where(User.username == username))
+        db_user = result.scalars().first()
+        if db_user is None:
+            raise credentials_exception
+        user = CachedUser.from_user(db_user)
+        cache_user(user)
     
     if not user.is_active:
         raise HTTPException(
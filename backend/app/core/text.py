@@ -0,0 +1,43 @@
+"""
+Text - Normalised search keys for Japanese names and addresses
+
+The same person or address reaches us in many spellings: half-width
+katakana (ﾚｼﾞｪﾝﾄﾞ), full-width digits (８９番地), ideographic spaces in
+furigana, hiragana vs katakana readings, stray tabs from spreadsheets.
+search_key() folds all of them to one form, and the same function is
+applied to the stored shadow column and to the search term.
+"""
+
+import re
+import unicodedata
+from typing import Any, Optional
+
+# Separates the fields of a stored key; it never survives normalisation,
+# so a search term cannot match across two fields
+FIELD_SEPARATOR = "\u001f"
+
+# Dash variants NFKC leaves alone (the katakana prolonged sound mark ー is kept)
+_DASHES = str.maketrans({c: "-" for c in "‐‑‒–—―−゠﹣"})
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Hiragana ぁ..ゖ and the iteration marks ゝゞ map onto katakana at a fixed offset
+_HIRAGANA_TO_KATAKANA = {c: c + 0x60 for c in range(0x3041, 0x3097)}
+_HIRAGANA_TO_KATAKANA.update({0x309D: 0x30FD, 0x309E: 0x30FE})
+
+
+def normalize_text(value: Optional[Any]) -> str:
+    """
+    Fold `value` for searching: NFKC (width folding, composed dakuten),
+    case folding, hiragana -> katakana, dash unification and no whitespace.
+    """
+    if value is None:
+        return ""
+    text = unicodedata.normalize("NFKC", str(value))
+    text = text.casefold().translate(_HIRAGANA_TO_KATAKANA).translate(_DASHES)
+    return _WHITESPACE.sub("", text)
+
+
+def search_key(*values: Optional[Any]) -> str:
+    """Stored key of a row: its normalised, non-empty fields"""
+    return FIELD_SEPARATOR.join(filter(None, (normalize_text(v) for v in values)))
@@ -2,18 +2,33 @@
 UNS-Shatak (社宅管理システム) - Apartment Management System
 """
 
-from fastapi import FastAPI
+import asyncio
+from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
-from app.api import auth_router, apartments_router, employees_router, factories_router, imports_router, data_router, assignments_router, visitors_router, export_router
+from app.core.database import get_async_db, async_engine
+from app.core.cache import cached
+from app.core.jobs import fail_stale_jobs, shutdown_jobs
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.services.stats import get_dashboard_stats
+from app.services.factory_catalog import FACTORY_CATALOG
+from app.api import auth_router, apartments_router, employees_router, factories_router, imports_router, data_router, assignments_router, visitors_router, export_router, jobs_router, billing_router
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info(f"🚀 Starting {settings.APP_NAME} v{settings.APP_VERSION}")
+    await asyncio.to_thread(FACTORY_CATALOG.refresh)
+    logger.info(f"🏭 Factory catalog: {len(FACTORY_CATALOG)} plant sheets")
+    stale = await asyncio.to_thread(fail_stale_jobs)
+    if stale:
+        logger.warning(f"⚠️ {stale} background jobs interrupted by the last shutdown marked as failed")
     yield
+    shutdown_jobs()
+    await async_engine.dispose()
     logger.info(f"👋 Shutting down {settings.APP_NAME}")
 
 
@@ -33,6 +48,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 app.include_router(auth_router, prefix="/api")
@@ -44,6 +60,8 @@ app.include_router(data_router, prefix="/api")
 app.include_router(assignments_router, prefix="/api")
 app.include_router(visitors_router, prefix="/api")
 app.include_router(export_router, prefix="/api")
+app.include_router(jobs_router, prefix="/api")
+app.include_router(billing_router, prefix="/api")
 
 
 @app.get("/")
@@ -57,31 +75,9 @@ async def health_check():
 
 
 @app.get("/api/dashboard/stats")
-async def dashboard_stats():
-    from app.core.database import SessionLocal
-    from app.models.models import Apartment, Employee, Factory, ApartmentStatus, EmployeeStatus
-    from sqlalchemy import func
-    
-    db = SessionLocal()
-    try:
-        total_apt = db.query(func.count(Apartment.id)).filter(Apartment.is_active == True).scalar()
-        avail_apt = db.query(func.count(Apartment.id)).filter(Apartment.is_active == True, Apartment.status == ApartmentStatus.AVAILABLE).scalar()
-        occup_apt = db.query(func.count(Apartment.id)).filter(Apartment.is_active == True, Apartment.status == ApartmentStatus.OCCUPIED).scalar()
-        total_emp = db.query(func.count(Employee.id)).filter(Employee.is_active == True).scalar()
-        active_emp = db.query(func.count(Employee.id)).filter(Employee.is_active == True, Employee.status == EmployeeStatus.ACTIVE).scalar()
-        emp_housed = db.query(func.count(Employee.id)).filter(Employee.is_active == True, Employee.apartment_id.isnot(None)).scalar()
-        total_fac = db.query(func.count(Factory.id)).filter(Factory.is_active == True).scalar()
-        capacity = db.query(func.sum(Apartment.capacity)).filter(Apartment.is_active == True).scalar() or 0
-        occupants = db.query(func.sum(Apartment.current_occupants)).filter(Apartment.is_active == True).scalar() or 0
-        rate = round((occupants / capacity * 100) if capacity > 0 else 0, 2)
-        
-        return {
-            "total_apartments": total_apt, "available_apartments": avail_apt, "occupied_apartments": occup_apt,
-            "total_employees": total_emp, "active_employees": active_emp, "employees_with_housing": emp_housed,
-            "employees_without_housing": active_emp - emp_housed, "total_factories": total_fac, "occupancy_rate": rate
-        }
-    finally:
-        db.close()
+@cached("stats")
+async def dashboard_stats(db: AsyncSession = Depends(get_async_db)):
+    return await get_dashboard_stats(db)
 
 
 if __name__ == "__main__":
@@ -5,7 +5,12 @@ from app.models.models import (
     Apartment,
     Employee,
     ApartmentAssignment,
+    MonthlyCharge,
+    ChargeAdjustment,
     ImportLog,
+    SyncRecord,
+    BackgroundJob,
+    OccupancyDirty,
     AuditLog,
     ApartmentStatus,
     EmployeeStatus,
@@ -18,7 +23,12 @@ __all__ = [
     "Apartment",
     "Employee",
     "ApartmentAssignment",
+    "MonthlyCharge",
+    "ChargeAdjustment",
     "ImportLog",
+    "SyncRecord",
+    "BackgroundJob",
+    "OccupancyDirty",
     "AuditLog",
     "ApartmentStatus",
     "EmployeeStatus",
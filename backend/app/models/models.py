@@ -6,13 +6,15 @@ UNS-Shatak (社宅管理システム)
 import uuid
 from datetime import datetime
 from sqlalchemy import (
-    Column, String, Integer, Boolean, DateTime, Date, 
-    ForeignKey, Text, Numeric, Enum as SQLEnum, JSON
+    Column, String, Integer, BigInteger, Boolean, DateTime, Date, 
+    ForeignKey, Text, Numeric, Enum as SQLEnum, JSON, UniqueConstraint
 )
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
+from sqlalchemy import event
 import enum
 from app.core.database import Base
+from app.core.text import search_key
 
 
 # ===========================================
@@ -96,10 +98,13 @@ class Factory(Base):
     contact_person = Column(String(100))
     contact_email = Column(String(100))
     notes = Column(Text)
+    search_key = Column(Text)  # Normalised copy of SEARCH_KEY_FIELDS (app.core.text)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
     updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    SEARCH_KEY_FIELDS = ("factory_code", "name", "name_japanese", "address")
+    
     # Relationships
     employees = relationship("Employee", back_populates="factory")
 
@@ -142,10 +147,13 @@ class Apartment(Base):
     notes = Column(Text)
     photos = Column(JSONB, default=list)
     amenities = Column(JSONB, default=list)
+    search_key = Column(Text)  # Normalised copy of SEARCH_KEY_FIELDS (app.core.text)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
     updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    SEARCH_KEY_FIELDS = ("apartment_code", "name", "building_name", "address")
+    
     # Relationships
     employees = relationship("Employee", back_populates="apartment")
     assignments = relationship("ApartmentAssignment", back_populates="apartment")
@@ -189,10 +197,13 @@ class Employee(Base):
     photo_url = Column(String(255))
     notes = Column(Text)
     metadata = Column(JSONB, default=dict)
+    search_key = Column(Text)  # Normalised copy of SEARCH_KEY_FIELDS (app.core.text)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
     updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    SEARCH_KEY_FIELDS = ("employee_code", "full_name_roman", "full_name_kanji", "full_name_furigana", "phone")
+    
     # Relationships
     factory = relationship("Factory", back_populates="employees")
     apartment = relationship("Apartment", back_populates="employees")
@@ -223,6 +234,49 @@ class ApartmentAssignment(Base):
     employee = relationship("Employee", back_populates="assignments")
 
 
+class MonthlyCharge(Base):
+    """Monthly charge ledger (月次請求) - Una línea por asignación y mes, generada por services.billing"""
+    __tablename__ = "monthly_charges"
+    __table_args__ = (UniqueConstraint("billing_month", "assignment_id", name="uq_monthly_charges_month_assignment"),)
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    billing_month = Column(Date, nullable=False, index=True)  # Primer día del mes facturado
+    assignment_id = Column(UUID(as_uuid=True), ForeignKey("apartment_assignments.id", ondelete="CASCADE"), nullable=False)
+    employee_id = Column(UUID(as_uuid=True), ForeignKey("employees.id", ondelete="CASCADE"), nullable=False)
+    apartment_id = Column(UUID(as_uuid=True), ForeignKey("apartments.id", ondelete="CASCADE"), nullable=False)
+    pricing_type = Column(SQLEnum(PricingType), nullable=False)
+    is_custom_rate = Column(Boolean, default=False)
+    occupants = Column(Integer, nullable=False)  # Ocupantes con los que se reparte la renta
+    days_billed = Column(Integer, nullable=False)
+    days_in_month = Column(Integer, nullable=False)
+    rent = Column(Numeric(10, 0), nullable=False)
+    management_fee = Column(Numeric(10, 0), nullable=False)
+    parking = Column(Numeric(10, 0), nullable=False)
+    utilities = Column(Numeric(10, 0), nullable=False)
+    total = Column(Numeric(10, 0), nullable=False)
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+
+
+class ChargeAdjustment(Base):
+    """Charge adjustments (精算) - Diferencias sobre monthly_charges por cambios de ocupación, generadas por services.billing.settle"""
+    __tablename__ = "charge_adjustments"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    billing_month = Column(Date, nullable=False, index=True)  # Primer día del mes ajustado
+    assignment_id = Column(UUID(as_uuid=True), ForeignKey("apartment_assignments.id", ondelete="CASCADE"), nullable=False)
+    employee_id = Column(UUID(as_uuid=True), ForeignKey("employees.id", ondelete="CASCADE"), nullable=False)
+    apartment_id = Column(UUID(as_uuid=True), ForeignKey("apartments.id", ondelete="CASCADE"), nullable=False)
+    reason = Column(String(50))
+    occupants = Column(Integer)  # Ocupantes tras el cambio
+    days_billed = Column(Integer)  # Días facturables tras el cambio
+    rent = Column(Numeric(10, 0), nullable=False)
+    management_fee = Column(Numeric(10, 0), nullable=False)
+    parking = Column(Numeric(10, 0), nullable=False)
+    utilities = Column(Numeric(10, 0), nullable=False)
+    total = Column(Numeric(10, 0), nullable=False)
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+
+
 class ImportLog(Base):
     """Import log (インポート履歴)"""
     __tablename__ = "import_logs"
@@ -238,6 +292,54 @@ class ImportLog(Base):
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
 
 
+class SyncRecord(Base):
+    """Sync records (同期履歴) - Hash del contenido de cada registro sincronizado desde una fuente externa (services.basedatejp_sync)"""
+    __tablename__ = "sync_records"
+
+    source = Column(String(50), primary_key=True)  # basedatejp
+    entity = Column(String(50), primary_key=True)  # factories, apartments, employees, assignments
+    record_key = Column(String(255), primary_key=True)  # Código del registro en la fuente
+    content_hash = Column(String(64), nullable=False)  # SHA-256 del registro mapeado a columnas
+    entity_id = Column(UUID(as_uuid=True))  # Fila escrita en la tabla de la entidad
+    synced_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+
+
+class BackgroundJob(Base):
+    """Background job (バックグラウンド処理) - Importaciones/exportaciones en segundo plano"""
+    __tablename__ = "background_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    job_type = Column(String(50), nullable=False)
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, completed, failed
+    file_name = Column(String(255))
+    total_rows = Column(Integer)
+    processed_rows = Column(Integer, default=0)
+    successful_rows = Column(Integer, default=0)
+    failed_rows = Column(Integer, default=0)
+    errors = Column(JSONB, default=list)
+    result = Column(JSONB)
+    error = Column(Text)
+    import_log_id = Column(UUID(as_uuid=True), ForeignKey("import_logs.id", ondelete="SET NULL"))
+    created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"))
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class OccupancyDirty(Base):
+    """
+    Apartments whose occupancy must be re-checked (再計算待ち).
+    Filled by database triggers on employees, apartment_assignments and
+    apartments.capacity; drained by services.occupancy.reconcile.
+    """
+    __tablename__ = "occupancy_dirty"
+
+    apartment_id = Column(UUID(as_uuid=True), primary_key=True)
+    version = Column(BigInteger, nullable=False)  # Bumped on every new mark
+    marked_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+
+
 class AuditLog(Base):
     """Audit log"""
     __tablename__ = "audit_log"
@@ -294,3 +396,16 @@ class VisitorAccess(Base):
     apartment = relationship("Apartment", foreign_keys=[apartment_id])
     employee = relationship("Employee", foreign_keys=[employee_id])
     visitor = relationship("Visitor", back_populates="accesses")
+
+
+# ===========================================
+# Search keys
+# ===========================================
+def _refresh_search_key(mapper, connection, target):
+    """Keep search_key in sync on every ORM insert/update"""
+    target.search_key = search_key(*(getattr(target, f) for f in target.SEARCH_KEY_FIELDS))
+
+
+for _model in (Factory, Apartment, Employee):
+    event.listen(_model, "before_insert", _refresh_search_key)
+    event.listen(_model, "before_update", _refresh_search_key)
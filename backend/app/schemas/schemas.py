@@ -139,6 +139,24 @@ class FactoryResponse(FactoryBase):
         from_attributes = True
 
 
+class FactoryCatalogEntry(BaseModel):
+    """Plant sheet from BASEDATEJP/config/factories"""
+    factory_id: str
+    old_id: Optional[str] = None
+    company: Optional[str] = None
+    plant: Optional[str] = None
+    address: Optional[str] = None
+    prefecture: Optional[str] = None
+    city: Optional[str] = None
+    phone: Optional[str] = None
+    line_count: int = 0
+    source: str
+
+
+class FactoryCatalogDetail(FactoryCatalogEntry):
+    record: dict
+
+
 # ===========================================
 # Apartment Schemas (社宅)
 # ===========================================
@@ -376,6 +394,81 @@ class AssignmentResponse(AssignmentBase):
         from_attributes = True
 
 
+class AssignmentBulkCreate(BaseModel):
+    """Mass move-in: every row is validated and priced, valid rows are written in one transaction"""
+    assignments: List[AssignmentCreate] = Field(..., min_length=1, max_length=500)
+    atomic: bool = False  # If true, any invalid row cancels the whole batch
+
+
+class AssignmentBulkResult(BaseModel):
+    total_rows: int
+    successful_rows: int
+    failed_rows: int
+    errors: List[dict] = []
+    assignments: List[AssignmentResponse] = []
+
+
+# ===========================================
+# Billing Schemas
+# ===========================================
+
+class MonthlyChargeResponse(BaseModel):
+    id: UUID
+    billing_month: date
+    assignment_id: UUID
+    employee_id: UUID
+    apartment_id: UUID
+    pricing_type: Optional[PricingTypeEnum] = None
+    is_custom_rate: bool = False
+    occupants: int
+    days_billed: int
+    days_in_month: int
+    rent: Decimal
+    management_fee: Decimal
+    parking: Decimal
+    utilities: Decimal
+    total: Decimal
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ChargeAdjustmentResponse(BaseModel):
+    id: UUID
+    billing_month: date
+    assignment_id: UUID
+    employee_id: UUID
+    apartment_id: UUID
+    reason: Optional[str] = None
+    occupants: Optional[int] = None
+    days_billed: Optional[int] = None
+    rent: Decimal
+    management_fee: Decimal
+    parking: Decimal
+    utilities: Decimal
+    total: Decimal
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class BillingSummary(BaseModel):
+    billing_month: date
+    assignments: int
+    apartments: int
+    employees: int
+    rent: Decimal
+    management_fee: Decimal
+    parking: Decimal
+    utilities: Decimal
+    total: Decimal
+    adjustments: int = 0
+    adjustments_total: Decimal = Decimal('0')
+    net_total: Decimal = Decimal('0')
+
+
 # ===========================================
 # Import Schemas
 # ===========================================
@@ -384,6 +477,8 @@ class ImportResult(BaseModel):
     total_rows: int
     successful_rows: int
     failed_rows: int
+    inserted_rows: int = 0
+    updated_rows: int = 0
     errors: List[dict] = []
     imported_ids: List[UUID] = []
 
@@ -402,6 +497,28 @@ class ImportLogResponse(BaseModel):
         from_attributes = True
 
 
+class JobResponse(BaseModel):
+    id: UUID
+    job_type: str
+    status: str
+    file_name: Optional[str] = None
+    total_rows: Optional[int] = None
+    processed_rows: Optional[int] = 0
+    successful_rows: Optional[int] = 0
+    failed_rows: Optional[int] = 0
+    progress: float = 0
+    errors: List[dict] = []
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    import_log_id: Optional[UUID] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
 # ===========================================
 # Dashboard / Stats
 # ===========================================
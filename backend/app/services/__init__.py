@@ -0,0 +1,16 @@
+"""Services module"""
+from app.services.stats import (
+    get_apartment_stats,
+    get_employee_stats,
+    get_factory_stats,
+    get_dashboard_stats
+)
+from app.services.factories import annotated_factories
+
+__all__ = [
+    "get_apartment_stats",
+    "get_employee_stats",
+    "get_factory_stats",
+    "get_dashboard_stats",
+    "annotated_factories"
+]
@@ -0,0 +1,226 @@
+"""
+Assignments - Precio de las asignaciones y entradas masivas
+UNS-Shatak (社宅管理システム)
+
+bulk_assign() procesa un lote de entradas (p. ej. el día 1 de mes) con un
+número fijo de consultas sea cual sea el tamaño del lote:
+
+1. Bloquear los empleados y los apartamentos implicados (FOR UPDATE, en
+   orden de id, como services.occupancy).
+2. Validar el lote en una pasada en memoria, en orden: empleado y
+   apartamento existen, el empleado no se repite, queda plaza.
+3. Calcular el precio de cada fila con calculate_assignment_costs.
+4. Cerrar las asignaciones anteriores, crear las nuevas y actualizar
+   empleados y contadores; el commit lo hace el llamador.
+5. Liquidar (billing.settle) los apartamentos que cambian, si el mes ya
+   está facturado.
+
+assignment_costs() memoriza calculate_assignment_costs por (apartamento,
+updated_at, ocupantes, fecha de entrada, precio personalizado): el preview
+de /assignments/calculate se repite con los mismos datos mientras el
+usuario edita el formulario. Cualquier cambio del apartamento cambia
+updated_at y, con él, la clave.
+"""
+
+from calendar import monthrange
+from datetime import date
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm import Session
+from app.models.models import Apartment, ApartmentAssignment, ApartmentStatus, Employee
+from app.schemas.schemas import AssignmentCreate
+from app.core.cache import LocalCache
+from app.services import billing
+from app.utils.rent_calculator import calculate_assignment_costs, calculate_prorated_rent
+
+# Cachea también escrituras que no tocan updated_at (importaciones de /data) solo unos minutos
+PRICING_CACHE = LocalCache(maxsize=4096, ttl=600)
+
+
+def _pricing_key(apartment: Apartment, occupants: int, *extra: Any) -> str:
+    updated_at = apartment.updated_at.isoformat() if apartment.updated_at else None
+    return repr((str(apartment.id), updated_at, occupants, *extra))
+
+
+def assignment_costs(
+    apartment: Apartment,
+    occupants: int,
+    move_in_date: date,
+    custom_monthly_rate: Optional[Decimal] = None
+) -> Dict[str, Any]:
+    """calculate_assignment_costs memorizado; el resultado es compartido, no modificarlo"""
+    key = _pricing_key(apartment, occupants, move_in_date.isoformat(), custom_monthly_rate)
+    costs = PRICING_CACHE.get(key)
+    if costs is None:
+        costs = calculate_assignment_costs(
+            apartment_monthly_rent=apartment.monthly_rent or Decimal('0'),
+            apartment_deposit=apartment.deposit or Decimal('0'),
+            apartment_key_money=apartment.key_money or Decimal('0'),
+            apartment_management_fee=apartment.management_fee or Decimal('0'),
+            apartment_pricing_type=apartment.pricing_type.value,
+            apartment_current_occupants=occupants,
+            apartment_utilities_included=apartment.utilities_included,
+            apartment_parking_included=apartment.parking_included,
+            apartment_parking_fee=apartment.parking_fee or Decimal('0'),
+            move_in_date=move_in_date,
+            custom_monthly_rate=custom_monthly_rate
+        )
+        PRICING_CACHE.set(key, costs)
+    return costs
+
+
+def month_costs(
+    apartment: Apartment,
+    occupants: int,
+    year: int,
+    month: int,
+    custom_monthly_rate: Optional[Decimal] = None
+) -> List[Dict[str, Any]]:
+    """
+    Coste de entrada para cada día del mes (selector de fechas). Solo el
+    prorrateo del primer mes depende del día: el resto se calcula una vez.
+    """
+    key = _pricing_key(apartment, occupants, f"{year:04d}-{month:02d}", custom_monthly_rate)
+    days = PRICING_CACHE.get(key)
+    if days is None:
+        base = assignment_costs(apartment, occupants, date(year, month, 1), custom_monthly_rate)
+        total_monthly = base["monthly_costs"]["total_monthly"]
+        upfront = base["initial_costs"]["deposit"] + base["initial_costs"]["key_money"]
+        days = []
+        for day in range(1, monthrange(year, month)[1] + 1):
+            prorated = calculate_prorated_rent(total_monthly, date(year, month, day))
+            days.append({
+                "move_in_date": date(year, month, day).isoformat(),
+                "days_occupied": prorated["days_occupied"],
+                "first_month_rent": prorated["prorated_rent"],
+                "total_initial": (upfront + prorated["prorated_rent"]).quantize(Decimal('0.01')),
+            })
+        PRICING_CACHE.set(key, days)
+    return days
+
+
+def price_assignment(
+    apartment: Apartment,
+    occupants: int,
+    data: AssignmentCreate
+) -> Tuple[Decimal, Decimal]:
+    """(monthly_charge, deposit) de una entrada con `occupants` ocupantes tras ella"""
+    if data.custom_monthly_rate:
+        # Si se especificó un precio personalizado, usarlo
+        return data.custom_monthly_rate, Decimal('0')
+
+    costs = assignment_costs(apartment, occupants, data.move_in_date)
+    return costs["monthly_costs"]["total_monthly"], costs["initial_costs"]["deposit"]
+
+
+def new_assignment(data: AssignmentCreate, monthly_charge: Decimal, deposit: Decimal) -> ApartmentAssignment:
+    return ApartmentAssignment(
+        apartment_id=data.apartment_id,
+        employee_id=data.employee_id,
+        move_in_date=data.move_in_date,
+        move_out_date=data.move_out_date,
+        monthly_charge=monthly_charge,
+        custom_monthly_rate=data.custom_monthly_rate,
+        deposit_paid=data.deposit_paid if data.deposit_paid else deposit,
+        is_current=True,
+        notes=data.notes
+    )
+
+
+def _occupancy_status(apartment: Apartment, occupants: int) -> Optional[ApartmentStatus]:
+    """Mismas reglas que occupancy.claim/release"""
+    if occupants >= (apartment.capacity or 0):
+        return ApartmentStatus.OCCUPIED
+    if apartment.status == ApartmentStatus.OCCUPIED:
+        return ApartmentStatus.AVAILABLE
+    return apartment.status
+
+
+def bulk_assign(
+    db: Session,
+    rows: List[AssignmentCreate]
+) -> Tuple[List[ApartmentAssignment], List[dict]]:
+    """
+    Valida, calcula y escribe un lote de asignaciones (sin commit).
+    Devuelve (asignaciones creadas, errores por fila); las filas con error
+    no se escriben. Un empleado que se traslada dentro del lote libera su
+    plaza anterior para las filas siguientes.
+    """
+    employee_ids = sorted({r.employee_id for r in rows}, key=str)
+    employees: Dict[UUID, Employee] = {
+        e.id: e for e in db.query(Employee)
+        .filter(Employee.id.in_(employee_ids))
+        .order_by(Employee.id)
+        .with_for_update()
+    }
+
+    apartment_ids = {r.apartment_id for r in rows} | {e.apartment_id for e in employees.values() if e.apartment_id}
+    apartments: Dict[UUID, Apartment] = {
+        a.id: a for a in db.query(Apartment)
+        .filter(Apartment.id.in_(apartment_ids))
+        .order_by(Apartment.id)
+        .with_for_update()
+    }
+    occupants = {a.id: a.current_occupants or 0 for a in apartments.values()}
+
+    errors: List[dict] = []
+    seen = set()
+    accepted: List[Tuple[AssignmentCreate, Employee]] = []
+    created: List[ApartmentAssignment] = []
+
+    for row_number, data in enumerate(rows, start=1):
+        employee = employees.get(data.employee_id)
+        apartment = apartments.get(data.apartment_id)
+        error = None
+        if data.employee_id in seen:
+            error = "Empleado repetido en el lote"
+        elif not employee:
+            error = "Empleado no encontrado"
+        elif not apartment:
+            error = "Apartamento no encontrado"
+        elif employee.apartment_id != apartment.id and occupants[apartment.id] >= (apartment.capacity or 0):
+            error = f"El apartamento está lleno ({occupants[apartment.id]}/{apartment.capacity})"
+
+        if error:
+            errors.append({"row": row_number, "employee_id": str(data.employee_id), "error": error})
+            continue
+        seen.add(data.employee_id)
+
+        if employee.apartment_id != apartment.id:
+            occupants[apartment.id] += 1
+            if employee.apartment_id in occupants:
+                occupants[employee.apartment_id] = max(0, occupants[employee.apartment_id] - 1)
+
+        monthly_charge, deposit = price_assignment(apartment, occupants[apartment.id], data)
+        created.append(new_assignment(data, monthly_charge, deposit))
+        accepted.append((data, employee))
+
+    if not accepted:
+        return [], errors
+
+    # Cerrar las asignaciones actuales de los empleados que cambian (una sentencia, executemany)
+    db.execute(
+        update(ApartmentAssignment.__table__)
+        .where(
+            ApartmentAssignment.__table__.c.employee_id == bindparam("_employee_id"),
+            ApartmentAssignment.__table__.c.is_current == True
+        )
+        .values(is_current=False, move_out_date=bindparam("_move_out_date")),
+        [{"_employee_id": data.employee_id, "_move_out_date": data.move_in_date} for data, _ in accepted]
+    )
+
+    db.add_all(created)
+    for data, employee in accepted:
+        employee.apartment_id = data.apartment_id
+    for apartment_id, count in occupants.items():
+        apartment = apartments[apartment_id]
+        if count != (apartment.current_occupants or 0):
+            apartment.current_occupants = count
+            apartment.status = _occupancy_status(apartment, count)
+    db.flush()
+
+    billing.settle(db, occupants.keys(), min(data.move_in_date for data, _ in accepted), reason="bulk")
+
+    return created, errors
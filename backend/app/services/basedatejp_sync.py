@@ -0,0 +1,505 @@
+"""
+BASEDATEJP Sync - Sincronización incremental de BASEDATEJP/*.json
+UNS-Shatak (社宅管理システム)
+
+Cada registro importado (fábrica, apartamento, empleado, asignación) deja
+en sync_records el hash SHA-256 de su contenido ya mapeado a columnas. En la
+siguiente ejecución:
+
+1. Se mapean los JSON y se calcula el hash de cada registro.
+2. Se compara con los hashes guardados: altas, cambios y bajas.
+3. Solo se escriben esos registros, por lotes:
+   - Fábricas, apartamentos y empleados: INSERT ... ON CONFLICT (código)
+     DO UPDATE, así una primera sincronización sobre datos ya importados
+     no falla por las claves únicas.
+   - Asignaciones: altas con id generado aquí (o la fila que ya existe para
+     el mismo empleado, apartamento y entrada); cambios por id.
+   - Bajas: is_active = False (fábricas, apartamentos, empleados) o fin de
+     la asignación (is_current = False, move_out_date = hoy).
+4. Se recalculan search_key, la ocupación y la liquidación de los meses ya
+   facturados de los apartamentos afectados.
+
+Todo en una transacción (el commit lo hace core.jobs). Los registros que
+fallan no guardan hash y se reintentan en la siguiente ejecución.
+
+full=True reescribe todos los registros aunque su hash no haya cambiado;
+dry_run=True solo informa de la diferencia.
+"""
+
+import hashlib
+import json
+import os
+import uuid
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import pandas as pd
+from sqlalchemy import String, bindparam, delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.models.models import Apartment, ApartmentAssignment, Employee, Factory, SyncRecord
+from app.services import billing
+from app.services.bulk_import import write_batches
+from app.services.factory_catalog import FactoryCatalog, factory_code
+from app.services.factory_resolver import FactoryResolver
+from app.services.occupancy import reconcile
+from app.services.search import refresh_search_keys
+from app.services.table_import import coerce_column
+from app.utils.address import extract_prefecture_city
+
+SOURCE = "basedatejp"
+
+# Claves de sync_records.entity, en orden de aplicación
+ENTITIES = ("factories", "apartments", "employees", "assignments")
+
+EMPLOYEE_FIELDS = [
+    "full_name_roman", "full_name_furigana", "nationality", "gender", "date_of_birth",
+    "address", "visa_type", "visa_expiry", "employment_start_date", "employment_end_date",
+    "contract_type", "hourly_rate", "status"
+]
+
+# Claves de cada lista del informe (las cuentas son completas)
+REPORT_KEYS_LIMIT = 50
+
+
+def record_hash(values: Dict[str, Any]) -> str:
+    """Hash estable del contenido de un registro (claves ordenadas)"""
+    text = json.dumps(values, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def diff_records(
+    previous: Dict[str, str],
+    current: Dict[str, str],
+    full: bool = False
+) -> Dict[str, List[str]]:
+    """Altas, cambios y bajas entre dos {clave: hash}; con full, todo lo existente cuenta como cambio"""
+    inserted = [k for k in current if k not in previous]
+    changed = [k for k in current if k in previous and (full or previous[k] != current[k])]
+    removed = [k for k in previous if k not in current]
+    return {
+        "inserted": inserted,
+        "changed": changed,
+        "removed": removed,
+        "unchanged": [k for k in current if k in previous and k not in changed],
+    }
+
+
+def _fit(model, values: Dict[str, Any]) -> Dict[str, Any]:
+    """Texto sin espacios y recortado a la longitud de la columna, como la importación completa"""
+    table = model.__table__
+    fitted = {}
+    for name, value in values.items():
+        if isinstance(value, str):
+            value = value.strip() or None
+            column = table.c.get(name)
+            length = getattr(column.type, 'length', None) if column is not None and isinstance(column.type, String) else None
+            if value and length:
+                value = value[:length]
+        fitted[name] = value
+    return fitted
+
+
+def _load_list(base_path: str, filename: str, key: str) -> Optional[List[dict]]:
+    """Lista `key` de un JSON de BASEDATEJP; None si el fichero no existe"""
+    path = os.path.join(base_path, filename)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return [r for r in json.load(f).get(key, []) if isinstance(r, dict)]
+
+
+# ===========================================
+# Mapeo JSON -> columnas (con códigos, no UUIDs)
+# ===========================================
+
+def factory_rows(catalog: FactoryCatalog) -> Dict[str, dict]:
+    """Fábricas por factory_id completo (el factory_code puede ir recortado)"""
+    rows = {}
+    for entry in catalog.entries():
+        rows[entry.factory_id] = _fit(Factory, {
+            "factory_code": factory_code(entry.factory_id),
+            "name": entry.company or entry.factory_id,
+            "name_japanese": entry.company,
+            "address": entry.address,
+            "prefecture": entry.prefecture,
+            "city": entry.city,
+            "phone": entry.phone,
+        })
+    return rows
+
+
+def apartment_rows(records: List[dict]) -> Dict[str, dict]:
+    rows = {}
+    for apt in records:
+        code = str(apt.get('apartment_code') or '').strip()
+        if not code:
+            continue
+        address = apt.get('address') or ''
+        prefecture, city = apt.get('prefecture'), apt.get('city')
+        if not prefecture or not city:
+            prefecture, city = extract_prefecture_city(address)
+        rows[code] = _fit(Apartment, {
+            "apartment_code": code,
+            "name": apt.get('name') or code,
+            "address": address,
+            "prefecture": prefecture,
+            "city": city,
+            "postal_code": apt.get('postal_code'),
+            "capacity": apt.get('capacity') or 1,
+            "status": apt.get('status') or 'available',
+        })
+    return rows
+
+
+def employee_rows(records: List[dict], resolver: FactoryResolver) -> Dict[str, dict]:
+    rows = {}
+    for emp in records:
+        code = str(emp.get('employee_code') or '').strip()
+        if not code:
+            continue
+        original_id = resolver.resolve(emp.get('factory_name'))
+        rows[code] = _fit(Employee, {
+            "employee_code": code,
+            **{field: emp.get(field) for field in EMPLOYEE_FIELDS},
+            "contract_type": emp.get('contract_type') or 'dispatch',
+            "status": emp.get('status') or 'active',
+            "factory_key": original_id,
+            "apartment_code": emp.get('apartment_code'),
+        })
+    return rows
+
+
+def assignment_key(employee_code: str, apartment_code: str, move_in_date: Optional[str]) -> str:
+    return f"{employee_code}|{apartment_code}|{move_in_date or ''}"
+
+
+def assignment_rows(records: List[dict]) -> Dict[str, dict]:
+    rows = {}
+    for asn in records:
+        employee_code, apartment_code = asn.get('employee_code'), asn.get('apartment_code')
+        if not employee_code or not apartment_code:
+            continue
+        rows[assignment_key(employee_code, apartment_code, asn.get('move_in_date'))] = {
+            "employee_code": employee_code,
+            "apartment_code": apartment_code,
+            "move_in_date": asn.get('move_in_date'),
+            "is_current": asn.get('is_current', True),
+        }
+    return rows
+
+
+# ===========================================
+# Aplicación
+# ===========================================
+
+def _coerce(model, keys: List[str], rows: Dict[str, dict], errors: List[dict]) -> Tuple[List[str], List[dict]]:
+    """Convierte los registros `keys` a los tipos de la tabla; los no convertibles van a errors"""
+    if not keys:
+        return [], []
+    table = model.__table__
+    frame = pd.DataFrame([rows[k] for k in keys], index=keys)
+    rejected = pd.Series(False, index=frame.index)
+    for name in frame.columns:
+        values, invalid = coerce_column(frame[name], table.c[name])
+        frame[name] = values
+        for key in frame.index[invalid & ~rejected]:
+            errors.append({"key": key, "error": f"Valor no válido en '{name}': {str(rows[key][name])[:100]}"})
+        rejected |= invalid
+    frame = frame[~rejected]
+    records = frame.astype(object).where(frame.notna(), None).to_dict(orient="records")
+    return list(frame.index), records
+
+
+def _write(db: Session, stmt, keys: List[str], records: List[dict], errors: List[dict]) -> List[str]:
+    """write_batches con las claves del registro en lugar de números de fila; devuelve las escritas"""
+    if not records:
+        return []
+    failed: List[dict] = []
+    write_batches(db, stmt, records, list(range(len(records))), failed)
+    failed_rows = {e["row"] for e in failed}
+    errors.extend({"key": keys[e["row"]], "error": e["error"]} for e in failed)
+    return [k for i, k in enumerate(keys) if i not in failed_rows]
+
+
+def _upsert_statement(model, key: str, columns: List[str]):
+    """INSERT ... ON CONFLICT (key) DO UPDATE: el registro sincronizado reemplaza los valores"""
+    table = model.__table__
+    stmt = insert(table)
+    updates = {c: stmt.excluded[c] for c in columns if c != key}
+    updates["is_active"] = True
+    updates["updated_at"] = func.now()
+    return stmt.on_conflict_do_update(index_elements=[key], set_=updates).returning(table.c.id)
+
+
+def _apply_coded(
+    db: Session,
+    model,
+    key: str,
+    rows: Dict[str, dict],
+    diff: Dict[str, List[str]],
+    previous_ids: Dict[str, Any],
+    errors: List[dict]
+) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Upsert de altas y cambios, baja lógica de los eliminados; devuelve ({clave: id}, bajas aplicadas).
+    La clave del registro puede no ser el valor de la columna `key` (fábricas).
+    """
+    table = model.__table__
+    keys, records = _coerce(model, diff["inserted"] + diff["changed"], rows, errors)
+    codes = {k: record[key] for k, record in zip(keys, records)}
+    written: List[str] = []
+    if records:
+        stmt = _upsert_statement(model, key, list(records[0]))
+        written = _write(db, stmt, keys, records, errors)
+
+    by_code = dict(db.execute(
+        select(table.c[key], table.c.id).where(table.c[key].in_([codes[k] for k in written]))
+    ).all()) if written else {}
+    ids = {k: by_code[codes[k]] for k in written if codes[k] in by_code}
+    if hasattr(model, "SEARCH_KEY_FIELDS") and ids:
+        refresh_search_keys(db, model, list(ids.values()))
+
+    # Una fila escrita con otra clave (clave antigua eliminada) no se da de baja
+    kept = set(ids.values())
+    removed = [k for k in diff["removed"] if previous_ids.get(k) and previous_ids[k] not in kept]
+    if removed:
+        db.execute(
+            update(table).where(table.c.id.in_([previous_ids[k] for k in removed]))
+            .values(is_active=False, updated_at=func.now())
+        )
+    return ids, diff["removed"]
+
+
+def _apply_employees(
+    db: Session,
+    rows: Dict[str, dict],
+    diff: Dict[str, List[str]],
+    previous_ids: Dict[str, Any],
+    errors: List[dict]
+) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Como _apply_coded, con factory_key/apartment_code traducidos a ids.
+    La fábrica se busca por su factory_id completo en sync_records y, si no
+    se sincronizó (migrador), por su factory_code.
+    """
+    pending = diff["inserted"] + diff["changed"]
+    synced_factories = dict(db.execute(
+        select(SyncRecord.record_key, SyncRecord.entity_id)
+        .where(SyncRecord.source == SOURCE, SyncRecord.entity == "factories")
+    ).all())
+    factory_ids = dict(db.execute(select(Factory.factory_code, Factory.id)).all())
+    apartment_ids = dict(db.execute(select(Apartment.apartment_code, Apartment.id)).all())
+    resolved = {}
+    for k in pending:
+        row = dict(rows[k])
+        factory_key = row.pop("factory_key")
+        row["factory_id"] = (
+            synced_factories.get(factory_key) or factory_ids.get(factory_code(factory_key))
+        ) if factory_key else None
+        row["apartment_id"] = apartment_ids.get(row.pop("apartment_code"))
+        resolved[k] = row
+    return _apply_coded(db, Employee, "employee_code", resolved, diff, previous_ids, errors)
+
+
+def _apply_assignments(
+    db: Session,
+    rows: Dict[str, dict],
+    diff: Dict[str, List[str]],
+    previous_ids: Dict[str, Any],
+    errors: List[dict]
+) -> Tuple[Dict[str, Any], List[str], set, Optional[date]]:
+    """
+    Altas, cambios y fin de las asignaciones eliminadas.
+    Devuelve ({clave: id}, bajas aplicadas, apartamentos afectados, primera fecha afectada).
+    """
+    table = ApartmentAssignment.__table__
+    today = date.today()
+    employee_ids = dict(db.execute(select(Employee.employee_code, Employee.id)).all())
+    apartment_ids = dict(db.execute(select(Apartment.apartment_code, Apartment.id)).all())
+
+    # Filas ya existentes (importación completa o migrador): se adoptan en lugar de duplicarlas
+    existing: Dict[Tuple[Any, Any, Optional[date]], Any] = {}
+    for assignment_id, employee_id, apartment_id, move_in in db.execute(
+        select(table.c.id, table.c.employee_id, table.c.apartment_id, table.c.move_in_date)
+        .order_by(table.c.move_in_date)
+    ).all():
+        existing[(employee_id, apartment_id, move_in)] = assignment_id
+        existing[(employee_id, apartment_id, None)] = assignment_id  # la más reciente
+
+    pending: List[str] = []
+    resolved: Dict[str, dict] = {}
+    targets: Dict[str, Any] = {}
+    for k in diff["inserted"] + diff["changed"]:
+        row = rows[k]
+        employee_id, apartment_id = employee_ids.get(row["employee_code"]), apartment_ids.get(row["apartment_code"])
+        if not employee_id or not apartment_id:
+            errors.append({"key": k, "error": "Empleado o apartamento no encontrado"})
+            continue
+        resolved[k] = {
+            "employee_id": employee_id,
+            "apartment_id": apartment_id,
+            "move_in_date": row["move_in_date"],
+            "is_current": row["is_current"],
+        }
+        pending.append(k)
+
+    keys, records = _coerce(ApartmentAssignment, pending, resolved, errors)
+    inserts: List[Tuple[str, dict]] = []
+    updates: List[Tuple[str, dict]] = []
+    for k, record in zip(keys, records):
+        target = previous_ids.get(k) or existing.get((record["employee_id"], record["apartment_id"], record["move_in_date"]))
+        if target:
+            targets[k] = target
+            updates.append((k, record))
+        else:
+            record["id"] = targets[k] = uuid.uuid4()
+            record["move_in_date"] = record["move_in_date"] or today
+            inserts.append((k, record))
+
+    written = _write(db, insert(table).returning(table.c.id), [k for k, _ in inserts], [r for _, r in inserts], errors)
+    if updates:
+        # executemany con bindparam, como refresh_search_keys; la fecha de entrada solo si viene en el JSON
+        db.execute(
+            update(table).where(table.c.id == bindparam("_id")).values(
+                is_current=bindparam("_is_current"),
+                move_in_date=func.coalesce(bindparam("_move_in", type_=table.c.move_in_date.type), table.c.move_in_date),
+                updated_at=func.now()
+            ),
+            [{"_id": targets[k], "_is_current": r["is_current"], "_move_in": r["move_in_date"]} for k, r in updates]
+        )
+        written += [k for k, _ in updates]
+
+    removed_ids = [previous_ids[k] for k in diff["removed"] if previous_ids.get(k)]
+    if removed_ids:
+        db.execute(
+            update(table).where(table.c.id.in_(removed_ids), table.c.is_current == True).values(
+                is_current=False,
+                move_out_date=func.coalesce(table.c.move_out_date, today),
+                updated_at=func.now()
+            )
+        )
+
+    ids = {k: targets[k] for k in written}
+    affected = set(db.execute(
+        select(table.c.apartment_id).where(table.c.id.in_(list(ids.values()) + removed_ids))
+    ).scalars().all()) if ids or removed_ids else set()
+    move_ins = [r["move_in_date"] for k, r in inserts + updates if k in ids and r["move_in_date"]]
+    since = min(move_ins + ([today] if removed_ids or updates else []), default=None)
+    return ids, diff["removed"], affected, since
+
+
+def _save_hashes(
+    db: Session,
+    entity: str,
+    hashes: Dict[str, str],
+    ids: Dict[str, Any],
+    removed: List[str]
+) -> None:
+    """Guarda el hash de los registros escritos y olvida los eliminados"""
+    table = SyncRecord.__table__
+    if removed:
+        db.execute(delete(table).where(
+            table.c.source == SOURCE, table.c.entity == entity, table.c.record_key.in_(removed)
+        ))
+    if ids:
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["source", "entity", "record_key"],
+            set_={"content_hash": stmt.excluded.content_hash, "entity_id": stmt.excluded.entity_id, "synced_at": func.now()}
+        )
+        db.execute(stmt, [
+            {"source": SOURCE, "entity": entity, "record_key": k, "content_hash": hashes[k], "entity_id": entity_id}
+            for k, entity_id in ids.items()
+        ])
+
+
+def _load_rows(entity: str, base_path: str, catalog: FactoryCatalog) -> Optional[Dict[str, dict]]:
+    """Registros mapeados de una entidad; None si su JSON no existe"""
+    if entity == "factories":
+        return factory_rows(catalog) if len(catalog) else None
+    if entity == "apartments":
+        records = _load_list(base_path, "apartments.json", "apartments")
+        return None if records is None else apartment_rows(records)
+    if entity == "employees":
+        records = _load_list(base_path, "employees.json", "employees")
+        return None if records is None else employee_rows(records, FactoryResolver.from_catalog(catalog))
+    records = _load_list(base_path, "apartment_assignments.json", "assignments")
+    return None if records is None else assignment_rows(records)
+
+
+def _previous(db: Session, entity: str) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    """({clave: hash}, {clave: entity_id}) de la última sincronización"""
+    rows = db.execute(
+        select(SyncRecord.record_key, SyncRecord.content_hash, SyncRecord.entity_id)
+        .where(SyncRecord.source == SOURCE, SyncRecord.entity == entity)
+    ).all()
+    return {k: h for k, h, _ in rows}, {k: i for k, _, i in rows}
+
+
+def _report(diff: Dict[str, List[str]], errors: List[dict]) -> Dict[str, Any]:
+    return {
+        **{name: len(keys) for name, keys in diff.items()},
+        "failed": len(errors),
+        "keys": {name: keys[:REPORT_KEYS_LIMIT] for name, keys in diff.items() if name != "unchanged"},
+    }
+
+
+def sync_basedatejp(
+    db: Session,
+    base_path: str,
+    full: bool = False,
+    dry_run: bool = False,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> Dict[str, Any]:
+    """
+    Sincroniza BASEDATEJP con la base de datos (sin commit).
+    Las entidades cuyo JSON no existe no se tocan (no se interpretan como bajas).
+    """
+    catalog = FactoryCatalog(base_path)
+    results: Dict[str, Any] = {}
+    all_errors: List[dict] = []
+    affected_apartments: set = set()
+    since: Optional[date] = None
+    for step, entity in enumerate(ENTITIES, start=1):
+        rows = _load_rows(entity, base_path, catalog)
+        if rows is None:
+            continue
+        hashes = {k: record_hash(v) for k, v in rows.items()}
+        previous_hashes, previous_ids = _previous(db, entity)
+        diff = diff_records(previous_hashes, hashes, full)
+        errors: List[dict] = []
+
+        if not dry_run:
+            if entity == "factories":
+                ids, removed = _apply_coded(db, Factory, "factory_code", rows, diff, previous_ids, errors)
+            elif entity == "apartments":
+                ids, removed = _apply_coded(db, Apartment, "apartment_code", rows, diff, previous_ids, errors)
+            elif entity == "employees":
+                ids, removed = _apply_employees(db, rows, diff, previous_ids, errors)
+            else:
+                ids, removed, affected_apartments, since = _apply_assignments(db, rows, diff, previous_ids, errors)
+            _save_hashes(db, entity, hashes, ids, removed)
+
+        results[entity] = _report(diff, errors)
+        all_errors.extend({"entity": entity, **e} for e in errors)
+        if progress:
+            progress(step, len(ENTITIES))
+
+    settlement = None
+    if not dry_run:
+        # Los contadores se recalculan a partir de empleados y asignaciones
+        reconcile(db)
+        settlement = billing.settle(db, affected_apartments, since, reason="sync")
+
+    touched = sum(r["inserted"] + r["changed"] + r["removed"] for r in results.values())
+    failed = len(all_errors)
+    return {
+        "mode": "full" if full else "sync",
+        "dry_run": dry_run,
+        "results": results,
+        "settlement": settlement,
+        "total_rows": touched,
+        "successful_rows": touched - failed,
+        "failed_rows": failed,
+        "errors": all_errors,
+    }
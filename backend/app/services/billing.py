@@ -0,0 +1,312 @@
+"""
+Billing - Facturación mensual de todas las asignaciones
+UNS-Shatak (社宅管理システム)
+
+Calcula en una sola pasada, por columnas (pandas/numpy), el cargo de cada
+asignación que ocupa el mes: renta (compartida o fija), gestión, parking y
+utilidades, prorrateados por días (日割り). Las mismas reglas que
+utils.rent_calculator, pero en yenes enteros y con aritmética entera:
+
+- Un importe compartido se reparte día a día entre los ocupantes presentes
+  ese día (si B sale el 15 y C entra el 16, A paga la mitad todo el mes) y
+  el resto de la división se asigna yen a yen, así que las partes suman
+  exactamente el importe del apartamento prorrateado por sus días ocupados.
+- El prorrateo redondea medio yen hacia arriba, componente a componente; el
+  total es la suma de los componentes.
+- Un precio personalizado (custom_monthly_rate) es el cargo completo, como
+  en la creación de asignaciones.
+
+El resultado se guarda en monthly_charges; repetir un mes lo reemplaza.
+
+settle() liquida los cambios de ocupación de un mes ya facturado (salidas,
+traslados, entradas a mitad de mes): recalcula de una vez todas las líneas
+de los apartamentos afectados con las mismas reglas y guarda en
+charge_adjustments la diferencia con lo facturado hasta ahora. El cargo
+efectivo del mes es monthly_charges más sus ajustes.
+"""
+
+from calendar import monthrange
+from datetime import date
+from typing import Any, Dict, Iterable, Optional
+from uuid import UUID
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, delete, func, insert, or_, select, union_all
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.models import Apartment, ApartmentAssignment, ChargeAdjustment, MonthlyCharge, PricingType
+
+# Utilidades estimadas por persona si el apartamento no las incluye (como calculate_total_monthly_cost)
+ESTIMATED_UTILITIES = 8000
+
+CHARGE_COLUMNS = ["rent", "management_fee", "parking", "utilities"]
+
+
+def month_bounds(year: int, month: int):
+    """(primer día, último día, días del mes)"""
+    days = monthrange(year, month)[1]
+    return date(year, month, 1), date(year, month, days), days
+
+
+def billable_assignments(start: date, end: date):
+    """Asignaciones que ocupan algún día entre `start` y `end`, con los datos del apartamento"""
+    return select(
+        ApartmentAssignment.id.label("assignment_id"),
+        ApartmentAssignment.employee_id,
+        ApartmentAssignment.apartment_id,
+        ApartmentAssignment.move_in_date,
+        ApartmentAssignment.move_out_date,
+        ApartmentAssignment.custom_monthly_rate,
+        Apartment.pricing_type,
+        Apartment.monthly_rent,
+        Apartment.management_fee,
+        Apartment.parking_fee,
+        Apartment.parking_included,
+        Apartment.utilities_included,
+    ).join(Apartment, Apartment.id == ApartmentAssignment.apartment_id).where(
+        ApartmentAssignment.move_in_date <= end,
+        or_(
+            ApartmentAssignment.move_out_date >= start,
+            and_(ApartmentAssignment.move_out_date.is_(None), ApartmentAssignment.is_current == True)
+        )
+    )
+
+
+def _yen(values: pd.Series) -> np.ndarray:
+    """Importes NUMERIC(10,2) a yenes enteros (medio yen hacia arriba), sin pasar por float"""
+    sen = values.map(lambda v: 0 if v is None or pd.isna(v) else int(round(v * 100))).to_numpy(dtype=np.int64)
+    return (sen + 50) // 100
+
+
+def _prorate(amount: np.ndarray, days: np.ndarray, days_in_month: int) -> np.ndarray:
+    """amount × days / days_in_month, medio yen hacia arriba"""
+    return (2 * amount * days + days_in_month) // (2 * days_in_month)
+
+
+def _day_weights(groups, first: np.ndarray, last: np.ndarray, days_in_month: int):
+    """
+    Peso de cada asignación en el reparto diario de su apartamento.
+
+    Cada día se reparte entre los ocupantes presentes ese día: el peso es
+    Σ common / ocupantes_del_día sobre los días de la asignación, con
+    `common` el mínimo común múltiplo de los ocupantes por día del
+    apartamento (aritmética entera). Devuelve (peso, common, días con algún
+    ocupante, máximo de ocupantes simultáneos), por fila.
+    """
+    size = len(first)
+    weights = np.zeros(size, dtype=np.int64)
+    common = np.ones(size, dtype=np.int64)
+    occupied_days = np.zeros(size, dtype=np.int64)
+    max_occupants = np.zeros(size, dtype=np.int64)
+    day = np.arange(days_in_month)
+
+    for rows in groups.indices.values():
+        present = (day >= first[rows, None]) & (day <= last[rows, None])
+        per_day = present.sum(axis=0)
+        occupied = per_day > 0
+        lcm = int(np.lcm.reduce(np.unique(per_day[occupied]))) if occupied.any() else 1
+        weights[rows] = (present * (lcm // np.where(occupied, per_day, 1))).sum(axis=1)
+        common[rows] = lcm
+        occupied_days[rows] = int(occupied.sum())
+        max_occupants[rows] = np.where(present, per_day, 0).max(axis=1)
+    return weights, common, occupied_days, max_occupants
+
+
+def _split_by_days(
+    amount: np.ndarray,
+    weights: np.ndarray,
+    common: np.ndarray,
+    occupied_days: np.ndarray,
+    apartment: pd.Series,
+    days_in_month: int
+) -> np.ndarray:
+    """
+    Importe compartido prorrateado y repartido día a día. Las partes suman
+    el importe del apartamento prorrateado por sus días ocupados (medio yen
+    hacia arriba); el resto de yenes va a los primeros ocupantes del orden.
+    """
+    shares = amount * weights // (days_in_month * common)
+    target = _prorate(amount, occupied_days, days_in_month)
+    remainder = target - pd.Series(shares).groupby(apartment.to_numpy()).transform("sum").to_numpy()
+    eligible = pd.Series(weights > 0)
+    rank = eligible.astype(np.int64).groupby(apartment.to_numpy()).cumsum().to_numpy() - 1
+    return shares + (eligible.to_numpy() & (rank < remainder))
+
+
+def compute_charges(rows: pd.DataFrame, year: int, month: int) -> pd.DataFrame:
+    """Cargos del mes a partir de las filas de billable_assignments()"""
+    start, end, days_in_month = month_bounds(year, month)
+    if rows.empty:
+        return pd.DataFrame(columns=[
+            "assignment_id", "employee_id", "apartment_id", "pricing_type", "is_custom_rate",
+            "occupants", "days_billed", "days_in_month", *CHARGE_COLUMNS, "total"
+        ])
+
+    # Orden estable dentro de cada apartamento: quién recibe el yen del resto
+    df = rows.sort_values(["apartment_id", "move_in_date", "assignment_id"], key=lambda s: s.astype(str)).reset_index(drop=True)
+
+    move_in = pd.to_datetime(df["move_in_date"]).clip(lower=pd.Timestamp(start))
+    move_out = pd.to_datetime(df["move_out_date"]).fillna(pd.Timestamp(end)).clip(upper=pd.Timestamp(end))
+    # Días del mes ocupados, como índices 0..days_in_month-1 (primero > último si ninguno)
+    first = (move_in - pd.Timestamp(start)).dt.days.to_numpy(dtype=np.int64)
+    last = (move_out - pd.Timestamp(start)).dt.days.to_numpy(dtype=np.int64)
+    days = (last - first + 1).clip(min=0)
+
+    groups = df.groupby("apartment_id", sort=False)
+    weights, common, occupied_days, occupants = _day_weights(groups, first, last, days_in_month)
+
+    shared = (df["pricing_type"].map(lambda p: getattr(p, "value", p)) == PricingType.SHARED.value).to_numpy()
+    custom_rate = _yen(df["custom_monthly_rate"])
+    custom = custom_rate > 0
+    parking_included = df["parking_included"].fillna(False).astype(bool).to_numpy()
+    utilities_included = df["utilities_included"].fillna(False).astype(bool).to_numpy()
+
+    def per_person(amount: np.ndarray) -> np.ndarray:
+        """Cargo del mes ya prorrateado: compartido día a día o fijo por persona"""
+        split = _split_by_days(amount, weights, common, occupied_days, df["apartment_id"].astype(str), days_in_month)
+        return np.where(shared, split, _prorate(amount, days, days_in_month))
+
+    prorated = {
+        "rent": np.where(custom, _prorate(custom_rate, days, days_in_month), per_person(_yen(df["monthly_rent"]))),
+        "management_fee": np.where(custom, 0, per_person(_yen(df["management_fee"]))),
+        "parking": np.where(custom | parking_included, 0, per_person(_yen(df["parking_fee"]))),
+        "utilities": np.where(custom | utilities_included, 0, _prorate(ESTIMATED_UTILITIES, days, days_in_month)),
+    }
+
+    charges = pd.DataFrame({
+        "assignment_id": df["assignment_id"],
+        "employee_id": df["employee_id"],
+        "apartment_id": df["apartment_id"],
+        "pricing_type": df["pricing_type"],
+        "is_custom_rate": custom,
+        "occupants": occupants,
+        "days_billed": days,
+        "days_in_month": days_in_month,
+    })
+    for column in CHARGE_COLUMNS:
+        charges[column] = prorated[column]
+    charges["total"] = charges[CHARGE_COLUMNS].sum(axis=1)
+    return charges
+
+
+def run_billing(db: Session, job, year: int, month: int) -> Dict[str, Any]:
+    """
+    Factura el mes `year`-`month` (background job, ver core.jobs).
+    Sustituye las líneas del mes en monthly_charges.
+    """
+    start, end, _ = month_bounds(year, month)
+    result = db.execute(billable_assignments(start, end))
+    rows = pd.DataFrame.from_records(result.all(), columns=list(result.keys()))
+    job.progress(0, len(rows), force=True)
+
+    charges = compute_charges(rows, year, month)
+    charges["billing_month"] = start
+
+    # Las líneas nuevas ya reflejan los cambios liquidados: los ajustes del mes sobran
+    db.execute(delete(ChargeAdjustment).where(ChargeAdjustment.billing_month == start))
+    db.execute(delete(MonthlyCharge).where(MonthlyCharge.billing_month == start))
+    records = charges.astype(object).to_dict(orient="records")
+    size = settings.IMPORT_BATCH_SIZE
+    for offset in range(0, len(records), size):
+        db.execute(insert(MonthlyCharge.__table__), records[offset:offset + size])
+        job.progress(min(offset + size, len(records)))
+
+    return {
+        "billing_month": start.isoformat(),
+        "assignments": len(records),
+        "apartments": int(charges["apartment_id"].nunique()),
+        "total_amount": int(charges["total"].sum()),
+        **{f"total_{c}": int(charges[c].sum()) for c in CHARGE_COLUMNS},
+        "total_rows": len(records),
+        "successful_rows": len(records),
+        "failed_rows": 0,
+    }
+
+
+# ===========================================
+# Liquidación (精算)
+# ===========================================
+
+def billed_charges(db: Session, start: date, apartment_ids) -> pd.DataFrame:
+    """Lo facturado en el mes por asignación: línea del billing run más ajustes anteriores"""
+    columns = [*CHARGE_COLUMNS, "total"]
+
+    def lines(model):
+        return select(
+            model.assignment_id, model.employee_id, model.apartment_id,
+            *(getattr(model, c) for c in columns)
+        ).where(model.billing_month == start, model.apartment_id.in_(apartment_ids))
+
+    ledger = union_all(lines(MonthlyCharge), lines(ChargeAdjustment)).subquery()
+    result = db.execute(
+        select(
+            ledger.c.assignment_id, ledger.c.employee_id, ledger.c.apartment_id,
+            *(func.sum(ledger.c[c]).label(c) for c in columns)
+        ).group_by(ledger.c.assignment_id, ledger.c.employee_id, ledger.c.apartment_id)
+    )
+    billed = pd.DataFrame.from_records(result.all(), columns=list(result.keys()))
+    for column in columns:
+        billed[column] = _yen(billed[column])
+    return billed
+
+
+def settle(
+    db: Session,
+    apartment_ids: Iterable[Optional[UUID]],
+    since: Optional[date],
+    reason: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Liquida los apartamentos `apartment_ids` en cada mes ya facturado desde
+    el de `since` (sin commit); una salida con fecha atrasada corrige también
+    los meses siguientes. Los meses aún sin facturar no se tocan: run_billing
+    los calculará con la ocupación final.
+    """
+    apartment_ids = sorted({a for a in apartment_ids if a is not None}, key=str)
+    summary = {"months": [], "adjustments": 0, "total_amount": 0}
+    if not apartment_ids or since is None:
+        return summary
+
+    # La sesión no hace autoflush: las altas, cambios y borrados pendientes deben verse en la consulta
+    db.flush()
+
+    months = db.execute(
+        select(MonthlyCharge.billing_month).distinct()
+        .where(MonthlyCharge.billing_month >= since.replace(day=1))
+        .order_by(MonthlyCharge.billing_month)
+    ).scalars().all()
+
+    for start in months:
+        _, end, _ = month_bounds(start.year, start.month)
+
+        result = db.execute(
+            billable_assignments(start, end).where(ApartmentAssignment.apartment_id.in_(apartment_ids))
+        )
+        rows = pd.DataFrame.from_records(result.all(), columns=list(result.keys()))
+        expected = compute_charges(rows, start.year, start.month)
+        billed = billed_charges(db, start, apartment_ids)
+
+        # Asignaciones que ya no ocupan el mes quedan con cargo esperado 0
+        merged = expected.merge(billed, on="assignment_id", how="outer", suffixes=("", "_billed"))
+        for column in ("employee_id", "apartment_id"):
+            merged[column] = merged[column].where(merged[column].notna(), merged[f"{column}_billed"])
+
+        deltas = merged[["assignment_id", "employee_id", "apartment_id"]].copy()
+        deltas["occupants"] = merged["occupants"].fillna(0).astype(np.int64)
+        deltas["days_billed"] = merged["days_billed"].fillna(0).astype(np.int64)
+        for column in [*CHARGE_COLUMNS, "total"]:
+            deltas[column] = (
+                merged[column].fillna(0).astype(np.int64) - merged[f"{column}_billed"].fillna(0).astype(np.int64)
+            )
+        deltas = deltas[deltas[CHARGE_COLUMNS].ne(0).any(axis=1)]
+        if deltas.empty:
+            continue
+
+        deltas["billing_month"] = start
+        deltas["reason"] = reason
+        db.execute(insert(ChargeAdjustment.__table__), deltas.astype(object).to_dict(orient="records"))
+        summary["months"].append(start.isoformat())
+        summary["adjustments"] += len(deltas)
+        summary["total_amount"] += int(deltas["total"].sum())
+
+    return summary
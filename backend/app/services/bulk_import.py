@@ -0,0 +1,257 @@
+"""
+Bulk Import - Importación masiva de fábricas y empleados
+UNS-Shatak (社宅管理システム)
+
+Pipeline:
+1. Normalizar columnas con operaciones vectorizadas de pandas.
+2. Validar filas obligatorias (los errores se reportan por fila).
+   Prefectura y ciudad vacías se deducen de la dirección (utils.address).
+3. Escribir por lotes con INSERT ... ON CONFLICT DO UPDATE; RETURNING
+   (xmax = 0) indica si cada fila se insertó o se actualizó.
+4. Recalcular search_key de las filas escritas (el upsert no pasa por
+   los eventos del ORM).
+
+En las actualizaciones solo se sobrescriben los valores no vacíos
+(COALESCE con el valor actual), igual que la importación fila a fila.
+"""
+
+import io
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import pandas as pd
+from sqlalchemy import select, func, literal_column
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.models import Factory, Employee, ContractType
+from app.schemas.schemas import ImportResult
+from app.services.search import refresh_search_keys
+from app.utils.address import parse_address
+
+FACTORY_COLUMNS = [
+    "name_japanese", "address", "city", "prefecture", "postal_code",
+    "phone", "contact_person", "contact_email", "notes"
+]
+
+EMPLOYEE_STRING_COLUMNS = [
+    "full_name_kanji", "full_name_furigana", "nationality", "gender", "phone",
+    "email", "address", "visa_type", "notes"
+]
+
+EMPLOYEE_DATE_COLUMNS = ["date_of_birth", "visa_expiry", "employment_start_date"]
+
+CONTRACT_TYPES = {
+    "dispatch": ContractType.DISPATCH,
+    "contract": ContractType.CONTRACT,
+    "permanent": ContractType.PERMANENT,
+    "part_time": ContractType.PART_TIME,
+}
+
+
+def read_upload(content: bytes, filename: str) -> pd.DataFrame:
+    """Lee un CSV o Excel subido y normaliza los nombres de columna"""
+    df = pd.read_csv(io.BytesIO(content)) if filename.endswith('.csv') else pd.read_excel(io.BytesIO(content))
+    df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_')
+    return df
+
+
+def clean_strings(df: pd.DataFrame, column: str) -> pd.Series:
+    """Columna de texto sin espacios; vacíos y NaN pasan a None"""
+    if column not in df.columns:
+        return pd.Series(None, index=df.index, dtype=object)
+    raw = df[column]
+    text = raw.astype(str).str.strip()
+    return text.where(raw.notna() & (text != ""), None).astype(object)
+
+
+def clean_dates(df: pd.DataFrame, column: str) -> pd.Series:
+    """Columna de fechas; valores no interpretables pasan a None"""
+    if column not in df.columns:
+        return pd.Series(None, index=df.index, dtype=object)
+    parsed = pd.to_datetime(df[column], errors="coerce", format="mixed")
+    return parsed.dt.date.astype(object).where(parsed.notna(), None)
+
+
+def clean_numbers(df: pd.DataFrame, column: str) -> pd.Series:
+    """Columna numérica; valores no numéricos pasan a None"""
+    if column not in df.columns:
+        return pd.Series(None, index=df.index, dtype=object)
+    numbers = pd.to_numeric(df[column], errors="coerce")
+    return numbers.astype(object).where(numbers.notna(), None)
+
+
+def fill_prefecture_city(frame: pd.DataFrame) -> None:
+    """Completa prefecture y city vacíos a partir de address (una vez por dirección distinta)"""
+    missing = frame["address"].notna() & (frame["prefecture"].isna() | frame["city"].isna())
+    if not missing.any():
+        return
+    parsed = {address: parse_address(address) for address in frame.loc[missing, "address"].unique()}
+    addresses = frame.loc[missing, "address"]
+    for column, part in (("prefecture", "prefecture"), ("city", "municipality")):
+        guessed = addresses.map(lambda a: getattr(parsed[a], part)).astype(object)
+        frame.loc[missing, column] = frame.loc[missing, column].where(frame.loc[missing, column].notna(), guessed)
+
+
+def split_valid(
+    frame: pd.DataFrame,
+    required: List[str],
+    message: str
+) -> Tuple[pd.DataFrame, List[dict]]:
+    """Separa las filas sin campos obligatorios y devuelve sus errores"""
+    missing = frame[required].isna().any(axis=1)
+    errors = [{"row": int(idx) + 2, "error": message} for idx in frame.index[missing]]
+    return frame[~missing], errors
+
+
+def _upsert_statement(model, key: str, columns: List[str]):
+    """
+    INSERT ... ON CONFLICT (key) DO UPDATE con COALESCE sobre los valores actuales.
+    Devuelve (id, inserted): xmax = 0 solo en las filas recién insertadas.
+    """
+    table = model.__table__
+    stmt = insert(table)
+    updates = {c: func.coalesce(stmt.excluded[c], table.c[c]) for c in columns if c != key}
+    updates["is_active"] = True
+    updates["updated_at"] = func.now()
+    return stmt.on_conflict_do_update(index_elements=[key], set_=updates).returning(
+        table.c.id, literal_column("xmax = 0").label("inserted")
+    )
+
+
+def write_batches(
+    db: Session,
+    stmt,
+    records: List[Dict[str, Any]],
+    rows: List[int],
+    errors: List[dict],
+    progress: Optional[Callable[[int], None]] = None,
+    full_rows: bool = False
+) -> List[Any]:
+    """
+    Escribe los registros por lotes de settings.IMPORT_BATCH_SIZE.
+
+    Si un lote falla, se reintenta fila a fila (cada una en su SAVEPOINT)
+    para poder reportar qué filas fallaron. Devuelve la primera columna de
+    RETURNING, o las filas completas con full_rows.
+    """
+    ids = []
+    size = settings.IMPORT_BATCH_SIZE
+
+    def execute(batch: List[Dict[str, Any]]) -> List[Any]:
+        result = db.execute(stmt, batch)
+        return result.all() if full_rows else result.scalars().all()
+
+    for start in range(0, len(records), size):
+        batch = records[start:start + size]
+        try:
+            with db.begin_nested():
+                ids.extend(execute(batch))
+        except SQLAlchemyError:
+            for record, row in zip(batch, rows[start:start + size]):
+                try:
+                    with db.begin_nested():
+                        ids.extend(execute([record]))
+                except SQLAlchemyError as e:
+                    errors.append({"row": row, "error": str(getattr(e, "orig", e))})
+        if progress:
+            progress(len(batch))
+    return ids
+
+
+def _bulk_upsert(
+    db: Session,
+    model,
+    key: str,
+    frame: pd.DataFrame,
+    errors: List[dict],
+    progress: Optional[Callable[[int], None]] = None
+) -> Tuple[List[Any], int]:
+    """Escribe altas y actualizaciones en un solo upsert; devuelve (ids escritos, filas insertadas)"""
+    # Si un código se repite en el fichero gana la última fila
+    frame = frame.drop_duplicates(subset=[key], keep="last")
+    if frame.empty:
+        return [], 0
+
+    stmt = _upsert_statement(model, key, list(frame.columns))
+    records = frame.to_dict(orient="records")
+    for record in records:
+        record["is_active"] = True
+    rows = [int(idx) + 2 for idx in frame.index]
+    written = write_batches(db, stmt, records, rows, errors, progress, full_rows=True)
+    return [row.id for row in written], sum(1 for row in written if row.inserted)
+
+
+def progress_counter(total: int, progress: Optional[Callable[[int, int], None]]):
+    """Adapta progress(procesadas, total) a un contador incremental"""
+    if progress is None:
+        return None
+    done = [0]
+
+    def advance(count: int) -> None:
+        done[0] += count
+        progress(done[0], total)
+    return advance
+
+
+def _result(total: int, errors: List[dict], imported_ids: List[Any], inserted: int) -> ImportResult:
+    failed = len({e["row"] for e in errors})
+    errors.sort(key=lambda e: e["row"])
+    return ImportResult(
+        total_rows=total,
+        successful_rows=total - failed,
+        failed_rows=failed,
+        inserted_rows=inserted,
+        updated_rows=len(imported_ids) - inserted,
+        errors=errors,
+        imported_ids=imported_ids
+    )
+
+
+def import_factories_frame(
+    db: Session,
+    df: pd.DataFrame,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> ImportResult:
+    """Importa fábricas desde un DataFrame ya normalizado (sin commit)"""
+    frame = pd.DataFrame({
+        "factory_code": clean_strings(df, "factory_code"),
+        "name": clean_strings(df, "name"),
+        **{c: clean_strings(df, c) for c in FACTORY_COLUMNS},
+    }, index=df.index)
+
+    fill_prefecture_city(frame)
+
+    frame, errors = split_valid(frame, ["factory_code", "name"], "Missing factory_code or name")
+    ids, inserted = _bulk_upsert(db, Factory, "factory_code", frame, errors, progress_counter(len(frame), progress))
+    refresh_search_keys(db, Factory, ids)
+    return _result(len(df), errors, ids, inserted)
+
+
+def import_employees_frame(
+    db: Session,
+    df: pd.DataFrame,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> ImportResult:
+    """Importa empleados desde un DataFrame ya normalizado (sin commit)"""
+    factory_lookup = dict(db.execute(
+        select(Factory.factory_code, Factory.id).where(Factory.is_active == True)
+    ).all())
+
+    contract_type = clean_strings(df, "contract_type").str.lower().map(CONTRACT_TYPES)
+    factory_code = clean_strings(df, "factory_code")
+
+    frame = pd.DataFrame({
+        "employee_code": clean_strings(df, "employee_code"),
+        "full_name_roman": clean_strings(df, "full_name_roman"),
+        **{c: clean_strings(df, c) for c in EMPLOYEE_STRING_COLUMNS},
+        **{c: clean_dates(df, c) for c in EMPLOYEE_DATE_COLUMNS},
+        "contract_type": contract_type.where(contract_type.notna(), ContractType.DISPATCH).astype(object),
+        "factory_id": factory_code.map(factory_lookup).astype(object),
+        "hourly_rate": clean_numbers(df, "hourly_rate"),
+    }, index=df.index)
+    frame["factory_id"] = frame["factory_id"].where(frame["factory_id"].notna(), None)
+
+    frame, errors = split_valid(frame, ["employee_code", "full_name_roman"], "Missing employee_code or full_name_roman")
+    ids, inserted = _bulk_upsert(db, Employee, "employee_code", frame, errors, progress_counter(len(frame), progress))
+    refresh_search_keys(db, Employee, ids)
+    return _result(len(df), errors, ids, inserted)
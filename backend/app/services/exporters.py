@@ -0,0 +1,240 @@
+"""
+Exporters - Exportación por streaming (CSV / JSON / Excel)
+UNS-Shatak (社宅管理システム)
+
+Las filas se leen con un cursor del servidor (yield_per) en lotes de
+settings.EXPORT_BATCH_SIZE y se emiten a medida que llegan, así que la
+memoria no crece con el tamaño de la exportación.
+"""
+
+import csv
+import enum
+import io
+import json
+import tempfile
+import zlib
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Optional, Sequence
+from uuid import UUID
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+
+try:
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import NamedStyle, PatternFill, Font, Alignment, Border, Side
+    from openpyxl.utils import get_column_letter
+    EXCEL_AVAILABLE = True
+except ImportError:
+    EXCEL_AVAILABLE = False
+
+EXCEL_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Tamaño de bloque al enviar el xlsx, y tamaño a partir del cual pasa a disco
+EXCEL_CHUNK_SIZE = 64 * 1024
+EXCEL_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+
+async def stream_rows(statement, batch_size: Optional[int] = None) -> AsyncIterator[Sequence[Any]]:
+    """
+    Itera las filas de `statement` por lotes usando un cursor del servidor.
+
+    Abre su propia sesión: la sesión de la dependencia ya está cerrada
+    cuando se itera el cuerpo de un StreamingResponse.
+    """
+    batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(statement.execution_options(yield_per=batch_size))
+        async for partition in result.partitions():
+            yield partition
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Comprime un flujo de bytes en formato gzip"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def csv_chunks(
+    statement,
+    headers: Iterable[str],
+    format_row: Callable[[Any], Iterable[Any]],
+    **writer_options: Any
+) -> AsyncIterator[bytes]:
+    """Genera el CSV por partes: la cabecera y luego un bloque por lote"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, **writer_options)
+
+    def drain() -> bytes:
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    writer.writerow(headers)
+    yield drain()
+
+    async for partition in stream_rows(statement):
+        writer.writerows(format_row(row) for row in partition)
+        yield drain()
+
+
+async def json_chunks(statement, format_row: Callable[[Any], Any]) -> AsyncIterator[bytes]:
+    """Genera un array JSON por partes, un registro por línea"""
+    yield b"[\n"
+    first = True
+    async for partition in stream_rows(statement):
+        lines = []
+        for row in partition:
+            lines.append(("" if first else ",\n") + json.dumps(format_row(row), ensure_ascii=False, default=str))
+            first = False
+        yield "".join(lines).encode("utf-8")
+    yield b"\n]\n"
+
+
+def streaming_download(
+    chunks: AsyncIterator[bytes],
+    filename: str,
+    media_type: str,
+    gzip: bool = False
+) -> StreamingResponse:
+    """StreamingResponse de descarga, opcionalmente con Content-Encoding: gzip"""
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
+
+
+def excel_value(value: Any) -> Any:
+    """Convierte un valor de la base de datos a uno que openpyxl acepte"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        # Excel no admite zonas horarias
+        return value.replace(tzinfo=None)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    if hasattr(value, "isoformat"):
+        return value
+    return str(value)
+
+
+class ExcelSheet:
+    """
+    Hoja xlsx en modo write-only.
+
+    Los estilos se registran una sola vez como NamedStyle y las celdas solo
+    guardan su nombre, en lugar de crear Font/Fill/Border por celda.
+    """
+
+    def __init__(self, title: str, headers: Sequence[str], column_widths: Optional[Sequence[int]] = None):
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet(title=title)
+        self._styles: Dict[str, Optional[str]] = {}
+
+        border_side = Side(style="thin")
+        self.border = Border(left=border_side, right=border_side, top=border_side, bottom=border_side)
+        self.add_style(
+            "header",
+            font=Font(bold=True, color="FFFFFF", size=11),
+            fill=PatternFill(start_color="1F4E78", end_color="1F4E78", fill_type="solid"),
+            alignment=Alignment(horizontal="center", vertical="center", wrap_text=True),
+            border=None
+        )
+        self.add_style("cell")
+
+        for col, width in enumerate(column_widths or [], 1):
+            self.sheet.column_dimensions[get_column_letter(col)].width = width
+        self.sheet.freeze_panes = "A2"
+
+        self.append(headers, style="header")
+
+    def add_style(self, name: str, font=None, fill=None, alignment=None, border: Any = True) -> str:
+        """Registra un estilo con nombre (una vez) y devuelve su nombre"""
+        if name not in self._styles:
+            style = NamedStyle(name=f"shatak_{name}")
+            style.alignment = alignment or Alignment(horizontal="left", vertical="center", wrap_text=True)
+            if border is True:
+                style.border = self.border
+            if font is not None:
+                style.font = font
+            if fill is not None:
+                style.fill = fill
+            self.workbook.add_named_style(style)
+            self._styles[name] = style.name
+        return self._styles[name]
+
+    def fill_style(self, hex_color: str, font_color: Optional[str] = None) -> Optional[str]:
+        """Estilo con relleno de color (texto en negrita si se da font_color), o None si el color no es válido"""
+        name = f"fill_{hex_color.lstrip('#').upper()}"
+        if name not in self._styles:
+            try:
+                fill = PatternFill(start_color=hex_color.lstrip("#"), end_color=hex_color.lstrip("#"), fill_type="solid")
+            except ValueError:
+                self._styles[name] = None
+                return None
+            font = Font(color=font_color, bold=True) if font_color else None
+            self.add_style(name, font=font, fill=fill)
+        return self._styles[name]
+
+    def append(self, values: Iterable[Any], style: str = "cell", styles: Optional[Dict[int, Optional[str]]] = None) -> None:
+        """Añade una fila; `styles` sobrescribe el estilo de columnas concretas (base 0)"""
+        row = []
+        for idx, value in enumerate(values):
+            cell = WriteOnlyCell(self.sheet, value=excel_value(value))
+            cell.style = (styles.get(idx) if styles else None) or self._styles[style]
+            row.append(cell)
+        self.sheet.append(row)
+
+    def save(self):
+        """Guarda el libro en un fichero temporal (en memoria hasta cierto tamaño)"""
+        spool = tempfile.SpooledTemporaryFile(max_size=EXCEL_SPOOL_MAX_SIZE)
+        self.workbook.save(spool)
+        spool.seek(0)
+        return spool
+
+
+async def excel_chunks(
+    statement,
+    sheet: ExcelSheet,
+    write_row: Optional[Callable[[ExcelSheet, Any], None]] = None
+) -> AsyncIterator[bytes]:
+    """
+    Rellena `sheet` con las filas de `statement` y emite el xlsx por bloques.
+
+    El trabajo de openpyxl (CPU) se hace en el threadpool para no bloquear
+    el event loop.
+    """
+    write_row = write_row or (lambda target, row: target.append(row))
+
+    def write_partition(partition):
+        for row in partition:
+            write_row(sheet, row)
+
+    async for partition in stream_rows(statement):
+        await run_in_threadpool(write_partition, partition)
+
+    spool = await run_in_threadpool(sheet.save)
+    try:
+        while True:
+            chunk = await run_in_threadpool(spool.read, EXCEL_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        spool.close()
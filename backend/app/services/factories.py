@@ -0,0 +1,48 @@
+"""
+Factory Queries - Fábricas anotadas con su número de empleados
+UNS-Shatak (社宅管理システム)
+
+employee_count se calcula con una subconsulta agrupada unida a la tabla
+de fábricas, en lugar de un COUNT por fábrica (N+1).
+"""
+
+from typing import Any, Iterable, List
+from sqlalchemy import select, func
+from app.models.models import Factory, Employee
+from app.schemas.schemas import FactoryResponse
+
+
+def employee_counts():
+    """Subconsulta: empleados activos agrupados por fábrica"""
+    return select(
+        Employee.factory_id.label("factory_id"),
+        func.count(Employee.id).label("employee_count"),
+    ).where(
+        Employee.is_active == True,
+        Employee.factory_id.isnot(None)
+    ).group_by(Employee.factory_id).subquery("factory_employee_counts")
+
+
+def annotated_factories():
+    """
+    SELECT de (Factory, employee_count) listo para filtrar, ordenar y paginar.
+
+    Sirve tanto para Session como para AsyncSession.
+    """
+    counts = employee_counts()
+    return select(
+        Factory,
+        func.coalesce(counts.c.employee_count, 0).label("employee_count"),
+    ).outerjoin(counts, counts.c.factory_id == Factory.id)
+
+
+def to_response(factory: Factory, employee_count: int) -> FactoryResponse:
+    """Construye FactoryResponse con el contador ya calculado"""
+    result = FactoryResponse.model_validate(factory)
+    result.employee_count = employee_count
+    return result
+
+
+def to_responses(rows: Iterable[Any]) -> List[FactoryResponse]:
+    """Convierte filas (Factory, employee_count) en respuestas"""
+    return [to_response(factory, employee_count) for factory, employee_count in rows]
@@ -0,0 +1,217 @@
+"""
+Factory Catalog - Fichas de fábrica de BASEDATEJP en memoria
+UNS-Shatak (社宅管理システム)
+
+BASEDATEJP/config/factories/*.json guarda una ficha por planta (empresa
+cliente, dirección de la planta, contactos, líneas, horario, pago,
+contrato); factory_id_mapping.json traduce los ids antiguos
+("Factory-01") y factories_index.json resume todas las plantas.
+
+El catálogo lee el directorio una sola vez (al arrancar o en el primer
+acceso) y lo indexa por factory_id e id antiguo, así una consulta es un
+acceso a un dict. Como mucho cada settings.FACTORY_CATALOG_RECHECK
+segundos compara el mtime de cada fichero y solo vuelve a leer los que
+cambiaron (o desaparecieron).
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from loguru import logger
+from app.core.config import settings
+from app.models.models import Factory
+from app.utils.address import extract_prefecture_city
+
+INDEX_FILE = "factories_index.json"
+MAPPING_FILE = "factory_id_mapping.json"
+
+FACTORY_CODE_LENGTH = Factory.__table__.c.factory_code.type.length
+
+
+def basedatejp_path() -> str:
+    """Directorio de BASEDATEJP: settings.BASEDATEJP_PATH, /app/BASEDATEJP (Docker) o ./BASEDATEJP"""
+    if settings.BASEDATEJP_PATH:
+        return settings.BASEDATEJP_PATH
+    return "/app/BASEDATEJP" if os.path.exists("/app/BASEDATEJP") else "BASEDATEJP"
+
+
+def factory_code(factory_id: str) -> str:
+    """
+    factory_code de una planta de BASEDATEJP (sincronización y migrador).
+    Los factory_id que no caben en la columna se recortan y terminan en un
+    hash del id completo, así dos plantas con el mismo prefijo no comparten código.
+    """
+    code = factory_id.replace(' ', '_')
+    if len(code) <= FACTORY_CODE_LENGTH:
+        return code
+    digest = hashlib.sha1(factory_id.encode('utf-8')).hexdigest()[:8]
+    return f"{code[:FACTORY_CODE_LENGTH - len(digest) - 1]}_{digest}"
+
+
+def _text(value: Any) -> Optional[str]:
+    text = str(value).strip() if value is not None else ""
+    return text or None
+
+
+class CatalogEntry(NamedTuple):
+    factory_id: str
+    old_id: Optional[str]
+    company: Optional[str]
+    plant: Optional[str]
+    address: Optional[str]
+    prefecture: Optional[str]
+    city: Optional[str]
+    phone: Optional[str]
+    line_count: int
+    source: str
+    record: Dict[str, Any]
+
+
+def _from_config(record: dict, source: str, old_id: Optional[str]) -> CatalogEntry:
+    company = record.get("client_company") or {}
+    plant = record.get("plant") or {}
+    address = _text(plant.get("address")) or _text(company.get("address"))
+    prefecture, city = extract_prefecture_city(address)
+    return CatalogEntry(
+        factory_id=record["factory_id"],
+        old_id=old_id,
+        company=_text(company.get("name")),
+        plant=_text(plant.get("name")),
+        address=address,
+        prefecture=prefecture,
+        city=city,
+        phone=_text(plant.get("phone")) or _text(company.get("phone")),
+        line_count=len(record.get("lines") or []),
+        source=source,
+        record=record
+    )
+
+
+def _from_index(record: dict, old_id: Optional[str]) -> CatalogEntry:
+    address = _text(record.get("plant_address")) or _text(record.get("company_address"))
+    prefecture, city = extract_prefecture_city(address)
+    return CatalogEntry(
+        factory_id=record["factory_id"],
+        old_id=old_id,
+        company=_text(record.get("client_company")),
+        plant=_text(record.get("plant_name")),
+        address=address,
+        prefecture=prefecture,
+        city=city,
+        phone=_text(record.get("plant_phone")) or _text(record.get("company_phone")),
+        line_count=0,
+        source=INDEX_FILE,
+        record=record
+    )
+
+
+class FactoryCatalog:
+    """Fichas de fábrica indexadas por factory_id e id antiguo"""
+
+    def __init__(self, base_path, recheck: Optional[float] = None):
+        self.base_path = Path(base_path)
+        self.recheck = settings.FACTORY_CATALOG_RECHECK if recheck is None else recheck
+        self._lock = threading.Lock()
+        # Fichero -> (mtime_ns, JSON leído); None si no se pudo leer
+        self._files: Dict[Path, Tuple[int, Any]] = {}
+        self._by_id: Dict[str, CatalogEntry] = {}
+        self._by_old_id: Dict[str, str] = {}
+        self._checked: Optional[float] = None
+
+    def _tracked_files(self) -> Dict[Path, int]:
+        files: Dict[Path, int] = {}
+        index = self.base_path / INDEX_FILE
+        try:
+            files[index] = index.stat().st_mtime_ns
+        except OSError:
+            pass
+        try:
+            with os.scandir(self.base_path / "config" / "factories") as entries:
+                for entry in entries:
+                    if entry.name.endswith(".json") and entry.is_file():
+                        files[Path(entry.path)] = entry.stat().st_mtime_ns
+        except OSError:
+            pass
+        return files
+
+    def refresh(self) -> bool:
+        """Vuelve a leer los ficheros nuevos o modificados; True si algo cambió"""
+        with self._lock:
+            current = self._tracked_files()
+            changed = set(self._files) - set(current)
+            for path in changed:
+                del self._files[path]
+
+            for path, mtime in current.items():
+                if path in self._files and self._files[path][0] == mtime:
+                    continue
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Factory catalog: cannot read {path.name}: {e}")
+                    data = None
+                self._files[path] = (mtime, data)
+                changed.add(path)
+
+            if changed or self._checked is None:
+                self._rebuild()
+            self._checked = time.monotonic()
+            return bool(changed)
+
+    def _rebuild(self) -> None:
+        old_ids: Dict[str, str] = {}
+        index_records: List[dict] = []
+        config_records: List[Tuple[str, dict]] = []
+
+        for path in sorted(self._files):
+            data = self._files[path][1]
+            if path.name == MAPPING_FILE and isinstance(data, list):
+                for item in data:
+                    if isinstance(item, dict) and item.get("old_id") and item.get("new_id"):
+                        old_ids.setdefault(item["new_id"], item["old_id"])
+            elif path.name == INDEX_FILE and isinstance(data, dict):
+                index_records = [f for f in data.get("factories", []) if isinstance(f, dict) and f.get("factory_id")]
+            elif isinstance(data, dict) and data.get("factory_id"):
+                config_records.append((path.name, data))
+
+        # La ficha completa manda; el índice cubre las plantas sin ficha
+        by_id: Dict[str, CatalogEntry] = {}
+        for source, record in config_records:
+            by_id.setdefault(record["factory_id"], _from_config(record, source, old_ids.get(record["factory_id"])))
+        for record in index_records:
+            if record["factory_id"] not in by_id:
+                by_id[record["factory_id"]] = _from_index(record, old_ids.get(record["factory_id"]))
+
+        self._by_id = by_id
+        self._by_old_id = {entry.old_id: entry.factory_id for entry in by_id.values() if entry.old_id}
+
+    def _ensure_fresh(self) -> None:
+        if self._checked is None or time.monotonic() - self._checked >= self.recheck:
+            self.refresh()
+
+    def get(self, key: Optional[str]) -> Optional[CatalogEntry]:
+        """Ficha por factory_id o id antiguo ("Factory-01")"""
+        if not key:
+            return None
+        self._ensure_fresh()
+        entry = self._by_id.get(key)
+        if entry is None and key in self._by_old_id:
+            entry = self._by_id.get(self._by_old_id[key])
+        return entry
+
+    def entries(self) -> List[CatalogEntry]:
+        """Todas las fichas, ordenadas por factory_id"""
+        self._ensure_fresh()
+        return [self._by_id[k] for k in sorted(self._by_id)]
+
+    def __len__(self) -> int:
+        self._ensure_fresh()
+        return len(self._by_id)
+
+
+FACTORY_CATALOG = FactoryCatalog(basedatejp_path())
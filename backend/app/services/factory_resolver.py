@@ -0,0 +1,157 @@
+"""
+Factory Resolver - Fábrica de un empleado a partir de su factory_name
+UNS-Shatak (社宅管理システム)
+
+Los Excel de empleados nombran la fábrica de forma abreviada y sin forma
+jurídica ("高雄工業 岡山", "ﾃｨｰｹｰｴﾝｼﾞﾆｱﾘﾝｸﾞ", "PATEC"); las fichas de
+BASEDATEJP la nombran completa ("高雄工業株式会社" / "岡山工場").
+
+El índice se construye una vez por importación:
+
+- Empresa y planta se normalizan con core.text.normalize_text, sin forma
+  jurídica (株式会社, (株), 有限会社...) ni el sufijo 工場.
+- Búsqueda exacta por (empresa, planta) en un dict.
+- Si el nombre no trae separador, un autómata Aho–Corasick sobre los
+  nombres de empresa encuentra la empresa contenida más larga en una sola
+  pasada; el resto del nombre es la planta.
+- Empresa sin planta (o planta desconocida): la planta 本社 o, si no hay,
+  la primera por factory_id.
+
+Así cada nombre se resuelve en O(longitud del nombre) y siempre a la misma
+fábrica.
+"""
+
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.core.text import normalize_text
+from app.services.factory_catalog import FactoryCatalog
+
+# Formas jurídicas, ya normalizadas (NFKC convierte ㈱ en (株))
+LEGAL_FORMS = ("株式会社", "有限会社", "合同会社", "合資会社", "合名会社", "(株)", "(有)", "(合)")
+PLANT_SUFFIX = "工場"
+HEADQUARTERS = "本社"
+
+_SEPARATOR = re.compile(r"[\s　_/・]+")
+
+
+def company_key(name: Optional[str]) -> str:
+    key = normalize_text(name)
+    for form in LEGAL_FORMS:
+        key = key.replace(form, "")
+    return key
+
+
+def plant_key(name: Optional[str]) -> str:
+    key = normalize_text(name)
+    return key[:-len(PLANT_SUFFIX)] if key.endswith(PLANT_SUFFIX) else key
+
+
+class _Automaton:
+    """Aho–Corasick sobre un conjunto fijo de claves"""
+
+    def __init__(self, keys: Iterable[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[str]] = [[]]
+        for key in keys:
+            self._add(key)
+        self._link()
+
+    def _add(self, key: str) -> None:
+        node = 0
+        for char in key:
+            if char not in self.goto[node]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[node][char] = len(self.goto) - 1
+            node = self.goto[node][char]
+        self.output[node].append(key)
+
+    def _link(self) -> None:
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def longest_match(self, text: str) -> Optional[Tuple[int, str]]:
+        """(inicio, clave) de la clave más larga contenida en `text`; a igual longitud, la primera"""
+        best: Optional[Tuple[int, str]] = None
+        node = 0
+        for end, char in enumerate(text, start=1):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            for key in self.output[node]:
+                start = end - len(key)
+                if best is None or len(key) > len(best[1]) or (len(key) == len(best[1]) and start < best[0]):
+                    best = (start, key)
+        return best
+
+
+class FactoryResolver:
+    """Índice empresa/planta -> factory_id (el id de las fichas de BASEDATEJP)"""
+
+    def __init__(self):
+        self._plants: Dict[str, Dict[str, str]] = {}
+        self._automaton: Optional[_Automaton] = None
+
+    @classmethod
+    def from_catalog(cls, catalog: FactoryCatalog) -> "FactoryResolver":
+        """Índice de las fichas de un FactoryCatalog"""
+        resolver = cls()
+        for entry in catalog.entries():
+            resolver.add(entry.factory_id, entry.company, entry.plant)
+        return resolver
+
+    @classmethod
+    def from_basedatejp(cls, base_path) -> "FactoryResolver":
+        """Índice de factories_index.json y de las fichas config/factories/*.json"""
+        return cls.from_catalog(FactoryCatalog(base_path))
+
+    def add(self, factory_id: Optional[str], company: Optional[str], plant: Optional[str]) -> None:
+        company = company_key(company)
+        if not factory_id or not company:
+            return
+        plants = self._plants.setdefault(company, {})
+        # Las fichas repetidas (índice y config) no cambian el primer id registrado
+        plants.setdefault(plant_key(plant), factory_id)
+        self._automaton = None
+
+    def _default_plant(self, company: str) -> str:
+        plants = self._plants[company]
+        if HEADQUARTERS in plants:
+            return plants[HEADQUARTERS]
+        return min(plants.values())
+
+    def resolve(self, factory_name: Optional[str]) -> Optional[str]:
+        """factory_id de un factory_name de empleado, o None si no corresponde a ninguna empresa"""
+        if not factory_name or not self._plants:
+            return None
+
+        parts = [p for p in _SEPARATOR.split(str(factory_name).strip()) if p]
+        if not parts:
+            return None
+        company, plant = company_key(parts[0]), plant_key("".join(parts[1:]))
+
+        if company not in self._plants:
+            if self._automaton is None:
+                self._automaton = _Automaton(self._plants)
+            match = self._automaton.longest_match(company_key("".join(parts)))
+            if match is None:
+                return None
+            start, company = match
+            full = company_key("".join(parts))
+            plant = plant_key(full[:start] + full[start + len(company):])
+
+        plants = self._plants[company]
+        if plant in plants:
+            return plants[plant]
+        return self._default_plant(company)
@@ -0,0 +1,235 @@
+"""
+Occupancy - Contador de ocupantes de los apartamentos sin condiciones de carrera
+UNS-Shatak (社宅管理システム)
+
+Cada alta o baja es un único UPDATE condicional con RETURNING:
+
+    UPDATE apartments
+       SET current_occupants = current_occupants + 1, status = ...
+     WHERE id = :id AND current_occupants < capacity
+    RETURNING current_occupants, capacity
+
+Postgres bloquea solo esa fila y reevalúa el WHERE tras esperar a otra
+transacción, así que dos entradas simultáneas nunca superan `capacity` y
+las entradas en apartamentos distintos no se esperan entre sí.
+
+Las transacciones que tocan varias filas (traslados) bloquean primero al
+empleado y después los apartamentos ordenados por id; si aun así Postgres
+aborta por interbloqueo o serialización, commit_with_retry repite el trabajo.
+
+Las escrituras que no pasan por aquí (tablas de /data, BASEDATEJP) se
+corrigen con reconcile(): recalcula los contadores a partir de
+Employee.apartment_id y ApartmentAssignment.is_current en un solo UPDATE,
+solo para los apartamentos que los triggers de la migración 005 han
+marcado en occupancy_dirty (o para todos con full=True).
+"""
+
+import random
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+from uuid import UUID
+from sqlalchemy import case, delete, func, literal, select, tuple_, union, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from app.models.models import Apartment, ApartmentAssignment, ApartmentStatus, Employee, OccupancyDirty
+
+T = TypeVar("T")
+
+# deadlock_detected, serialization_failure, lock_not_available
+RETRYABLE_SQLSTATES = {"40P01", "40001", "55P03"}
+MAX_ATTEMPTS = 4
+
+
+class ApartmentFull(Exception):
+    """El apartamento no tiene plazas libres (o no existe)"""
+
+    def __init__(self, apartment_id: UUID, occupants: Optional[int] = None, capacity: Optional[int] = None):
+        self.apartment_id = apartment_id
+        self.occupants = occupants
+        self.capacity = capacity
+        super().__init__(f"Apartment {apartment_id} is full ({occupants}/{capacity})")
+
+
+def _status(value: ApartmentStatus):
+    return literal(value, Apartment.status.type)
+
+
+def claim(db: Session, apartment_id: UUID) -> Tuple[int, int]:
+    """
+    Ocupa una plaza. Devuelve (ocupantes, capacidad) tras la entrada o lanza
+    ApartmentFull si no quedaba sitio.
+    """
+    row = db.execute(
+        update(Apartment)
+        .where(Apartment.id == apartment_id, Apartment.current_occupants < Apartment.capacity)
+        .values(
+            current_occupants=Apartment.current_occupants + 1,
+            status=case(
+                (Apartment.current_occupants + 1 >= Apartment.capacity, _status(ApartmentStatus.OCCUPIED)),
+                else_=Apartment.status
+            )
+        )
+        .returning(Apartment.current_occupants, Apartment.capacity)
+    ).first()
+    if row is None:
+        current = db.query(Apartment.current_occupants, Apartment.capacity).filter(Apartment.id == apartment_id).first()
+        raise ApartmentFull(apartment_id, *(current or (None, None)))
+    return row.current_occupants, row.capacity
+
+
+def release(db: Session, apartment_id: Optional[UUID]) -> Optional[Tuple[int, int]]:
+    """Libera una plaza (nunca baja de 0); un apartamento lleno vuelve a estar disponible"""
+    if apartment_id is None:
+        return None
+    row = db.execute(
+        update(Apartment)
+        .where(Apartment.id == apartment_id)
+        .values(
+            current_occupants=func.greatest(Apartment.current_occupants - 1, 0),
+            status=case(
+                (
+                    (Apartment.status == _status(ApartmentStatus.OCCUPIED))
+                    & (Apartment.current_occupants - 1 < Apartment.capacity),
+                    _status(ApartmentStatus.AVAILABLE)
+                ),
+                else_=Apartment.status
+            )
+        )
+        .returning(Apartment.current_occupants, Apartment.capacity)
+    ).first()
+    return (row.current_occupants, row.capacity) if row else None
+
+
+def move(db: Session, from_id: Optional[UUID], to_id: UUID) -> Tuple[int, int]:
+    """
+    Traslada un ocupante de `from_id` a `to_id`. Las dos filas se actualizan
+    en orden de id para que dos traslados cruzados no se interbloqueen.
+    Devuelve (ocupantes, capacidad) del destino.
+    """
+    if from_id == to_id:
+        current = db.query(Apartment.current_occupants, Apartment.capacity).filter(Apartment.id == to_id).one()
+        return tuple(current)
+    if from_id is not None and str(from_id) < str(to_id):
+        release(db, from_id)
+        return claim(db, to_id)
+    result = claim(db, to_id)
+    release(db, from_id)
+    return result
+
+
+def lock_employee(db: Session, employee_id: UUID) -> Optional[Employee]:
+    """Carga el empleado con FOR UPDATE: sus cambios de apartamento quedan serializados"""
+    return db.query(Employee).filter(Employee.id == employee_id).with_for_update().first()
+
+
+def commit_with_retry(db: Session, work: Callable[[], T], attempts: int = MAX_ATTEMPTS) -> T:
+    """
+    Ejecuta `work()` y hace commit. Si Postgres aborta la transacción por
+    interbloqueo, serialización o lock ocupado, hace rollback y repite con
+    una espera exponencial; `work` debe volver a leer todo lo que usa.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            result = work()
+            db.commit()
+            return result
+        except OperationalError as e:
+            db.rollback()
+            if getattr(e.orig, "pgcode", None) not in RETRYABLE_SQLSTATES or attempt == attempts:
+                raise
+            time.sleep(0.05 * 2 ** (attempt - 1) * (1 + random.random()))
+        except Exception:
+            db.rollback()
+            raise
+
+
+# ===========================================
+# Reconciliación
+# ===========================================
+
+def occupant_counts():
+    """
+    Ocupantes reales por apartamento: empleados activos con apartment_id, más
+    los que solo tienen una asignación actual (sin apartment_id). Cada
+    empleado cuenta una sola vez.
+    """
+    living = select(
+        Employee.apartment_id.label("apartment_id"),
+        Employee.id.label("employee_id")
+    ).where(Employee.apartment_id.isnot(None), Employee.is_active == True)
+
+    assigned = select(
+        ApartmentAssignment.apartment_id,
+        ApartmentAssignment.employee_id
+    ).join(Employee, Employee.id == ApartmentAssignment.employee_id).where(
+        ApartmentAssignment.is_current == True,
+        Employee.apartment_id.is_(None),
+        Employee.is_active == True
+    )
+
+    occupants = union(living, assigned).subquery()
+    return select(
+        occupants.c.apartment_id,
+        func.count().label("occupants")
+    ).group_by(occupants.c.apartment_id).subquery()
+
+
+def reconcile(db: Session, full: bool = False) -> Dict[str, Any]:
+    """
+    Corrige current_occupants y status (sin commit).
+
+    Incremental: solo los apartamentos pendientes en occupancy_dirty; al final
+    se borran las marcas con la versión leída, así que un cambio que llegue
+    durante la pasada queda marcado para la siguiente.
+    """
+    pending = db.execute(select(OccupancyDirty.apartment_id, OccupancyDirty.version)).all()
+    if not full and not pending:
+        return {"mode": "incremental", "checked": 0, "corrected": 0, "apartments": []}
+
+    counts = occupant_counts()
+    source = Apartment.__table__.alias("source")
+    actual = func.coalesce(counts.c.occupants, 0)
+    expected = select(source.c.id, actual.label("occupants")).outerjoin(
+        counts, counts.c.apartment_id == source.c.id
+    )
+    if not full:
+        expected = expected.where(source.c.id.in_([row.apartment_id for row in pending]))
+    expected = expected.subquery()
+
+    # Mantenimiento y reservado son estados manuales: no se tocan
+    new_status = case(
+        (Apartment.status.in_([_status(ApartmentStatus.MAINTENANCE), _status(ApartmentStatus.RESERVED)]), Apartment.status),
+        (expected.c.occupants >= Apartment.capacity, _status(ApartmentStatus.OCCUPIED)),
+        else_=_status(ApartmentStatus.AVAILABLE)
+    )
+    corrected = db.execute(
+        update(Apartment)
+        .where(
+            Apartment.id == expected.c.id,
+            (Apartment.current_occupants.is_distinct_from(expected.c.occupants))
+            | (Apartment.status.is_distinct_from(new_status))
+        )
+        .values(current_occupants=expected.c.occupants, status=new_status)
+        .returning(Apartment.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+
+    if pending:
+        db.execute(delete(OccupancyDirty).where(
+            tuple_(OccupancyDirty.apartment_id, OccupancyDirty.version).in_([tuple(row) for row in pending])
+        ))
+    checked = db.execute(select(func.count()).select_from(Apartment)).scalar() if full else len(pending)
+
+    return {
+        "mode": "full" if full else "incremental",
+        "checked": checked,
+        "corrected": len(corrected),
+        "apartments": corrected[:100],
+    }
+
+
+def run_reconcile(db: Session, job, full: bool = False) -> Dict[str, Any]:
+    """Reconciliación como background job (core.jobs)"""
+    result = reconcile(db, full)
+    result.update(total_rows=result["checked"], successful_rows=result["checked"], failed_rows=0)
+    return result
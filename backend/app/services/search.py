@@ -0,0 +1,116 @@
+"""
+Search - Búsqueda por subcadena con índices trigram (pg_trgm)
+UNS-Shatak (社宅管理システム)
+
+Empleados, apartamentos y fábricas se buscan en su columna search_key:
+una copia normalizada (app.core.text) de sus campos de búsqueda con un
+único índice GIN gin_trgm_ops (migrations/004_add_search_keys.sql). El
+término se normaliza igual, así que ｶﾀｶﾅ, カタカナ y かたかな coinciden.
+
+Las demás tablas filtran con `ilike('%término%')` por columna; visitors
+tiene un índice trigram por columna (migrations/004_add_search_keys.sql).
+El ranking usa word_similarity() sobre las mismas columnas.
+"""
+
+from typing import Any, List, Optional, Tuple
+from sqlalchemy import bindparam, func, or_, select, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.text import normalize_text, search_key
+from app.models.models import Apartment, Employee, Factory, Visitor
+
+
+def like_pattern(term: str) -> str:
+    """Patrón '%término%' con los comodines del usuario escapados"""
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+class SearchFields:
+    """Columnas de búsqueda de un modelo (cada una con su índice trigram)"""
+
+    def __init__(self, *columns):
+        self.columns = columns
+
+    def prepare(self, term: str) -> str:
+        return term.strip()
+
+    def filter(self, term: str):
+        pattern = like_pattern(term)
+        return or_(*[c.ilike(pattern, escape="\\") for c in self.columns])
+
+    def rank(self, term: str):
+        """Relevancia 0..1: la mejor coincidencia entre las columnas"""
+        scores = [func.word_similarity(term, func.coalesce(c, "")) for c in self.columns]
+        return func.greatest(*scores) if len(scores) > 1 else scores[0]
+
+    def apply(self, query, term: Optional[str]) -> Tuple[Any, Optional[Any]]:
+        """Filtra `query` por `term`; devuelve (query, rank) o (query, None) sin término"""
+        term = self.prepare(term or "")
+        if not term:
+            return query, None
+        return query.filter(self.filter(term)), self.rank(term)
+
+
+class SearchKey(SearchFields):
+    """Búsqueda sobre la columna search_key ya normalizada"""
+
+    def prepare(self, term: str) -> str:
+        return normalize_text(term)
+
+    def filter(self, term: str):
+        # La clave ya está en minúsculas: LIKE basta y usa el índice trigram
+        return self.columns[0].like(like_pattern(term), escape="\\")
+
+
+APARTMENT_SEARCH = SearchKey(Apartment.search_key)
+
+EMPLOYEE_SEARCH = SearchKey(Employee.search_key)
+
+FACTORY_SEARCH = SearchKey(Factory.search_key)
+
+VISITOR_SEARCH = SearchFields(
+    Visitor.visitor_name,
+    Visitor.phone,
+    Visitor.email,
+)
+
+# Búsqueda de /data/tables/{table}/records por nombre de tabla
+TABLE_SEARCH = {
+    "apartments": APARTMENT_SEARCH,
+    "employees": EMPLOYEE_SEARCH,
+    "factories": FACTORY_SEARCH,
+    "visitors": VISITOR_SEARCH,
+}
+
+
+def refresh_search_keys(db: Session, model, ids: Optional[List[Any]] = None) -> int:
+    """
+    Recalcula search_key de las filas `ids` (o de todas las que no la tienen).
+
+    Para escrituras que no pasan por el ORM, como el upsert masivo de
+    bulk_import: ahí no se disparan los eventos de models.py.
+    """
+    table = model.__table__
+    fields = [table.c[name] for name in model.SEARCH_KEY_FIELDS]
+    stmt = update(table).where(table.c.id == bindparam("_id")).values(search_key=bindparam("_key"))
+    query = select(table.c.id, *fields)
+    size = settings.IMPORT_BATCH_SIZE
+
+    def write(rows) -> int:
+        if rows:
+            db.execute(stmt, [{"_id": row[0], "_key": search_key(*row[1:])} for row in rows])
+        return len(rows)
+
+    updated = 0
+    if ids is not None:
+        for start in range(0, len(ids), size):
+            updated += write(db.execute(query.where(table.c.id.in_(ids[start:start + size]))).all())
+        return updated
+
+    # Cada lote deja de ser NULL al escribirse (search_key() devuelve '' si no hay datos)
+    while True:
+        count = write(db.execute(query.where(table.c.search_key.is_(None)).limit(size)).all())
+        if not count:
+            return updated
+        updated += count
@@ -0,0 +1,135 @@
+"""
+Statistics Engine - Estadísticas agregadas del dashboard
+UNS-Shatak (社宅管理システム)
+
+Cada tabla se agrega en una sola pasada usando agregación condicional
+(COUNT(...) FILTER (WHERE ...)), en lugar de una consulta por cifra.
+"""
+
+from typing import Dict, Any
+from sqlalchemy import select, func, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import (
+    Apartment, Employee, Factory, ApartmentStatus, EmployeeStatus
+)
+
+
+def _rate(occupants: int, capacity: int) -> float:
+    return round((occupants / capacity * 100) if capacity > 0 else 0, 2)
+
+
+def apartment_aggregates():
+    """Subconsulta con todos los contadores de apartamentos activos (una fila)"""
+    return select(
+        func.count(Apartment.id).label("apt_total"),
+        func.count(Apartment.id).filter(Apartment.status == ApartmentStatus.AVAILABLE).label("apt_available"),
+        func.count(Apartment.id).filter(Apartment.status == ApartmentStatus.OCCUPIED).label("apt_occupied"),
+        func.count(Apartment.id).filter(Apartment.status == ApartmentStatus.MAINTENANCE).label("apt_maintenance"),
+        func.count(Apartment.id).filter(Apartment.status == ApartmentStatus.RESERVED).label("apt_reserved"),
+        func.coalesce(func.sum(Apartment.capacity), 0).label("apt_capacity"),
+        func.coalesce(func.sum(Apartment.current_occupants), 0).label("apt_occupants"),
+    ).where(Apartment.is_active == True).subquery("apartment_stats")
+
+
+def employee_aggregates():
+    """Subconsulta con todos los contadores de empleados activos (una fila)"""
+    return select(
+        func.count(Employee.id).label("emp_total"),
+        func.count(Employee.id).filter(Employee.status == EmployeeStatus.ACTIVE).label("emp_active"),
+        func.count(Employee.id).filter(Employee.apartment_id.isnot(None)).label("emp_with_apartment"),
+        func.count(Employee.id).filter(Employee.apartment_id.is_(None)).label("emp_without_apartment"),
+    ).where(Employee.is_active == True).subquery("employee_stats")
+
+
+def factory_aggregates():
+    """Subconsulta con los contadores de fábricas activas (una fila)"""
+    return select(
+        func.count(Factory.id).label("fac_total"),
+    ).where(Factory.is_active == True).subquery("factory_stats")
+
+
+async def get_apartment_stats(db: AsyncSession) -> Dict[str, Any]:
+    """Estadísticas de apartamentos (/apartments/stats)"""
+    agg = apartment_aggregates()
+    row = (await db.execute(select(agg))).one()
+
+    return {
+        "total": row.apt_total,
+        "available": row.apt_available,
+        "occupied": row.apt_occupied,
+        "maintenance": row.apt_maintenance,
+        "reserved": row.apt_reserved,
+        "total_capacity": row.apt_capacity,
+        "total_occupants": row.apt_occupants,
+        "occupancy_rate": _rate(row.apt_occupants, row.apt_capacity)
+    }
+
+
+async def get_employee_stats(db: AsyncSession) -> Dict[str, Any]:
+    """Estadísticas de empleados (/employees/stats)"""
+    agg = employee_aggregates()
+    row = (await db.execute(select(agg))).one()
+
+    by_nationality = (await db.execute(
+        select(Employee.nationality, func.count(Employee.id))
+        .where(Employee.is_active == True)
+        .group_by(Employee.nationality)
+    )).all()
+
+    by_factory = (await db.execute(
+        select(Factory.name, func.count(Employee.id))
+        .join(Factory, Employee.factory_id == Factory.id)
+        .where(Employee.is_active == True)
+        .group_by(Factory.name)
+    )).all()
+
+    return {
+        "total": row.emp_total,
+        "active": row.emp_active,
+        "with_apartment": row.emp_with_apartment,
+        "without_apartment": row.emp_without_apartment,
+        "by_nationality": dict(by_nationality),
+        "by_factory": dict(by_factory)
+    }
+
+
+async def get_factory_stats(db: AsyncSession) -> Dict[str, Any]:
+    """Estadísticas de fábricas (/factories/stats)"""
+    agg = factory_aggregates()
+    row = (await db.execute(select(agg))).one()
+
+    by_prefecture = (await db.execute(
+        select(Factory.prefecture, func.count(Factory.id))
+        .where(Factory.is_active == True, Factory.prefecture.isnot(None))
+        .group_by(Factory.prefecture)
+    )).all()
+
+    return {"total": row.fac_total, "by_prefecture": dict(by_prefecture)}
+
+
+async def get_dashboard_stats(db: AsyncSession) -> Dict[str, Any]:
+    """
+    Estadísticas del dashboard (/dashboard/stats).
+
+    Las tres subconsultas devuelven exactamente una fila cada una, así que
+    el producto cruzado produce una sola fila en un único round trip.
+    """
+    apt = apartment_aggregates()
+    emp = employee_aggregates()
+    fac = factory_aggregates()
+
+    row = (await db.execute(
+        select(apt, emp, fac).select_from(apt.join(emp, true()).join(fac, true()))
+    )).one()
+
+    return {
+        "total_apartments": row.apt_total,
+        "available_apartments": row.apt_available,
+        "occupied_apartments": row.apt_occupied,
+        "total_employees": row.emp_total,
+        "active_employees": row.emp_active,
+        "employees_with_housing": row.emp_with_apartment,
+        "employees_without_housing": row.emp_active - row.emp_with_apartment,
+        "total_factories": row.fac_total,
+        "occupancy_rate": _rate(row.apt_occupants, row.apt_capacity)
+    }
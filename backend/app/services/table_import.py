@@ -0,0 +1,234 @@
+"""
+Table Import - Importación genérica a cualquier tabla de /data
+UNS-Shatak (社宅管理システム)
+
+Pipeline (todo en memoria, sin ficheros temporales):
+1. Leer JSON, CSV o Excel desde el buffer subido, una sola vez.
+2. Resolver una vez por fichero qué cabecera corresponde a qué columna.
+3. Convertir cada columna entera al tipo de la tabla (fechas, números,
+   enums, booleanos, UUID...). Las filas con valores no convertibles se
+   reportan y no se escriben.
+4. Insertar por lotes de settings.IMPORT_BATCH_SIZE con executemany
+   (bulk_import.write_batches: si un lote falla, fila a fila).
+5. Recalcular search_key de las filas insertadas (el INSERT no pasa por
+   los eventos del ORM).
+"""
+
+import io
+import json
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+import pandas as pd
+from sqlalchemy import Boolean, Date, DateTime, Enum as SQLEnum, Integer, JSON, Numeric, String
+from sqlalchemy.dialects.postgresql import insert, UUID as PG_UUID
+from sqlalchemy.orm import Session
+from app.services.bulk_import import progress_counter, write_batches
+from app.services.search import refresh_search_keys
+
+# Campos auto-generados que nunca se importan
+EXCLUDED_COLUMNS = {'id', 'created_at', 'updated_at', 'search_key'}
+
+# Claves de un JSON con forma {"records": [...]}
+RECORD_KEYS = ['records', 'data', 'employees', 'apartments', 'factories', 'assignments']
+
+NULL_STRINGS = {'', 'null', 'None'}
+TRUE_STRINGS = {'true', '1', '1.0', 'yes', 'y', 'si', 'sí', 't', 'はい'}
+FALSE_STRINGS = {'false', '0', '0.0', 'no', 'n', 'f', 'いいえ'}
+
+# Marca de valor no convertible
+_INVALID = object()
+
+
+def read_records(content: bytes, filename: str, sheet_name: Optional[str] = None) -> pd.DataFrame:
+    """Leer registros desde JSON, CSV o Excel (una sola lectura, en memoria)"""
+    filename = filename.lower()
+
+    if filename.endswith('.json'):
+        try:
+            data = json.loads(content.decode('utf-8'))
+        except json.JSONDecodeError:
+            raise ValueError("Error al parsear JSON")
+        # Si es un objeto con key 'records' o similar, extraer la lista
+        if isinstance(data, dict):
+            for key in RECORD_KEYS:
+                if key in data:
+                    data = data[key]
+                    break
+        if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+            raise ValueError("Los datos deben ser una lista de registros")
+        return pd.DataFrame.from_records(data)
+
+    if filename.endswith('.csv'):
+        return pd.read_csv(io.BytesIO(content), dtype=str, keep_default_na=False, encoding='utf-8')
+
+    if filename.endswith(('.xlsx', '.xls', '.xlsm')):
+        # Si no se especifica hoja, usar la primera
+        return pd.read_excel(io.BytesIO(content), sheet_name=sheet_name or 0, dtype=object)
+
+    raise ValueError("Formato no soportado. Usa JSON, CSV o Excel (.xlsx, .xls, .xlsm)")
+
+
+def normalize_header(header: Any) -> str:
+    """Nombre de cabecera comparable con los nombres de columna"""
+    return str(header).strip().lower().replace(' ', '_').replace('-', '_')
+
+
+def resolve_columns(headers, table) -> Tuple[Dict[Any, str], List[str]]:
+    """
+    Cabecera -> columna de la tabla, resuelto una vez por fichero.
+    Devuelve (mapeo, cabeceras ignoradas); si dos cabeceras dan la misma
+    columna, gana la primera.
+    """
+    columns = {c.name.lower(): c.name for c in table.columns if c.name not in EXCLUDED_COLUMNS}
+    mapping: Dict[Any, str] = {}
+    skipped: List[str] = []
+    for header in headers:
+        column = columns.get(normalize_header(header))
+        if column and column not in mapping.values():
+            mapping[header] = column
+        else:
+            skipped.append(str(header))
+    return mapping, skipped
+
+
+def _is_blank(value: Any) -> bool:
+    if value is None or value is pd.NaT:
+        return True
+    if isinstance(value, float) and value != value:
+        return True
+    return isinstance(value, str) and value.strip() in NULL_STRINGS
+
+
+def _converter(column) -> Callable[[Any], Any]:
+    """Conversión de un valor no vacío al tipo de `column`; lanza ValueError si no es posible"""
+    column_type = column.type
+
+    if isinstance(column_type, SQLEnum) and column_type.enum_class is not None:
+        members = {}
+        for member in column_type.enum_class:
+            members[str(member.value).lower()] = member
+            members[member.name.lower()] = member
+
+        def to_enum(value):
+            return members[str(value).strip().lower()]
+        return to_enum
+
+    if isinstance(column_type, Boolean):
+        def to_bool(value):
+            text = str(value).strip().lower()
+            if text in TRUE_STRINGS:
+                return True
+            if text in FALSE_STRINGS:
+                return False
+            raise ValueError(value)
+        return to_bool
+
+    if isinstance(column_type, Integer):
+        def to_int(value):
+            number = Decimal(str(value).strip())
+            if number != number.to_integral_value():
+                raise ValueError(value)
+            return int(number)
+        return to_int
+
+    if isinstance(column_type, Numeric):
+        def to_decimal(value):
+            return Decimal(str(value).strip().replace(',', ''))
+        return to_decimal
+
+    if isinstance(column_type, DateTime):
+        def to_datetime(value):
+            return pd.Timestamp(value).to_pydatetime()
+        return to_datetime
+
+    if isinstance(column_type, Date):
+        def to_date(value):
+            return pd.Timestamp(value).date()
+        return to_date
+
+    if isinstance(column_type, PG_UUID):
+        def to_uuid(value):
+            return value if isinstance(value, UUID) else UUID(str(value).strip())
+        return to_uuid
+
+    if isinstance(column_type, JSON):
+        def to_json(value):
+            return json.loads(value) if isinstance(value, str) else value
+        return to_json
+
+    length = getattr(column_type, 'length', None) if isinstance(column_type, String) else None
+
+    def to_text(value):
+        text = str(value).strip()
+        if length and len(text) > length:
+            raise ValueError(value)
+        return text
+    return to_text
+
+
+def coerce_column(values: pd.Series, column) -> Tuple[pd.Series, pd.Series]:
+    """Convierte una columna entera; devuelve (valores, máscara de valores no válidos)"""
+    convert = _converter(column)
+
+    def coerce(value):
+        if _is_blank(value):
+            return None
+        try:
+            return convert(value)
+        except (ValueError, TypeError, KeyError, InvalidOperation, OverflowError):
+            return _INVALID
+
+    coerced = values.map(coerce).astype(object)
+    invalid = coerced.map(lambda v: v is _INVALID).astype(bool)
+    return coerced.where(~invalid, None), invalid
+
+
+def import_table_frame(
+    db: Session,
+    model,
+    df: pd.DataFrame,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> Dict[str, Any]:
+    """
+    Importa un DataFrame leído con read_records a la tabla de `model` (sin
+    commit). Las filas se numeran desde 1, en el orden del fichero.
+    """
+    table = model.__table__
+    advance = progress_counter(len(df), progress)
+    mapping, skipped = resolve_columns(df.columns, table)
+
+    frame = pd.DataFrame(index=df.index)
+    errors: List[dict] = []
+    rejected = pd.Series(False, index=df.index)
+    for header, name in mapping.items():
+        values, invalid = coerce_column(df[header], table.c[name])
+        frame[name] = values
+        for idx in df.index[invalid & ~rejected]:
+            errors.append({"row": int(idx) + 1, "error": f"Valor no válido en '{name}': {str(df.at[idx, header])[:100]}"})
+        rejected |= invalid
+
+    # Filas sin ningún valor (líneas en blanco del Excel) no cuentan
+    empty = frame.isna().all(axis=1) if mapping else pd.Series(True, index=df.index)
+    frame = frame[~rejected & ~empty]
+    if advance and (rejected | empty).any():
+        advance(int((rejected | empty).sum()))
+
+    ids: List[Any] = []
+    if not frame.empty:
+        records = frame.astype(object).where(frame.notna(), None).to_dict(orient="records")
+        rows = [int(idx) + 1 for idx in frame.index]
+        ids = write_batches(db, insert(table).returning(table.c.id), records, rows, errors, advance)
+        if hasattr(model, "SEARCH_KEY_FIELDS"):
+            refresh_search_keys(db, model, ids)
+
+    errors.sort(key=lambda e: e["row"])
+    return {
+        "total": int((~empty).sum()),
+        "success": len(ids),
+        "failed": len(errors),
+        "columns_used": sorted(mapping.values()),
+        "columns_skipped": skipped,
+        "errors": errors,
+        "imported_ids": ids,
+    }
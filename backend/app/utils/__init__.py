@@ -6,11 +6,19 @@ from app.utils.rent_calculator import (
     calculate_initial_costs,
     calculate_assignment_costs
 )
+from app.utils.address import (
+    ParsedAddress,
+    parse_address,
+    extract_prefecture_city
+)
 
 __all__ = [
     "calculate_prorated_rent",
     "calculate_shared_rent",
     "calculate_total_monthly_cost",
     "calculate_initial_costs",
-    "calculate_assignment_costs"
+    "calculate_assignment_costs",
+    "ParsedAddress",
+    "parse_address",
+    "extract_prefecture_city"
 ]
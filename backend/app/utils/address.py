@@ -0,0 +1,134 @@
+"""
+Utilidades para direcciones japonesas
+UNS-Shatak (社宅管理システム)
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+
+PREFECTURES = (
+    "北海道", "青森県", "岩手県", "宮城県", "秋田県", "山形県", "福島県",
+    "茨城県", "栃木県", "群馬県", "埼玉県", "千葉県", "東京都", "神奈川県",
+    "新潟県", "富山県", "石川県", "福井県", "山梨県", "長野県", "岐阜県",
+    "静岡県", "愛知県", "三重県", "滋賀県", "京都府", "大阪府", "兵庫県",
+    "奈良県", "和歌山県", "鳥取県", "島根県", "岡山県", "広島県", "山口県",
+    "徳島県", "香川県", "愛媛県", "高知県", "福岡県", "佐賀県", "長崎県",
+    "熊本県", "大分県", "宮崎県", "鹿児島県", "沖縄県"
+)
+
+# Una sola alternancia compilada (las más largas primero) en lugar de 47 búsquedas
+_PREFECTURE = re.compile("|".join(sorted(PREFECTURES, key=len, reverse=True)))
+
+# Ciudades cuyo nombre termina en 市市; en el resto el primer 市 cierra la ciudad (倉敷市市場)
+DOUBLE_CITY_NAMES = ("四日市市", "廿日市市")
+
+# Municipio: 郡+町村, ciudad, 区 o 町村
+_MUNICIPALITY = re.compile(
+    r"[^\d市]+?郡[^\d市]+?[町村]|" + "|".join(DOUBLE_CITY_NAMES) + r"|[^\d]+?市|[^\d]+?区|[^\d]+?[町村]"
+)
+# En Tokio los 23 区 son el municipio ("新宿区市谷..." no es una ciudad)
+_SPECIAL_WARD = re.compile(r"[^\d市郡町村]+?区")
+# Distrito de una ciudad designada (名古屋市中区)
+_WARD = re.compile(r"[^\d町村]+?区")
+# Barrio y 丁目 en cifras: "美里2-6-9", "栄3丁目5-1"
+_TOWN_CHOME = re.compile(r"(?P<town>[^\d]*?)(?P<chome>\d+)(?:丁目|-)")
+_TOWN = re.compile(r"[^\d]*")
+_POSTAL = re.compile(r"^〒?\s*\d{3}-?\d{4}\s*")
+# Rayas entre números escritas con el guion largo u otras variantes
+_NUMBER_DASH = re.compile(r"(?<=\d)[ー―‐‑–—−－](?=\d)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class ParsedAddress(NamedTuple):
+    normalized: str
+    prefecture: Optional[str] = None
+    city: Optional[str] = None
+    ward: Optional[str] = None
+    town: Optional[str] = None
+    chome: Optional[int] = None
+    rest: Optional[str] = None
+
+    @property
+    def municipality(self) -> Optional[str]:
+        """Ciudad con su distrito (valor de la columna city)"""
+        if not self.city:
+            return None
+        return self.city + (self.ward or "")
+
+
+def normalize_address(address: str) -> str:
+    """
+    NFKC (dígitos y katakana de ancho completo/medio), rayas entre números
+    unificadas y sin espacios.
+    """
+    text = unicodedata.normalize("NFKC", address)
+    text = _NUMBER_DASH.sub("-", text)
+    return _WHITESPACE.sub("", text)
+
+
+@lru_cache(maxsize=8192)
+def parse_address(address: Optional[str]) -> ParsedAddress:
+    """
+    Separa una dirección en prefectura, ciudad, distrito, barrio y 丁目.
+
+    Ejemplos:
+        "〒471-0805 愛知県豊田市美里２－６－９" ->
+        prefecture="愛知県", city="豊田市", town="美里", chome=2, rest="6-9"
+        "岡山県倉敷市市場1-1" -> city="倉敷市", town="市場", chome=1
+        "三重県四日市市諏訪町1-5" -> city="四日市市", town="諏訪町"
+
+    Las partes que no se reconocen quedan en None. El resultado se memoriza
+    por dirección: las importaciones masivas repiten mucho las mismas.
+    """
+    if not address:
+        return ParsedAddress(normalized="")
+
+    text = _POSTAL.sub("", normalize_address(address))
+    normalized = text
+
+    match = _PREFECTURE.search(text)
+    if not match:
+        return ParsedAddress(normalized=normalized)
+    prefecture = match.group(0)
+    text = text[match.end():]
+
+    city = ward = None
+    match = (prefecture == "東京都" and _SPECIAL_WARD.match(text)) or _MUNICIPALITY.match(text)
+    if match:
+        city = match.group(0)
+        text = text[match.end():]
+        if city.endswith("市"):
+            match = _WARD.match(text)
+            if match:
+                ward = match.group(0)
+                text = text[match.end():]
+
+    town = chome = None
+    match = _TOWN_CHOME.match(text)
+    if match:
+        town = match.group("town") or None
+        chome = int(match.group("chome"))
+        text = text[match.end():]
+    elif text and not text[0].isdigit():
+        # Sin número reconocible: todo hasta el primer dígito es el barrio
+        town = _TOWN.match(text).group(0)
+        text = text[len(town):]
+
+    return ParsedAddress(
+        normalized=normalized,
+        prefecture=prefecture,
+        city=city,
+        ward=ward,
+        town=town,
+        chome=chome,
+        rest=text or None
+    )
+
+
+def extract_prefecture_city(address: Optional[str]):
+    """(prefectura, ciudad con distrito) de una dirección"""
+    parsed = parse_address(address)
+    return parsed.prefecture, parsed.municipality
@@ -5,6 +5,8 @@
 --   - Add custom_monthly_rate to apartment_assignments table
 --   - Add PricingType enum
 
+BEGIN;
+
 -- 1. Create the PricingType enum if it doesn't exist
 DO $$
 BEGIN
@@ -0,0 +1,34 @@
+-- Migration: Add background_jobs table
+-- Date: 2026-10-16
+-- Description:
+--   - Imports run in a worker process pool; each job stores its status,
+--     progress, row counts and errors here so any API worker can report them
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS background_jobs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    job_type VARCHAR(50) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    file_name VARCHAR(255),
+    total_rows INTEGER,
+    processed_rows INTEGER DEFAULT 0,
+    successful_rows INTEGER DEFAULT 0,
+    failed_rows INTEGER DEFAULT 0,
+    errors JSONB DEFAULT '[]',
+    result JSONB,
+    error TEXT,
+    import_log_id UUID REFERENCES import_logs(id) ON DELETE SET NULL,
+    created_by UUID REFERENCES users(id),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON COLUMN background_jobs.status IS 'queued, running, completed o failed';
+
+CREATE INDEX IF NOT EXISTS idx_background_jobs_created_by ON background_jobs(created_by, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_background_jobs_active ON background_jobs(status) WHERE status IN ('queued', 'running');
+
+COMMIT;
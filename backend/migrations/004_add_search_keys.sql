@@ -0,0 +1,55 @@
+-- Migration: Add normalised search_key columns
+-- Date: 2026-10-16
+-- Description:
+--   - search_key holds the searchable fields of a row folded by
+--     app/core/text.py (NFKC, width folding, hiragana -> katakana, no spaces);
+--     the application keeps it in sync on every write and import
+--   - One trigram index per table on search_key; searches on employees,
+--     apartments and factories only filter on this column
+--   - Visitors are still searched per column (VISITOR_SEARCH), so they keep
+--     one trigram index per searched column
+--   - Kanji/kana trigrams require a UTF-8 database with a non-C LC_CTYPE
+--     (the default of the postgres Docker image)
+--   - Existing rows are filled by scripts/backfill_search_keys.py, which
+--     run_migration.sh runs after applying the migrations
+
+BEGIN;
+
+-- 1. Shadow columns
+ALTER TABLE employees ADD COLUMN IF NOT EXISTS search_key TEXT;
+ALTER TABLE apartments ADD COLUMN IF NOT EXISTS search_key TEXT;
+ALTER TABLE factories ADD COLUMN IF NOT EXISTS search_key TEXT;
+
+-- 2. Trigram indexes on the keys
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_employees_search_key_trgm ON employees USING gin (search_key gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_apartments_search_key_trgm ON apartments USING gin (search_key gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_factories_search_key_trgm ON factories USING gin (search_key gin_trgm_ops);
+
+-- 3. Visitors (the table is created by the application on first start)
+DO $$
+BEGIN
+    IF to_regclass('visitors') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS idx_visitors_name_trgm ON visitors USING gin (visitor_name gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS idx_visitors_phone_trgm ON visitors USING gin (phone gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS idx_visitors_email_trgm ON visitors USING gin (email gin_trgm_ops);
+    END IF;
+END$$;
+
+-- 4. Per-column indexes created by the former 003_add_search_indexes.sql
+DROP INDEX IF EXISTS idx_apartments_name_trgm;
+DROP INDEX IF EXISTS idx_apartments_code_trgm;
+DROP INDEX IF EXISTS idx_apartments_address_trgm;
+DROP INDEX IF EXISTS idx_apartments_building_name_trgm;
+DROP INDEX IF EXISTS idx_employees_name_roman_trgm;
+DROP INDEX IF EXISTS idx_employees_name_kanji_trgm;
+DROP INDEX IF EXISTS idx_employees_name_furigana_trgm;
+DROP INDEX IF EXISTS idx_employees_code_trgm;
+DROP INDEX IF EXISTS idx_employees_phone_trgm;
+DROP INDEX IF EXISTS idx_factories_name_trgm;
+DROP INDEX IF EXISTS idx_factories_name_japanese_trgm;
+DROP INDEX IF EXISTS idx_factories_code_trgm;
+DROP INDEX IF EXISTS idx_factories_address_trgm;
+
+COMMIT;
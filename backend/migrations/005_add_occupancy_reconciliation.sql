@@ -0,0 +1,72 @@
+-- Migration: Track apartments whose occupancy needs reconciling
+-- Date: 2026-10-16
+-- Description:
+--   - occupancy_dirty queues every new apartment and every apartment touched
+--     by a write to employees.apartment_id, apartment_assignments or
+--     apartments.capacity, including writes that bypass the API (data
+--     tables, BASEDATEJP import)
+--   - services/occupancy.reconcile() recomputes only the queued apartments
+--     and removes the entries whose version it has seen
+
+BEGIN;
+
+CREATE SEQUENCE IF NOT EXISTS occupancy_dirty_version_seq;
+
+CREATE TABLE IF NOT EXISTS occupancy_dirty (
+    apartment_id UUID PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT nextval('occupancy_dirty_version_seq'),
+    marked_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 1. Mark functions: queue the OLD and NEW apartment of the changed row
+CREATE OR REPLACE FUNCTION queue_occupancy_check(apartment UUID) RETURNS void AS $$
+BEGIN
+    IF apartment IS NOT NULL THEN
+        INSERT INTO occupancy_dirty (apartment_id) VALUES (apartment)
+        ON CONFLICT (apartment_id) DO UPDATE
+            SET version = nextval('occupancy_dirty_version_seq'), marked_at = CURRENT_TIMESTAMP;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION mark_occupancy_dirty() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM queue_occupancy_check(OLD.apartment_id);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM queue_occupancy_check(NEW.apartment_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION mark_capacity_dirty() RETURNS trigger AS $$
+BEGIN
+    PERFORM queue_occupancy_check(NEW.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 2. Triggers
+DROP TRIGGER IF EXISTS trg_employees_occupancy ON employees;
+CREATE TRIGGER trg_employees_occupancy
+    AFTER INSERT OR DELETE OR UPDATE OF apartment_id, is_active ON employees
+    FOR EACH ROW EXECUTE FUNCTION mark_occupancy_dirty();
+
+DROP TRIGGER IF EXISTS trg_assignments_occupancy ON apartment_assignments;
+CREATE TRIGGER trg_assignments_occupancy
+    AFTER INSERT OR DELETE OR UPDATE OF apartment_id, employee_id, is_current ON apartment_assignments
+    FOR EACH ROW EXECUTE FUNCTION mark_occupancy_dirty();
+
+DROP TRIGGER IF EXISTS trg_apartments_capacity ON apartments;
+CREATE TRIGGER trg_apartments_capacity
+    AFTER INSERT OR UPDATE OF capacity ON apartments
+    FOR EACH ROW EXECUTE FUNCTION mark_capacity_dirty();
+
+-- 3. Queue every apartment once so the first run is a full check
+INSERT INTO occupancy_dirty (apartment_id)
+SELECT id FROM apartments
+ON CONFLICT (apartment_id) DO NOTHING;
+
+COMMIT;
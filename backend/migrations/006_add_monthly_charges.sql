@@ -0,0 +1,39 @@
+-- Migration: Add monthly_charges ledger
+-- Date: 2026-10-16
+-- Description:
+--   - One row per assignment and billed month, written by the billing run
+--     (services/billing.py); re-running a month replaces its rows
+--   - Amounts are whole yen
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS monthly_charges (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    billing_month DATE NOT NULL,
+    assignment_id UUID NOT NULL REFERENCES apartment_assignments(id) ON DELETE CASCADE,
+    employee_id UUID NOT NULL REFERENCES employees(id) ON DELETE CASCADE,
+    apartment_id UUID NOT NULL REFERENCES apartments(id) ON DELETE CASCADE,
+    pricing_type pricingtype NOT NULL,
+    is_custom_rate BOOLEAN DEFAULT FALSE,
+    occupants INTEGER NOT NULL,
+    days_billed INTEGER NOT NULL,
+    days_in_month INTEGER NOT NULL,
+    rent NUMERIC(10, 0) NOT NULL,
+    management_fee NUMERIC(10, 0) NOT NULL,
+    parking NUMERIC(10, 0) NOT NULL,
+    utilities NUMERIC(10, 0) NOT NULL,
+    total NUMERIC(10, 0) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_monthly_charges_month_assignment UNIQUE (billing_month, assignment_id)
+);
+
+COMMENT ON COLUMN monthly_charges.billing_month IS 'Primer día del mes facturado';
+
+CREATE INDEX IF NOT EXISTS idx_monthly_charges_billing_month ON monthly_charges(billing_month);
+CREATE INDEX IF NOT EXISTS idx_monthly_charges_employee_id ON monthly_charges(employee_id, billing_month);
+CREATE INDEX IF NOT EXISTS idx_monthly_charges_apartment_id ON monthly_charges(apartment_id, billing_month);
+
+-- Billing selects the assignments overlapping a month
+CREATE INDEX IF NOT EXISTS idx_apartment_assignments_stay ON apartment_assignments(move_in_date, move_out_date);
+
+COMMIT;
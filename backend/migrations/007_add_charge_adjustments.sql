@@ -0,0 +1,36 @@
+-- Migration: Add charge_adjustments for mid-month settlements
+-- Date: 2026-10-16
+-- Description:
+--   - When occupancy changes in an already billed month, services/billing.py
+--     recomputes the affected apartments and stores the difference against
+--     monthly_charges here (one row per assignment whose charge changed)
+--   - A month's effective charge is monthly_charges plus its adjustments;
+--     re-running the billing run for the month clears them
+--   - Amounts are whole yen and may be negative
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS charge_adjustments (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    billing_month DATE NOT NULL,
+    assignment_id UUID NOT NULL REFERENCES apartment_assignments(id) ON DELETE CASCADE,
+    employee_id UUID NOT NULL REFERENCES employees(id) ON DELETE CASCADE,
+    apartment_id UUID NOT NULL REFERENCES apartments(id) ON DELETE CASCADE,
+    reason VARCHAR(50),
+    occupants INTEGER,
+    days_billed INTEGER,
+    rent NUMERIC(10, 0) NOT NULL,
+    management_fee NUMERIC(10, 0) NOT NULL,
+    parking NUMERIC(10, 0) NOT NULL,
+    utilities NUMERIC(10, 0) NOT NULL,
+    total NUMERIC(10, 0) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON COLUMN charge_adjustments.billing_month IS 'Primer día del mes ajustado';
+
+CREATE INDEX IF NOT EXISTS idx_charge_adjustments_billing_month ON charge_adjustments(billing_month);
+CREATE INDEX IF NOT EXISTS idx_charge_adjustments_apartment_id ON charge_adjustments(apartment_id, billing_month);
+CREATE INDEX IF NOT EXISTS idx_charge_adjustments_assignment_id ON charge_adjustments(assignment_id);
+
+COMMIT;
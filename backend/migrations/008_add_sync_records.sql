@@ -0,0 +1,26 @@
+-- Migration: Add sync_records for incremental BASEDATEJP imports
+-- Date: 2026-10-16
+-- Description:
+--   - services/basedatejp_sync.py stores here the SHA-256 of every imported
+--     record (factory, apartment, employee, assignment) keyed by its code
+--   - The next import (/data/import-from-basedatejp?mode=sync) compares
+--     against these hashes and only writes inserted, changed and removed
+--     records
+--   - entity_id points to the written row; it is not a foreign key because
+--     one table holds rows of several entities
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS sync_records (
+    source VARCHAR(50) NOT NULL,
+    entity VARCHAR(50) NOT NULL,
+    record_key VARCHAR(255) NOT NULL,
+    content_hash VARCHAR(64) NOT NULL,
+    entity_id UUID,
+    synced_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source, entity, record_key)
+);
+
+COMMENT ON COLUMN sync_records.content_hash IS 'SHA-256 del registro mapeado a columnas';
+
+COMMIT;
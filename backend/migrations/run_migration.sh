@@ -1,7 +1,11 @@
 #!/bin/bash
 
 # Migration Runner Script
-# Ejecuta las migraciones SQL en la base de datos
+# Ejecuta en orden las migraciones SQL pendientes (NNN_*.sql) y registra
+# cada una en schema_migrations; las ya registradas no se vuelven a ejecutar.
+#
+# Uso: ./run_migration.sh            # aplicar las pendientes
+#      ./run_migration.sh --status   # listar aplicadas y pendientes
 
 set -e
 
@@ -11,6 +15,11 @@ GREEN='\033[0;32m'
 YELLOW='\033[1;33m'
 NC='\033[0m' # No Color
 
+MIGRATIONS_DIR="$(cd "$(dirname "$0")" && pwd)"
+DB_USER="${POSTGRES_USER:-shatak_admin}"
+DB_NAME="${POSTGRES_DB:-uns_shatak}"
+BACKEND_CONTAINER="${BACKEND_CONTAINER:-uns-shatak-backend}"
+
 echo -e "${GREEN}================================${NC}"
 echo -e "${GREEN}  UNS-Shatak Migration Runner${NC}"
 echo -e "${GREEN}================================${NC}"
@@ -23,53 +32,85 @@ if ! docker ps &> /dev/null; then
 fi
 
 # Verificar si el contenedor de PostgreSQL existe
-CONTAINER_NAME="uns-shatak-v2-db-1"
-if ! docker ps | grep -q "$CONTAINER_NAME"; then
-    CONTAINER_NAME="uns-shatak-postgres-1"
-    if ! docker ps | grep -q "$CONTAINER_NAME"; then
-        echo -e "${RED}❌ Error: Contenedor PostgreSQL no encontrado${NC}"
-        echo "Buscando contenedores de PostgreSQL disponibles:"
-        docker ps --filter "ancestor=postgres" --format "{{.Names}}"
-        exit 1
+CONTAINER_NAME=""
+for candidate in uns-shatak-db uns-shatak-v2-db-1 uns-shatak-postgres-1; do
+    if docker ps --format "{{.Names}}" | grep -qx "$candidate"; then
+        CONTAINER_NAME="$candidate"
+        break
     fi
+done
+if [ -z "$CONTAINER_NAME" ]; then
+    echo -e "${RED}❌ Error: Contenedor PostgreSQL no encontrado${NC}"
+    echo "Buscando contenedores de PostgreSQL disponibles:"
+    docker ps --filter "ancestor=postgres" --format "{{.Names}}"
+    exit 1
 fi
 
 echo -e "${GREEN}✓${NC} Contenedor PostgreSQL encontrado: ${CONTAINER_NAME}"
 
-# Archivo de migración
-MIGRATION_FILE="001_add_pricing_fields.sql"
+psql_exec() {
+    docker exec -i "$CONTAINER_NAME" psql -v ON_ERROR_STOP=1 -q -U "$DB_USER" -d "$DB_NAME" "$@"
+}
 
-if [ ! -f "$MIGRATION_FILE" ]; then
-    echo -e "${RED}❌ Error: Archivo de migración no encontrado: $MIGRATION_FILE${NC}"
-    exit 1
+# Registro de migraciones aplicadas (01_init_database.sql lo crea ya relleno)
+psql_exec -c "CREATE TABLE IF NOT EXISTS schema_migrations (
+    version VARCHAR(255) PRIMARY KEY,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);"
+
+APPLIED=$(psql_exec -At -c "SELECT version FROM schema_migrations ORDER BY version;")
+
+is_applied() {
+    echo "$APPLIED" | grep -qx "$1"
+}
+
+PENDING=()
+for file in "$MIGRATIONS_DIR"/[0-9][0-9][0-9]_*.sql; do
+    [ -f "$file" ] || continue
+    version="$(basename "$file" .sql)"
+    if is_applied "$version"; then
+        [ "$1" = "--status" ] && echo -e "  ${GREEN}✓${NC} $version"
+    else
+        [ "$1" = "--status" ] && echo -e "  ${YELLOW}…${NC} $version (pendiente)"
+        PENDING+=("$file")
+    fi
+done
+
+if [ "$1" = "--status" ]; then
+    exit 0
 fi
 
-echo -e "${YELLOW}📄 Migrando:${NC} $MIGRATION_FILE"
+if [ ${#PENDING[@]} -eq 0 ]; then
+    echo -e "${GREEN}✅ La base de datos está al día${NC}"
+    exit 0
+fi
+
+echo -e "${YELLOW}📄 Migraciones pendientes:${NC} ${#PENDING[@]}"
 echo ""
 
-# Ejecutar la migración
-echo -e "${YELLOW}⏳ Ejecutando migración...${NC}"
+for file in "${PENDING[@]}"; do
+    version="$(basename "$file" .sql)"
+    echo -e "${YELLOW}⏳ Ejecutando:${NC} $version"
+
+    # Cada fichero abre y cierra su propia transacción (BEGIN ... COMMIT)
+    if ! psql_exec < "$file"; then
+        echo -e "${RED}❌ Error al ejecutar $version; las siguientes no se han aplicado${NC}"
+        exit 1
+    fi
+    psql_exec -c "INSERT INTO schema_migrations (version) VALUES ('$version') ON CONFLICT (version) DO NOTHING;"
 
-docker exec -i "$CONTAINER_NAME" psql -U postgres -d shatak_db < "$MIGRATION_FILE"
+    echo -e "${GREEN}✓${NC} $version"
+done
 
-if [ $? -eq 0 ]; then
-    echo ""
-    echo -e "${GREEN}✓ Migración ejecutada exitosamente${NC}"
-    echo ""
-    echo -e "${GREEN}Cambios aplicados:${NC}"
-    echo "  • Agregado campo 'pricing_type' a la tabla apartments"
-    echo "  • Agregado campo 'custom_monthly_rate' a la tabla apartment_assignments"
-    echo "  • Creado enum 'pricingtype' (shared, fixed)"
-    echo ""
+# search_key de las filas existentes (004): solo toca las que están a NULL
+echo ""
+echo -e "${YELLOW}⏳ Rellenando search_key...${NC}"
+if docker ps --format "{{.Names}}" | grep -qx "$BACKEND_CONTAINER"; then
+    docker exec "$BACKEND_CONTAINER" python scripts/backfill_search_keys.py
 else
-    echo -e "${RED}❌ Error al ejecutar la migración${NC}"
-    exit 1
+    echo -e "${YELLOW}⚠️  Contenedor ${BACKEND_CONTAINER} no encontrado; ejecuta después:${NC}"
+    echo "    docker compose exec backend python scripts/backfill_search_keys.py"
 fi
 
-# Verificar los cambios
-echo -e "${YELLOW}Verificando cambios en la base de datos...${NC}"
-docker exec -i "$CONTAINER_NAME" psql -U postgres -d shatak_db -c "\d apartments" | grep -E "pricing_type|Column"
-docker exec -i "$CONTAINER_NAME" psql -U postgres -d shatak_db -c "\d apartment_assignments" | grep -E "custom_monthly_rate|Column"
-
 echo ""
 echo -e "${GREEN}✅ Todo listo!${NC}"
@@ -6,6 +6,9 @@
 -- Enable UUID extension
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
+-- Trigram indexes for substring search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- ===========================================
 -- ENUM Types
 -- ===========================================
@@ -34,6 +37,12 @@ CREATE TYPE contract_type AS ENUM (
     'part_time'       -- パート
 );
 
+-- Tipo de cálculo del alquiler
+CREATE TYPE pricingtype AS ENUM (
+    'shared',         -- dividido entre ocupantes
+    'fixed'           -- precio fijo por persona
+);
+
 -- ===========================================
 -- Tables
 -- ===========================================
@@ -66,6 +75,7 @@ CREATE TABLE IF NOT EXISTS factories (
     contact_email VARCHAR(100),
     notes TEXT,
     is_active BOOLEAN DEFAULT true,
+    search_key TEXT,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
@@ -100,12 +110,14 @@ CREATE TABLE IF NOT EXISTS apartments (
     landlord_phone VARCHAR(20),
     landlord_company VARCHAR(100),
     status apartment_status DEFAULT 'available',
+    pricing_type pricingtype NOT NULL DEFAULT 'shared',
     capacity INTEGER DEFAULT 1,
     current_occupants INTEGER DEFAULT 0,
     notes TEXT,
     photos JSONB DEFAULT '[]',
     amenities JSONB DEFAULT '[]',
     is_active BOOLEAN DEFAULT true,
+    search_key TEXT,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
@@ -147,6 +159,7 @@ CREATE TABLE IF NOT EXISTS employees (
     notes TEXT,
     metadata JSONB DEFAULT '{}',
     is_active BOOLEAN DEFAULT true,
+    search_key TEXT,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
@@ -159,6 +172,7 @@ CREATE TABLE IF NOT EXISTS apartment_assignments (
     move_in_date DATE NOT NULL,
     move_out_date DATE,
     monthly_charge DECIMAL(10,2),
+    custom_monthly_rate NUMERIC(10, 2),
     deposit_paid DECIMAL(10,2),
     is_current BOOLEAN DEFAULT true,
     notes TEXT,
@@ -193,6 +207,99 @@ CREATE TABLE IF NOT EXISTS audit_log (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Background jobs (imports run in the worker pool)
+CREATE TABLE IF NOT EXISTS background_jobs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    job_type VARCHAR(50) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    file_name VARCHAR(255),
+    total_rows INTEGER,
+    processed_rows INTEGER DEFAULT 0,
+    successful_rows INTEGER DEFAULT 0,
+    failed_rows INTEGER DEFAULT 0,
+    errors JSONB DEFAULT '[]',
+    result JSONB,
+    error TEXT,
+    import_log_id UUID REFERENCES import_logs(id) ON DELETE SET NULL,
+    created_by UUID REFERENCES users(id),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Apartments whose occupancy needs reconciling
+CREATE SEQUENCE IF NOT EXISTS occupancy_dirty_version_seq;
+
+CREATE TABLE IF NOT EXISTS occupancy_dirty (
+    apartment_id UUID PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT nextval('occupancy_dirty_version_seq'),
+    marked_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Monthly charges ledger (月次請求)
+CREATE TABLE IF NOT EXISTS monthly_charges (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    billing_month DATE NOT NULL,
+    assignment_id UUID NOT NULL REFERENCES apartment_assignments(id) ON DELETE CASCADE,
+    employee_id UUID NOT NULL REFERENCES employees(id) ON DELETE CASCADE,
+    apartment_id UUID NOT NULL REFERENCES apartments(id) ON DELETE CASCADE,
+    pricing_type pricingtype NOT NULL,
+    is_custom_rate BOOLEAN DEFAULT FALSE,
+    occupants INTEGER NOT NULL,
+    days_billed INTEGER NOT NULL,
+    days_in_month INTEGER NOT NULL,
+    rent NUMERIC(10, 0) NOT NULL,
+    management_fee NUMERIC(10, 0) NOT NULL,
+    parking NUMERIC(10, 0) NOT NULL,
+    utilities NUMERIC(10, 0) NOT NULL,
+    total NUMERIC(10, 0) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_monthly_charges_month_assignment UNIQUE (billing_month, assignment_id)
+);
+
+-- Mid-month settlements against monthly_charges
+CREATE TABLE IF NOT EXISTS charge_adjustments (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    billing_month DATE NOT NULL,
+    assignment_id UUID NOT NULL REFERENCES apartment_assignments(id) ON DELETE CASCADE,
+    employee_id UUID NOT NULL REFERENCES employees(id) ON DELETE CASCADE,
+    apartment_id UUID NOT NULL REFERENCES apartments(id) ON DELETE CASCADE,
+    reason VARCHAR(50),
+    occupants INTEGER,
+    days_billed INTEGER,
+    rent NUMERIC(10, 0) NOT NULL,
+    management_fee NUMERIC(10, 0) NOT NULL,
+    parking NUMERIC(10, 0) NOT NULL,
+    utilities NUMERIC(10, 0) NOT NULL,
+    total NUMERIC(10, 0) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Hashes of the records imported from BASEDATEJP
+CREATE TABLE IF NOT EXISTS sync_records (
+    source VARCHAR(50) NOT NULL,
+    entity VARCHAR(50) NOT NULL,
+    record_key VARCHAR(255) NOT NULL,
+    content_hash VARCHAR(64) NOT NULL,
+    entity_id UUID,
+    synced_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source, entity, record_key)
+);
+
+-- Migrations already contained in this script (backend/migrations/run_migration.sh)
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version VARCHAR(255) PRIMARY KEY,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON COLUMN apartments.pricing_type IS 'Tipo de cálculo: SHARED (precio dividido entre ocupantes) o FIXED (precio fijo por persona)';
+COMMENT ON COLUMN apartment_assignments.custom_monthly_rate IS 'Precio mensual personalizado para este empleado (opcional, sobrescribe el cálculo automático)';
+COMMENT ON COLUMN background_jobs.status IS 'queued, running, completed o failed';
+COMMENT ON COLUMN monthly_charges.billing_month IS 'Primer día del mes facturado';
+COMMENT ON COLUMN charge_adjustments.billing_month IS 'Primer día del mes ajustado';
+COMMENT ON COLUMN sync_records.content_hash IS 'SHA-256 del registro mapeado a columnas';
+
 -- ===========================================
 -- Indexes
 -- ===========================================
@@ -201,19 +308,36 @@ CREATE INDEX idx_apartments_status ON apartments(status);
 CREATE INDEX idx_apartments_city ON apartments(city);
 CREATE INDEX idx_apartments_prefecture ON apartments(prefecture);
 CREATE INDEX idx_apartments_is_active ON apartments(is_active);
+CREATE INDEX idx_apartments_pricing_type ON apartments(pricing_type);
+CREATE INDEX idx_apartments_search_key_trgm ON apartments USING gin (search_key gin_trgm_ops);
 
 CREATE INDEX idx_employees_status ON employees(status);
 CREATE INDEX idx_employees_factory_id ON employees(factory_id);
 CREATE INDEX idx_employees_apartment_id ON employees(apartment_id);
 CREATE INDEX idx_employees_full_name_roman ON employees(full_name_roman);
 CREATE INDEX idx_employees_is_active ON employees(is_active);
+CREATE INDEX idx_employees_search_key_trgm ON employees USING gin (search_key gin_trgm_ops);
 
 CREATE INDEX idx_factories_is_active ON factories(is_active);
 CREATE INDEX idx_factories_name ON factories(name);
+CREATE INDEX idx_factories_search_key_trgm ON factories USING gin (search_key gin_trgm_ops);
 
 CREATE INDEX idx_apartment_assignments_apartment_id ON apartment_assignments(apartment_id);
 CREATE INDEX idx_apartment_assignments_employee_id ON apartment_assignments(employee_id);
 CREATE INDEX idx_apartment_assignments_is_current ON apartment_assignments(is_current);
+CREATE INDEX idx_apartment_assignments_stay ON apartment_assignments(move_in_date, move_out_date);
+CREATE INDEX idx_assignments_custom_rate ON apartment_assignments(custom_monthly_rate) WHERE custom_monthly_rate IS NOT NULL;
+
+CREATE INDEX idx_background_jobs_created_by ON background_jobs(created_by, created_at DESC);
+CREATE INDEX idx_background_jobs_active ON background_jobs(status) WHERE status IN ('queued', 'running');
+
+CREATE INDEX idx_monthly_charges_billing_month ON monthly_charges(billing_month);
+CREATE INDEX idx_monthly_charges_employee_id ON monthly_charges(employee_id, billing_month);
+CREATE INDEX idx_monthly_charges_apartment_id ON monthly_charges(apartment_id, billing_month);
+
+CREATE INDEX idx_charge_adjustments_billing_month ON charge_adjustments(billing_month);
+CREATE INDEX idx_charge_adjustments_apartment_id ON charge_adjustments(apartment_id, billing_month);
+CREATE INDEX idx_charge_adjustments_assignment_id ON charge_adjustments(assignment_id);
 
 CREATE INDEX idx_audit_log_table_name ON audit_log(table_name);
 CREATE INDEX idx_audit_log_record_id ON audit_log(record_id);
@@ -246,6 +370,66 @@ CREATE TRIGGER update_employees_updated_at BEFORE UPDATE ON employees
 CREATE TRIGGER update_apartment_assignments_updated_at BEFORE UPDATE ON apartment_assignments
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- ===========================================
+-- Triggers for occupancy_dirty
+-- ===========================================
+
+CREATE OR REPLACE FUNCTION queue_occupancy_check(apartment UUID) RETURNS void AS $$
+BEGIN
+    IF apartment IS NOT NULL THEN
+        INSERT INTO occupancy_dirty (apartment_id) VALUES (apartment)
+        ON CONFLICT (apartment_id) DO UPDATE
+            SET version = nextval('occupancy_dirty_version_seq'), marked_at = CURRENT_TIMESTAMP;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION mark_occupancy_dirty() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM queue_occupancy_check(OLD.apartment_id);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM queue_occupancy_check(NEW.apartment_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION mark_capacity_dirty() RETURNS trigger AS $$
+BEGIN
+    PERFORM queue_occupancy_check(NEW.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_employees_occupancy
+    AFTER INSERT OR DELETE OR UPDATE OF apartment_id, is_active ON employees
+    FOR EACH ROW EXECUTE FUNCTION mark_occupancy_dirty();
+
+CREATE TRIGGER trg_assignments_occupancy
+    AFTER INSERT OR DELETE OR UPDATE OF apartment_id, employee_id, is_current ON apartment_assignments
+    FOR EACH ROW EXECUTE FUNCTION mark_occupancy_dirty();
+
+CREATE TRIGGER trg_apartments_capacity
+    AFTER INSERT OR UPDATE OF capacity ON apartments
+    FOR EACH ROW EXECUTE FUNCTION mark_capacity_dirty();
+
+-- ===========================================
+-- Applied migrations
+-- ===========================================
+
+INSERT INTO schema_migrations (version)
+VALUES
+    ('001_add_pricing_fields'),
+    ('002_add_background_jobs'),
+    ('004_add_search_keys'),
+    ('005_add_occupancy_reconciliation'),
+    ('006_add_monthly_charges'),
+    ('007_add_charge_adjustments'),
+    ('008_add_sync_records')
+ON CONFLICT (version) DO NOTHING;
+
 -- ===========================================
 -- Default Admin User
 -- Password: admin123 (bcrypt hash)
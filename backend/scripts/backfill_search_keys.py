@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Rellena search_key de las filas que aún no la tienen
+UNS-Shatak v2 - 社宅管理システム
+
+migrations/004_add_search_keys.sql añade la columna vacía; la aplicación
+solo la mantiene al escribir. migrations/run_migration.sh ejecuta este
+script al terminar, y se puede repetir sin riesgo: solo toca las filas con
+search_key NULL.
+
+    docker compose exec backend python scripts/backfill_search_keys.py
+"""
+
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.database import SessionLocal
+from app.models.models import Apartment, Employee, Factory
+from app.services.search import refresh_search_keys
+
+
+def main() -> None:
+    with SessionLocal() as db:
+        for model in (Factory, Apartment, Employee):
+            print(f"{model.__tablename__}: {refresh_search_keys(db, model)} filas")
+        db.commit()
+
+
+if __name__ == "__main__":
+    main()
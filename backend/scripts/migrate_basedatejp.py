@@ -6,12 +6,18 @@ UNS-Shatak v2 - 社宅管理システム
 Este script importa:
 - Fábricas (派遣先) desde factories_index.json
 - Apartamentos (社宅) desde apartments.json
-- Empleados (従業員) desde employees.json
+- Empleados (従業員) desde employees.json, con sus asignaciones actuales
+
+Cada tipo se escribe por lotes con INSERT ... ON CONFLICT DO NOTHING tras
+leer de una vez los códigos que ya existen, así que repetir la migración no
+duplica nada. Fábricas y apartamentos se cargan en paralelo; empleados y
+asignaciones después, porque necesitan sus ids.
 """
 
 import json
 import sys
-import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime, date
 from typing import Dict, List, Optional
@@ -20,13 +26,20 @@ import re
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, sessionmaker
 from app.models.models import (
     Factory, Apartment, Employee, ApartmentAssignment,
-    ApartmentStatus, EmployeeStatus, ContractType, ImportLog
+    ApartmentStatus, EmployeeStatus, ContractType
 )
 from app.core.config import settings
+from app.services.bulk_import import write_batches
+from app.services.factory_catalog import factory_code
+from app.services.factory_resolver import FactoryResolver
+from app.services.occupancy import reconcile
+from app.services.search import refresh_search_keys
+from app.utils.address import extract_prefecture_city
 
 # Configuración
 BASEDATEJP_PATH = Path(__file__).parent.parent.parent / "BASEDATEJP"
@@ -36,20 +49,18 @@ DRY_RUN = False  # Cambiar a False para ejecutar la migración real
 class DataMigrator:
     def __init__(self, dry_run=False):
         self.dry_run = dry_run
-        self.engine = create_engine(settings.DATABASE_URL)
+        self.engine = create_engine(settings.DATABASE_URL, pool_size=4)
         self.SessionLocal = sessionmaker(bind=self.engine)
-        self.db = self.SessionLocal()
+        self.elapsed = 0.0
+
+        # Nombres de fábrica -> factory_id de BASEDATEJP
+        self.factory_resolver = FactoryResolver.from_basedatejp(BASEDATEJP_PATH)
 
         self.stats = {
-            "factories": {"total": 0, "success": 0, "failed": 0, "errors": []},
-            "apartments": {"total": 0, "success": 0, "failed": 0, "errors": []},
-            "employees": {"total": 0, "success": 0, "failed": 0, "errors": []},
+            entity: {"total": 0, "success": 0, "skipped": 0, "failed": 0, "errors": [], "seconds": 0.0}
+            for entity in ("factories", "apartments", "employees", "assignments")
         }
 
-        # Mapeos para relaciones
-        self.factory_map = {}  # factory_code -> Factory object
-        self.apartment_map = {}  # apartment_code -> Apartment object
-
     def log(self, message: str, level="INFO"):
         """Log messages con timestamp"""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -71,333 +82,236 @@ class DataMigrator:
             return None
         return re.sub(r'\s+', ' ', text.strip())
 
-    def extract_prefecture_city(self, address: str) -> tuple:
-        """Extrae prefectura y ciudad de una dirección japonesa"""
-        if not address:
-            return None, None
-
-        # Patrón para prefecturas japonesas
-        prefectures = [
-            "北海道", "青森県", "岩手県", "宮城県", "秋田県", "山形県", "福島県",
-            "茨城県", "栃木県", "群馬県", "埼玉県", "千葉県", "東京都", "神奈川県",
-            "新潟県", "富山県", "石川県", "福井県", "山梨県", "長野県", "岐阜県",
-            "静岡県", "愛知県", "三重県", "滋賀県", "京都府", "大阪府", "兵庫県",
-            "奈良県", "和歌山県", "鳥取県", "島根県", "岡山県", "広島県", "山口県",
-            "徳島県", "香川県", "愛媛県", "高知県", "福岡県", "佐賀県", "長崎県",
-            "熊本県", "大分県", "宮崎県", "鹿児島県", "沖縄県"
-        ]
-
-        prefecture = None
-        city = None
-
-        for pref in prefectures:
-            if pref in address:
-                prefecture = pref
-                # Extraer ciudad (texto después de la prefectura hasta el siguiente espacio o número)
-                after_pref = address.split(pref)[1] if pref in address else ""
-                city_match = re.match(r'^([^0-9]+?)(?:[0-9]|$)', after_pref)
-                if city_match:
-                    city = city_match.group(1).strip()
-                break
-
-        return prefecture, city
-
-    def generate_factory_code(self, factory_name: str, plant_name: str) -> str:
-        """Genera código único para fábrica"""
-        # Usar los primeros caracteres del nombre
-        base = factory_name[:10] if factory_name else "FACTORY"
-        suffix = plant_name[:5] if plant_name else "PLANT"
-        # Limpiar caracteres especiales
-        code = f"{base}_{suffix}".replace(" ", "").replace("　", "")
-        return code[:20]  # Limitar a 20 caracteres
-
-    def migrate_factories(self):
-        """Migra fábricas desde factories_index.json"""
-        self.log("🏭 Iniciando migración de fábricas...")
-
-        file_path = BASEDATEJP_PATH / "factories_index.json"
-        if not file_path.exists():
-            self.log(f"Archivo no encontrado: {file_path}", "ERROR")
-            return
+    # ===========================================
+    # Lectura y preparación (sin base de datos)
+    # ===========================================
 
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        factories = data.get("factories", [])
-        self.stats["factories"]["total"] = len(factories)
-
-        for idx, factory_data in enumerate(factories, 1):
-            try:
-                factory_id = factory_data.get("factory_id", "")
-                client_company = self.clean_string(factory_data.get("client_company", ""))
-                plant_name = self.clean_string(factory_data.get("plant_name", ""))
-                plant_address = self.clean_string(factory_data.get("plant_address", ""))
-                company_phone = self.clean_string(factory_data.get("company_phone", ""))
-
-                # Generar código único
-                factory_code = f"FAC{idx:04d}"
-
-                # Verificar si ya existe
-                existing = self.db.query(Factory).filter(
-                    Factory.factory_code == factory_code
-                ).first()
-
-                if existing:
-                    self.log(f"  ⏭️  Fábrica ya existe: {factory_code} - {client_company}", "WARNING")
-                    self.factory_map[factory_code] = existing
-                    continue
-
-                # Extraer prefectura y ciudad
-                prefecture, city = self.extract_prefecture_city(plant_address)
-
-                # Crear fábrica
-                factory = Factory(
-                    factory_code=factory_code,
-                    name=f"{client_company} - {plant_name}" if plant_name else client_company,
-                    name_japanese=client_company,
-                    address=plant_address,
-                    city=city,
-                    prefecture=prefecture,
-                    phone=company_phone,
-                    notes=f"Factory ID original: {factory_id}",
-                    is_active=True
-                )
-
-                if not self.dry_run:
-                    self.db.add(factory)
-                    self.db.flush()  # Para obtener el ID
-
-                self.factory_map[factory_code] = factory
-                self.stats["factories"]["success"] += 1
-                self.log(f"  ✅ [{idx}/{len(factories)}] {factory_code}: {client_company} - {plant_name}")
-
-            except Exception as e:
-                self.stats["factories"]["failed"] += 1
-                error_msg = f"Error en fábrica {idx}: {str(e)}"
-                self.stats["factories"]["errors"].append(error_msg)
-                self.log(f"  ❌ {error_msg}", "ERROR")
-
-        if not self.dry_run:
-            self.db.commit()
-
-        self.log(f"✅ Fábricas migradas: {self.stats['factories']['success']}/{self.stats['factories']['total']}")
-
-    def migrate_apartments(self):
-        """Migra apartamentos desde apartments.json"""
-        self.log("\n🏠 Iniciando migración de apartamentos...")
-
-        file_path = BASEDATEJP_PATH / "apartments.json"
+    def load_json(self, name: str, key: str) -> List[dict]:
+        """Lee BASEDATEJP/<name> y devuelve la lista `key` (vacía si no existe)"""
+        file_path = BASEDATEJP_PATH / name
         if not file_path.exists():
             self.log(f"Archivo no encontrado: {file_path}", "ERROR")
-            return
-
+            return []
         with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        apartments = data.get("apartments", [])
-        self.stats["apartments"]["total"] = len(apartments)
-
+            return json.load(f).get(key, [])
+
+    def factory_records(self, factories: List[dict]) -> List[dict]:
+        records = []
+        for factory_data in factories:
+            factory_id = factory_data.get("factory_id")
+            if not factory_id:
+                self.log(f"Fábrica sin factory_id: {factory_data.get('client_company')}", "WARNING")
+                continue
+            client_company = self.clean_string(factory_data.get("client_company", ""))
+            plant_name = self.clean_string(factory_data.get("plant_name", ""))
+            plant_address = self.clean_string(factory_data.get("plant_address", ""))
+            prefecture, city = extract_prefecture_city(plant_address)
+            records.append({
+                # Mismo código que la sincronización (services/basedatejp_sync.py)
+                "factory_code": factory_code(factory_id),
+                "name": f"{client_company} - {plant_name}" if plant_name else client_company,
+                "name_japanese": client_company,
+                "address": plant_address,
+                "city": city,
+                "prefecture": prefecture,
+                "phone": self.clean_string(factory_data.get("company_phone", "")),
+                "notes": f"Factory ID original: {factory_id}",
+                "is_active": True,
+            })
+        return records
+
+    def apartment_records(self, apartments: List[dict]) -> List[dict]:
+        records = []
         for idx, apt_data in enumerate(apartments, 1):
-            try:
-                apartment_code = apt_data.get("apartment_code", f"APT{idx:04d}")
-                name = self.clean_string(apt_data.get("name", ""))
-                address = self.clean_string(apt_data.get("address", ""))
-                postal_code = apt_data.get("postal_code", "")
-                capacity = apt_data.get("capacity", 1)
-                current_occupants = apt_data.get("current_occupants", 0)
-                employee_count = apt_data.get("employee_count", 0)
-
-                # Verificar si ya existe
-                existing = self.db.query(Apartment).filter(
-                    Apartment.apartment_code == apartment_code
-                ).first()
-
-                if existing:
-                    self.log(f"  ⏭️  Apartamento ya existe: {apartment_code}", "WARNING")
-                    self.apartment_map[apartment_code] = existing
-                    continue
-
-                # Extraer prefectura y ciudad del JSON (ya viene)
-                prefecture = apt_data.get("prefecture", "")
-                city = apt_data.get("city", "")
-
-                # Si no viene, extraer de la dirección
-                if not prefecture or not city:
-                    prefecture, city = self.extract_prefecture_city(address)
-
-                # Determinar status basado en ocupantes
-                if current_occupants > 0 or employee_count > 0:
-                    status = ApartmentStatus.OCCUPIED
-                else:
-                    status = ApartmentStatus.AVAILABLE
-
-                # Crear apartamento
-                apartment = Apartment(
-                    apartment_code=apartment_code,
-                    name=name or apartment_code,
-                    address=address,
-                    city=city,
-                    prefecture=prefecture,
-                    postal_code=postal_code,
-                    capacity=capacity,
-                    current_occupants=current_occupants or employee_count,
-                    status=status,
-                    is_active=True
-                )
-
-                if not self.dry_run:
-                    self.db.add(apartment)
-                    self.db.flush()
-
-                self.apartment_map[apartment_code] = apartment
-                self.stats["apartments"]["success"] += 1
-                self.log(f"  ✅ [{idx}/{len(apartments)}] {apartment_code}: {name} ({prefecture})")
-
-            except Exception as e:
-                self.stats["apartments"]["failed"] += 1
-                error_msg = f"Error en apartamento {idx}: {str(e)}"
-                self.stats["apartments"]["errors"].append(error_msg)
-                self.log(f"  ❌ {error_msg}", "ERROR")
-
-        if not self.dry_run:
-            self.db.commit()
-
-        self.log(f"✅ Apartamentos migrados: {self.stats['apartments']['success']}/{self.stats['apartments']['total']}")
-
-    def migrate_employees(self):
-        """Migra empleados desde employees.json"""
-        self.log("\n👥 Iniciando migración de empleados...")
-
-        file_path = BASEDATEJP_PATH / "employees.json"
-        if not file_path.exists():
-            self.log(f"Archivo no encontrado: {file_path}", "ERROR")
-            return
-
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        employees = data.get("employees", [])
-        self.stats["employees"]["total"] = len(employees)
-
-        # Crear mapeo de nombres de fábrica a códigos
-        factory_name_map = {}
-        for factory in self.db.query(Factory).all():
-            if factory.name_japanese:
-                # Extraer el nombre base de la empresa (sin el nombre de planta)
-                base_name = factory.name_japanese.strip()
-                factory_name_map[base_name] = factory.factory_code
-
+            apartment_code = apt_data.get("apartment_code", f"APT{idx:04d}")
+            name = self.clean_string(apt_data.get("name", ""))
+            address = self.clean_string(apt_data.get("address", ""))
+            current_occupants = apt_data.get("current_occupants", 0)
+            employee_count = apt_data.get("employee_count", 0)
+
+            # Prefectura y ciudad vienen en el JSON; si no, extraer de la dirección
+            prefecture = apt_data.get("prefecture", "")
+            city = apt_data.get("city", "")
+            if not prefecture or not city:
+                prefecture, city = extract_prefecture_city(address)
+
+            records.append({
+                "apartment_code": apartment_code,
+                "name": name or apartment_code,
+                "address": address,
+                "city": city,
+                "prefecture": prefecture,
+                "postal_code": apt_data.get("postal_code", ""),
+                "capacity": apt_data.get("capacity", 1),
+                "current_occupants": current_occupants or employee_count,
+                "status": ApartmentStatus.OCCUPIED if current_occupants > 0 or employee_count > 0 else ApartmentStatus.AVAILABLE,
+                "is_active": True,
+            })
+        return records
+
+    def employee_records(
+        self,
+        employees: List[dict],
+        factory_ids: Dict[str, object],
+        apartment_ids: Dict[str, object]
+    ) -> List[dict]:
+        records = []
         for idx, emp_data in enumerate(employees, 1):
-            try:
-                employee_code = emp_data.get("employee_code", f"EMP{idx:06d}")
-                full_name_roman = self.clean_string(emp_data.get("full_name_roman", ""))
-                full_name_furigana = self.clean_string(emp_data.get("full_name_furigana", ""))
-
-                # Verificar si ya existe
-                existing = self.db.query(Employee).filter(
-                    Employee.employee_code == employee_code
-                ).first()
-
-                if existing:
-                    self.log(f"  ⏭️  Empleado ya existe: {employee_code} - {full_name_roman}", "WARNING")
-                    continue
-
-                # Extraer datos
-                nationality = emp_data.get("nationality", "")
-                gender = emp_data.get("gender", "")
-                date_of_birth = self.parse_date(emp_data.get("date_of_birth"))
-                address = self.clean_string(emp_data.get("address", ""))
-                postal_code = emp_data.get("postal_code", "")
-                visa_type = emp_data.get("visa_type", "")
-                visa_expiry = self.parse_date(emp_data.get("visa_expiry"))
-                employment_start_date = self.parse_date(emp_data.get("employment_start_date"))
-                employment_end_date = self.parse_date(emp_data.get("employment_end_date"))
-                hourly_rate = emp_data.get("hourly_rate")
-
-                # Contract type
-                contract_type_str = emp_data.get("contract_type", "dispatch")
-                contract_type = ContractType.DISPATCH
-                if contract_type_str == "contract":
-                    contract_type = ContractType.CONTRACT
-                elif contract_type_str == "permanent":
-                    contract_type = ContractType.PERMANENT
-
-                # Status
-                status_str = emp_data.get("status", "active")
-                status = EmployeeStatus.ACTIVE if status_str == "active" else EmployeeStatus.TERMINATED
-
-                # Buscar fábrica por nombre
-                factory_id = None
-                factory_name = emp_data.get("factory_name", "")
-                if factory_name:
-                    # Buscar en el mapeo
-                    for base_name, code in factory_name_map.items():
-                        if factory_name in base_name or base_name in factory_name:
-                            factory_obj = self.factory_map.get(code)
-                            if factory_obj:
-                                factory_id = factory_obj.id
-                            break
-
-                # Buscar apartamento por código
-                apartment_id = None
-                apartment_code = emp_data.get("apartment_code")
-                if apartment_code and apartment_code in self.apartment_map:
-                    apartment_id = self.apartment_map[apartment_code].id
-
-                # Crear empleado
-                employee = Employee(
-                    employee_code=employee_code,
-                    full_name_roman=full_name_roman,
-                    full_name_furigana=full_name_furigana,
-                    nationality=nationality,
-                    date_of_birth=date_of_birth,
-                    gender=gender,
-                    address=address,
-                    postal_code=postal_code,
-                    visa_type=visa_type,
-                    visa_expiry=visa_expiry,
-                    employment_start_date=employment_start_date,
-                    employment_end_date=employment_end_date,
-                    contract_type=contract_type,
-                    hourly_rate=hourly_rate,
-                    status=status,
-                    factory_id=factory_id,
-                    apartment_id=apartment_id,
-                    is_active=(status == EmployeeStatus.ACTIVE)
-                )
-
-                if not self.dry_run:
-                    self.db.add(employee)
-
-                    # Crear assignment si tiene apartamento
-                    if apartment_id:
-                        move_in_date = self.parse_date(emp_data.get("move_in_date"))
-                        move_out_date = self.parse_date(emp_data.get("move_out_date"))
-
-                        assignment = ApartmentAssignment(
-                            apartment_id=apartment_id,
-                            employee_id=employee.id,
-                            move_in_date=move_in_date or employment_start_date or date.today(),
-                            move_out_date=move_out_date,
-                            is_current=(move_out_date is None)
-                        )
-                        self.db.add(assignment)
-
-                self.stats["employees"]["success"] += 1
-
-                if idx % 50 == 0:
-                    self.log(f"  ⏳ Procesados {idx}/{len(employees)} empleados...")
-
-            except Exception as e:
-                self.stats["employees"]["failed"] += 1
-                error_msg = f"Error en empleado {employee_code}: {str(e)}"
-                self.stats["employees"]["errors"].append(error_msg)
-                self.log(f"  ❌ {error_msg}", "ERROR")
-
-        if not self.dry_run:
-            self.db.commit()
-
-        self.log(f"✅ Empleados migrados: {self.stats['employees']['success']}/{self.stats['employees']['total']}")
+            contract_type_str = emp_data.get("contract_type", "dispatch")
+            contract_type = ContractType.DISPATCH
+            if contract_type_str == "contract":
+                contract_type = ContractType.CONTRACT
+            elif contract_type_str == "permanent":
+                contract_type = ContractType.PERMANENT
+
+            status = EmployeeStatus.ACTIVE if emp_data.get("status", "active") == "active" else EmployeeStatus.TERMINATED
+            original_id = self.factory_resolver.resolve(emp_data.get("factory_name"))
+
+            records.append({
+                "employee_code": emp_data.get("employee_code", f"EMP{idx:06d}"),
+                "full_name_roman": self.clean_string(emp_data.get("full_name_roman", "")),
+                "full_name_furigana": self.clean_string(emp_data.get("full_name_furigana", "")),
+                "nationality": emp_data.get("nationality", ""),
+                "date_of_birth": self.parse_date(emp_data.get("date_of_birth")),
+                "gender": emp_data.get("gender", ""),
+                "address": self.clean_string(emp_data.get("address", "")),
+                "visa_type": emp_data.get("visa_type", ""),
+                "visa_expiry": self.parse_date(emp_data.get("visa_expiry")),
+                "employment_start_date": self.parse_date(emp_data.get("employment_start_date")),
+                "employment_end_date": self.parse_date(emp_data.get("employment_end_date")),
+                "contract_type": contract_type,
+                "hourly_rate": emp_data.get("hourly_rate"),
+                "status": status,
+                "factory_id": factory_ids.get(factory_code(original_id)) if original_id else None,
+                "apartment_id": apartment_ids.get(emp_data.get("apartment_code")),
+                "is_active": status == EmployeeStatus.ACTIVE,
+            })
+        return records
+
+    # ===========================================
+    # Escritura por lotes
+    # ===========================================
+
+    def upsert(self, db: Session, model, key: str, entity: str, records: List[dict]) -> Dict[str, object]:
+        """
+        Inserta las filas cuyo código aún no existe con INSERT ... ON CONFLICT
+        DO NOTHING por lotes y devuelve código -> id de todas las filas del
+        fichero. Los códigos existentes se leen en una sola consulta.
+        """
+        started = time.perf_counter()
+        stats = self.stats[entity]
+        stats["total"] = len(records)
+        column = getattr(model, key)
+
+        # Si un código se repite en el fichero gana la primera fila
+        unique = {}
+        for row, record in enumerate(records, 1):
+            unique.setdefault(record[key], (row, record))
+        codes = list(unique)
+        existing = set(db.execute(select(column).where(column.in_(codes))).scalars().all())
+
+        pending = [(row, record) for code, (row, record) in unique.items() if code not in existing]
+        stats["skipped"] = len(records) - len(pending)
+
+        errors: List[dict] = []
+        if self.dry_run:
+            stats["success"] = len(pending)
+        elif pending:
+            table = model.__table__
+            stmt = insert(table).on_conflict_do_nothing(index_elements=[key]).returning(table.c.id)
+            ids = write_batches(db, stmt, [r for _, r in pending], [row for row, _ in pending], errors)
+            if hasattr(model, "SEARCH_KEY_FIELDS"):
+                refresh_search_keys(db, model, ids)
+            db.commit()
+            stats["success"] = len(ids)
+
+        stats["failed"] = len(errors)
+        stats["errors"] = [f"Fila {e['row']}: {e['error']}" for e in errors]
+        stats["seconds"] = time.perf_counter() - started
+
+        self.log(
+            f"  ✅ {entity}: {stats['success']} nuevos, {stats['skipped']} ya existían, "
+            f"{stats['failed']} fallidos ({self.throughput(stats)})"
+        )
+        return dict(db.execute(
+            select(column, model.id).where(column.in_(codes))
+        ).all())
+
+    def migrate_factories(self) -> Dict[str, object]:
+        """Migra fábricas desde factories_index.json; devuelve factory_code -> id"""
+        self.log("🏭 Iniciando migración de fábricas...")
+        records = self.factory_records(self.load_json("factories_index.json", "factories"))
+        with self.SessionLocal() as db:
+            return self.upsert(db, Factory, "factory_code", "factories", records)
+
+    def migrate_apartments(self) -> Dict[str, object]:
+        """Migra apartamentos desde apartments.json; devuelve apartment_code -> id"""
+        self.log("🏠 Iniciando migración de apartamentos...")
+        records = self.apartment_records(self.load_json("apartments.json", "apartments"))
+        with self.SessionLocal() as db:
+            return self.upsert(db, Apartment, "apartment_code", "apartments", records)
+
+    def migrate_employees(self, factory_ids: Dict[str, object], apartment_ids: Dict[str, object]):
+        """Migra empleados desde employees.json y crea sus asignaciones actuales"""
+        self.log("👥 Iniciando migración de empleados...")
+        employees = self.load_json("employees.json", "employees")
+
+        with self.SessionLocal() as db:
+            records = self.employee_records(employees, factory_ids, apartment_ids)
+            employee_ids = self.upsert(db, Employee, "employee_code", "employees", records)
+            self.migrate_assignments(db, employees, records, employee_ids)
+
+    def migrate_assignments(self, db: Session, employees: List[dict], records: List[dict], employee_ids: Dict[str, object]):
+        """Una asignación por empleado con apartamento, salvo si ya tiene una con esa entrada"""
+        started = time.perf_counter()
+        stats = self.stats["assignments"]
+
+        wanted = []
+        for emp_data, record in zip(employees, records):
+            employee_id = employee_ids.get(record["employee_code"])
+            if not record["apartment_id"] or not employee_id:
+                continue
+            move_out_date = self.parse_date(emp_data.get("move_out_date"))
+            wanted.append({
+                "apartment_id": record["apartment_id"],
+                "employee_id": employee_id,
+                "move_in_date": self.parse_date(emp_data.get("move_in_date")) or record["employment_start_date"] or date.today(),
+                "move_out_date": move_out_date,
+                "is_current": move_out_date is None,
+            })
+        stats["total"] = len(wanted)
+
+        # apartment_assignments no tiene clave natural: comparar con las existentes en memoria
+        existing = set(db.execute(
+            select(ApartmentAssignment.employee_id, ApartmentAssignment.apartment_id, ApartmentAssignment.move_in_date)
+            .where(ApartmentAssignment.employee_id.in_([a["employee_id"] for a in wanted]))
+        ).all()) if wanted else set()
+        pending = [a for a in wanted if (a["employee_id"], a["apartment_id"], a["move_in_date"]) not in existing]
+        stats["skipped"] = len(wanted) - len(pending)
+
+        errors: List[dict] = []
+        if self.dry_run:
+            stats["success"] = len(pending)
+        elif pending:
+            table = ApartmentAssignment.__table__
+            ids = write_batches(db, insert(table).returning(table.c.id), pending, list(range(1, len(pending) + 1)), errors)
+            # Los contadores de ocupación se recalculan desde empleados y asignaciones
+            reconcile(db)
+            db.commit()
+            stats["success"] = len(ids)
+
+        stats["failed"] = len(errors)
+        stats["errors"] = [f"Asignación {e['row']}: {e['error']}" for e in errors]
+        stats["seconds"] = time.perf_counter() - started
+        self.log(
+            f"  ✅ assignments: {stats['success']} nuevas, {stats['skipped']} ya existían, "
+            f"{stats['failed']} fallidas ({self.throughput(stats)})"
+        )
+
+    def throughput(self, stats: dict) -> str:
+        seconds = stats.get("seconds") or 0
+        rate = stats["total"] / seconds if seconds else 0
+        return f"{seconds:.2f}s, {rate:,.0f} filas/s"
 
     def print_summary(self):
         """Imprime resumen de la migración"""
@@ -409,7 +323,9 @@ class DataMigrator:
             self.log(f"\n{entity.upper()}:")
             self.log(f"  Total: {stats['total']}")
             self.log(f"  ✅ Exitosos: {stats['success']}")
+            self.log(f"  ⏭️  Ya existían: {stats['skipped']}")
             self.log(f"  ❌ Fallidos: {stats['failed']}")
+            self.log(f"  ⏱️  {self.throughput(stats)}")
 
             if stats['errors']:
                 self.log(f"\n  Errores:")
@@ -418,6 +334,8 @@ class DataMigrator:
                 if len(stats['errors']) > 5:
                     self.log(f"    ... y {len(stats['errors']) - 5} errores más")
 
+        rows = sum(stats["total"] for stats in self.stats.values())
+        self.log(f"\nTOTAL: {rows} filas en {self.elapsed:.2f}s ({rows / self.elapsed if self.elapsed else 0:,.0f} filas/s)")
         self.log("\n" + "="*80)
 
         if self.dry_run:
@@ -432,18 +350,25 @@ class DataMigrator:
             self.log(f"   Modo: {'DRY RUN (sin guardar)' if self.dry_run else 'PRODUCCIÓN (guardará en BD)'}")
             self.log("="*80)
 
-            self.migrate_factories()
-            self.migrate_apartments()
-            self.migrate_employees()
+            started = time.perf_counter()
+
+            # Fábricas y apartamentos no dependen entre sí: en paralelo, cada uno con su sesión
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                factories = pool.submit(self.migrate_factories)
+                apartments = pool.submit(self.migrate_apartments)
+                factory_ids = factories.result()
+                apartment_ids = apartments.result()
+
+            # Empleados (y sus asignaciones) necesitan los ids de ambos
+            self.migrate_employees(factory_ids, apartment_ids)
 
+            self.elapsed = time.perf_counter() - started
             self.print_summary()
 
         except Exception as e:
             self.log(f"Error fatal en migración: {str(e)}", "ERROR")
-            if not self.dry_run:
-                self.db.rollback()
         finally:
-            self.db.close()
+            self.engine.dispose()
 
 
 if __name__ == "__main__":
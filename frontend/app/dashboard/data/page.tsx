@@ -7,6 +7,7 @@ import {
   FileJson, FileSpreadsheet, AlertTriangle, CheckCircle
 } from "lucide-react"
 import { Button, Input, Card, CardHeader, CardTitle, CardContent, Badge } from "@/components/ui"
+import { waitForJob } from "@/lib/api"
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8100"
 
@@ -162,9 +163,12 @@ export default function DataManagementPage() {
         headers: { "Authorization": `Bearer ${token}` },
         body: formData
       })
-      const data = await res.json()
-      if (!res.ok) throw new Error(data.detail)
+      const job = await res.json()
+      if (!res.ok) throw new Error(job.detail)
 
+      const { data } = await waitForJob(job.id).catch((err: any) => {
+        throw new Error(err.response?.data?.detail || "Error en la importación")
+      })
       setImportResult(data)
       setSuccess(`Importados ${data.success} de ${data.total} registros`)
       loadRecords()
@@ -181,7 +185,10 @@ export default function DataManagementPage() {
       const res = await fetchWithAuth(`${API_URL}/api/data/import-from-basedatejp`, {
         method: "POST"
       })
-      const data = await res.json()
+      const job = await res.json()
+      const { data } = await waitForJob(job.id).catch((err: any) => {
+        throw new Error(err.response?.data?.detail || "Error en la importación")
+      })
       setImportResult(data.results)
       setSuccess("Importación desde BASEDATEJP completada")
       loadRecords()
@@ -61,17 +61,44 @@ export const updateFactory = (id: string, data: any) => api.put(`/factories/${id
 export const deleteFactory = (id: string) => api.delete(`/factories/${id}`);
 export const getFactoryStats = () => api.get('/factories/stats');
 
+// Jobs (background imports)
+export const getJob = (id: string) => api.get(`/jobs/${id}`);
+
+// Poll a background job until it finishes; resolves with { data: job.result }
+export const waitForJob = async (
+  jobId: string,
+  onProgress?: (job: any) => void,
+  intervalMs = 1000,
+  timeoutMs = 30 * 60 * 1000
+) => {
+  const deadline = Date.now() + timeoutMs;
+  for (;;) {
+    const { data: job } = await getJob(jobId);
+    onProgress?.(job);
+    if (job.status === 'completed') return { data: job.result };
+    if (job.status === 'failed') {
+      return Promise.reject({ response: { data: { detail: job.error || 'Job failed' } } });
+    }
+    if (Date.now() >= deadline) {
+      return Promise.reject({ response: { data: { detail: `Job ${jobId} did not finish in time` } } });
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+};
+
 // Import
-export const importFactories = (file: File) => {
+export const importFactories = async (file: File, onProgress?: (job: any) => void) => {
   const formData = new FormData();
   formData.append('file', file);
-  return api.post('/import/factories', formData, { headers: { 'Content-Type': 'multipart/form-data' } });
+  const res = await api.post('/import/factories', formData, { headers: { 'Content-Type': 'multipart/form-data' } });
+  return waitForJob(res.data.id, onProgress);
 };
 
-export const importEmployees = (file: File) => {
+export const importEmployees = async (file: File, onProgress?: (job: any) => void) => {
   const formData = new FormData();
   formData.append('file', file);
-  return api.post('/import/employees', formData, { headers: { 'Content-Type': 'multipart/form-data' } });
+  const res = await api.post('/import/employees', formData, { headers: { 'Content-Type': 'multipart/form-data' } });
+  return waitForJob(res.data.id, onProgress);
 };
 
 export const getImportLogs = () => api.get('/import/logs');